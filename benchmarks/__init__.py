@@ -0,0 +1,12 @@
+"""
+Benchmarks for python-nexus, run on deterministically generated data at increasing scales.
+
+Run via
+
+    python -m benchmarks --scale small
+
+and compare the results with a stored baseline (failing if any benchmark is slower or uses more
+memory than `--threshold` times the baseline) via
+
+    python -m benchmarks --scale small --compare benchmarks/baseline-small.json
+"""
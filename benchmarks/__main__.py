@@ -0,0 +1,160 @@
+"""
+Runs the benchmarks, optionally comparing the results against a baseline.
+
+    python -m benchmarks --scale small --compare benchmarks/baseline-small.json
+
+Since baselines are recorded on other machines, times are compared relative to a calibration
+workload run on the respective host.
+"""
+import gc
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import tracemalloc
+
+from benchmarks.suite import BENCHMARKS, SCALES
+
+MIN_TIME = 0.2  # Minimal total runtime in seconds of the timed runs of a benchmark.
+MAX_REPEAT = 50
+# Differences in (calibrated) time below this many seconds are not considered regressions:
+TIME_TOLERANCE = 0.005
+
+
+def calibrate(repeat=5):
+    """
+    :return: Time in seconds of a fixed pure-Python workload - the unit of relative times.
+    """
+    def workload():
+        counts = {}
+        for i in range(200000):
+            key = str(i % 1000)
+            counts[key] = counts.get(key, 0) + len(key)
+        return sorted(counts.items())
+
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        workload()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def host():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+    }
+
+
+def measure(name, scale, tmp, repeat, min_time=MIN_TIME):
+    """
+    Times at least `repeat` runs of a benchmark - more for fast benchmarks, until the runs took
+    `min_time` seconds in total.
+    """
+    setup, func = BENCHMARKS[name]
+    times = []
+    while len(times) < repeat or (sum(times) < min_time and len(times) < MAX_REPEAT):
+        arg = setup(scale, tmp)
+        gc.collect()
+        start = time.perf_counter()
+        func(arg)
+        times.append(time.perf_counter() - start)
+
+    # Peak memory is measured in a separate run, because tracing slows down execution a lot.
+    arg = setup(scale, tmp)
+    gc.collect()
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'time': min(times), 'runs': len(times), 'peak_memory': peak}
+
+
+def compare(results, baseline, threshold, calibration=1.0, baseline_calibration=1.0):
+    """
+    :param calibration: Calibration time of the host the results were measured on.
+    :param baseline_calibration: Calibration time of the host of the baseline.
+    :return: `list` of regression messages for benchmarks slower - relative to the calibration - \
+        or using more memory than `threshold` times the baseline.
+    """
+    regressions = []
+    for name, res in results.items():
+        if name not in baseline:
+            continue
+        # The baseline time, as expected on this host:
+        expected = baseline[name]['time'] * calibration / baseline_calibration
+        if res['time'] > expected * threshold and res['time'] - expected > TIME_TOLERANCE:
+            regressions.append('{0} time: {1:.4g} > {2:.4g} x {3:.4g} (calibrated)'.format(
+                name, res['time'], threshold, expected))
+        if res['peak_memory'] > baseline[name]['peak_memory'] * threshold:
+            regressions.append('{0} peak_memory: {1:.4g} > {2:.4g} x {3:.4g}'.format(
+                name, res['peak_memory'], threshold, baseline[name]['peak_memory']))
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument(
+        '--min-time', type=float, default=MIN_TIME,
+        help='Repeat fast benchmarks until the timed runs took this many seconds')
+    parser.add_argument('-k', '--filter', help='Run only benchmarks containing this string')
+    parser.add_argument('--save', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Compare the results with a baseline JSON file')
+    parser.add_argument(
+        '--threshold', type=float, default=1.5,
+        help='Factor of the baseline above which a result is considered a regression')
+    args = parser.parse_args(args)
+
+    calibration = calibrate()
+    print('{0:<30} {1:10.4f}s'.format('calibration', calibration), flush=True)
+    results, errors = {}, []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in BENCHMARKS:
+            if args.filter and args.filter not in name:
+                continue
+            try:
+                results[name] = measure(
+                    name, SCALES[args.scale], tmp, args.repeat, min_time=args.min_time)
+            except Exception as e:
+                errors.append('{0}: {1}'.format(name, e))
+                print('{0:<30} ERROR {1}'.format(name, e), flush=True)
+                continue
+            print('{0:<30} {1:10.4f}s {2:10.1f}MB'.format(
+                name, results[name]['time'], results[name]['peak_memory'] / 1e6), flush=True)
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf8') as fp:
+            json.dump(
+                {'scale': args.scale, 'host': host(), 'calibration': calibration,
+                 'results': results},
+                fp, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, encoding='utf8') as fp:
+            baseline = json.load(fp)
+        assert baseline['scale'] == args.scale, 'baseline is for a different scale'
+        for name in results:
+            if name not in baseline['results']:
+                print('NOT IN BASELINE: %s' % name)
+        regressions = compare(
+            results,
+            baseline['results'],
+            args.threshold,
+            calibration=calibration,
+            baseline_calibration=baseline.get('calibration', calibration))
+        for regression in regressions:
+            print('REGRESSION: %s' % regression)
+        if regressions:
+            return 1
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""
+Deterministic generators for synthetic nexus data.
+"""
+import random
+
+DATATYPES = {
+    'binary': ('standard', '01'),
+    'dna': ('dna', 'ACGT'),
+    'morphological': ('standard', '012345'),
+}
+
+
+def taxon_labels(ntaxa):
+    return ['Taxon_%05d_%s' % (i, 'abcdefghij' * (i % 3)) for i in range(1, ntaxa + 1)]
+
+
+def matrix(ntaxa, nchar, datatype='binary', seed=1, missing=0.05, polymorphic=0.05):
+    """
+    Creates a nexus data block.
+
+    :param datatype: One of `binary`, `dna` or `morphological`. Only morphological data contains \
+        polymorphic states.
+    """
+    rnd = random.Random(seed)
+    format_datatype, symbols = DATATYPES[datatype]
+    rows = []
+    for taxon in taxon_labels(ntaxa):
+        row = []
+        for _ in range(nchar):
+            x = rnd.random()
+            if x < missing:
+                row.append(rnd.choice('?-'))
+            elif datatype == 'morphological' and x < missing + polymorphic:
+                row.append('(%s)' % ''.join(sorted(rnd.sample(symbols, 2))))
+            else:
+                row.append(rnd.choice(symbols))
+        rows.append('%s    %s' % (taxon, ''.join(row)))
+    return """#NEXUS
+
+begin data;
+    dimensions ntax=%d nchar=%d;
+    format datatype=%s missing=? gap=- symbols="%s";
+    charstatelabels
+%s
+    ;
+matrix
+%s
+;
+end;
+""" % (
+        ntaxa, nchar, format_datatype, symbols,
+        ',\n'.join('        %d char_%d' % (i, i) for i in range(1, nchar + 1)),
+        '\n'.join(rows))
+
+
+def newick(labels, rnd, beast=False):
+    """
+    Creates a random binary tree with branch lengths over `labels`.
+
+    :param beast: Add annotations to all nodes as written by BEAST's TreeAnnotator, i.e. \
+        `label[&height=...,height_95%_HPD={...}]:[&rate=...]length`.
+    """
+    def node(label):
+        if beast:
+            height = rnd.random()
+            return '%s[&height=%r,height_95%%_HPD={%r,%r}]:[&rate=%r]%.6f' % (
+                label, height, height / 2, height * 2, rnd.random(), rnd.random())
+        return '%s:%.6f' % (label, rnd.random())
+
+    nodes = [node(label) for label in labels]
+    while len(nodes) > 2:
+        i, j = sorted(rnd.sample(range(len(nodes)), 2))
+        right, left = nodes.pop(j), nodes.pop(i)
+        nodes.append(node('(%s,%s)' % (left, right)))
+    return '(%s,%s);' % tuple(nodes)
+
+
+def trees(ntaxa, ntrees, translate=True, beast=False, seed=1):
+    """
+    Creates a nexus trees block.
+
+    :param translate: Add a translate block and use numeric IDs in the trees.
+    :param beast: Add BEAST-style `[&key=value]` annotations to all nodes.
+    """
+    rnd = random.Random(seed)
+    taxa = taxon_labels(ntaxa)
+    labels = [str(i) for i in range(1, ntaxa + 1)] if translate else taxa
+    lines = ['#NEXUS', '', 'begin trees;']
+    if translate:
+        lines.append('    translate')
+        lines.extend('        %d %s%s' % (i, taxon, ',' if i < ntaxa else '')
+                     for i, taxon in enumerate(taxa, start=1))
+        lines.append('    ;')
+    for i in range(ntrees):
+        lines.append('tree STATE_%d %s= [&R] %s' % (
+            i * 1000,
+            '[&lnP=-%r] ' % (1000 * rnd.random()) if beast else '',
+            newick(labels, rnd, beast=beast)))
+    lines.append('end;')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,201 @@
+"""
+The benchmarks.
+
+A benchmark is a function which is passed the result of its (untimed) setup function, registered
+with the `benchmark` decorator. Setup functions are called with the `Scale` and a temporary
+directory.
+"""
+import io
+import logging
+import pathlib
+import contextlib
+import collections
+
+from nexus import NexusReader, NexusWriter
+from nexus.checker import CHECKERS, run_checkers
+from nexus import tools
+from nexus.tools import combine_nexuses
+from nexus.tools.binarise import binarise
+from nexus.__main__ import main
+
+from benchmarks import data
+
+Scale = collections.namedtuple('Scale', 'ntaxa nchar ntrees treetaxa nfiles')
+
+SCALES = {
+    'small': Scale(ntaxa=50, nchar=500, ntrees=100, treetaxa=50, nfiles=3),
+    'medium': Scale(ntaxa=200, nchar=5000, ntrees=1000, treetaxa=200, nfiles=10),
+    'large': Scale(ntaxa=500, nchar=20000, ntrees=5000, treetaxa=500, nfiles=20),
+}
+
+BENCHMARKS = collections.OrderedDict()
+LOG = logging.getLogger(__name__)
+LOG.setLevel(logging.WARNING)
+
+
+def benchmark(setup):
+    def register(func):
+        BENCHMARKS[func.__name__] = (setup, func)
+        return func
+    return register
+
+
+def _write(directory, name, text):
+    res = pathlib.Path(directory) / name
+    if not res.exists():
+        res.write_text(text, encoding='utf8')
+    return res
+
+
+def _matrix_file(datatype):
+    def setup(scale, tmp):
+        return _write(
+            tmp, 'matrix-%s.nex' % datatype, data.matrix(scale.ntaxa, scale.nchar, datatype))
+    return setup
+
+
+def _tree_file(beast):
+    def setup(scale, tmp):
+        return _write(
+            tmp,
+            'trees%s.trees' % ('-beast' if beast else ''),
+            data.trees(scale.treetaxa, scale.ntrees, beast=beast))
+    return setup
+
+
+def _reader(file_setup):
+    def setup(scale, tmp):
+        return NexusReader.from_file(file_setup(scale, tmp))
+    return setup
+
+
+def _cli(*args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        main([str(a) for a in args], log=LOG)
+
+
+@benchmark(_matrix_file('binary'))
+def read_binary(fname):
+    NexusReader.from_file(fname)
+
+
+@benchmark(_matrix_file('dna'))
+def read_dna(fname):
+    NexusReader.from_file(fname)
+
+
+@benchmark(_matrix_file('morphological'))
+def read_morphological(fname):
+    NexusReader.from_file(fname)
+
+
+@benchmark(_reader(_matrix_file('morphological')))
+def write_morphological(nex):
+    nex.write()
+
+
+def _writer(storage):
+    def setup(scale, tmp):
+        nex = NexusReader.from_file(_matrix_file('binary')(scale, tmp))
+        res = NexusWriter(storage=storage)
+        for taxon, values in nex.data:
+            for i, value in enumerate(values):
+                res.add(taxon, i, value)
+        return res
+    return setup
+
+
+@benchmark(_writer('dict'))
+def nexuswriter_write(writer):
+    writer.write()
+
+
+@benchmark(_writer('array'))
+def nexuswriter_write_array(writer):
+    writer.write()
+
+
+@benchmark(_reader(_matrix_file('morphological')))
+def binarise_morphological(nex):
+    binarise(nex).write()
+
+
+def _combine_setup(scale, tmp):
+    return [
+        _write(tmp, 'combine-%d.nex' % i, data.matrix(scale.ntaxa, scale.nchar // 10, seed=i))
+        for i in range(scale.nfiles)]
+
+
+@benchmark(_combine_setup)
+def combine(fnames):
+    combine_nexuses(fnames).write()
+
+
+@benchmark(_reader(_matrix_file('binary')))
+def checkers(nex):
+    run_checkers(nex, CHECKERS['base'] + CHECKERS['extra'] + CHECKERS['ascertainment'])
+
+
+@benchmark(_tree_file(False))
+def read_trees(fname):
+    NexusReader.from_file(fname)
+
+
+@benchmark(_reader(_tree_file(False)))
+def detranslate(nex):
+    nex.trees.detranslate()
+
+
+@benchmark(_reader(_tree_file(True)))
+def detranslate_beast(nex):
+    nex.trees.detranslate()
+
+
+@benchmark(_reader(_tree_file(True)))
+def detranslate_beast_parallel(nex):
+    nex.trees.detranslate(workers=4)
+
+
+@benchmark(_reader(_tree_file(True)))
+def write_trees(nex):
+    nex.write()
+
+
+@benchmark(_reader(_tree_file(False)))
+def consensus(nex):
+    nex.trees.split_frequencies().consensus()
+
+
+@benchmark(_reader(_tree_file(True)))
+def mcc_tree(nex):
+    nex.trees.mcc_tree(annotate=True)
+
+
+@benchmark(_reader(_tree_file(False)))
+def rf_distances(nex):
+    tools.rf_distances(nex).close()
+
+
+@benchmark(_tree_file(True))
+def summarise_trees(fname):
+    tools.trees.summarise_trees(fname)
+
+
+@benchmark(_matrix_file('binary'))
+def cli_check(fname):
+    _cli('check', '-e', '-a', fname)
+
+
+@benchmark(_tree_file(True))
+def cli_trees(fname):
+    _cli('trees', '-t', '-c', '-o', fname.parent / 'out.trees', fname)
+
+
+@benchmark(_tree_file(True))
+def cli_trees_sample(fname):
+    _cli('trees', '-b', '10%', '-n', '10', '-o', fname.parent / 'out.trees', fname)
+
+
+@benchmark(_combine_setup)
+def cli_combine(fnames):
+    _cli('combine', '-o', fnames[0].parent / 'out.nex', *fnames)
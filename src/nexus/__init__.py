@@ -2,10 +2,10 @@
 python-nexus - Generic nexus (.nex, .trees) reader for python
 """
 from nexus.reader import NexusReader
-from nexus.writer import NexusWriter
+from nexus.writer import NexusWriter, TreeWriter
 from nexus import handlers
 from nexus.exceptions import NexusFormatException
 from nexus import tools
 
 __version__ = "2.9.1.dev0"
-__all__ = ["NexusReader", "NexusWriter", "NexusFormatException", "handlers", "tools"]
+__all__ = ["NexusReader", "NexusWriter", "TreeWriter", "NexusFormatException", "handlers", "tools"]
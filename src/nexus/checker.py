@@ -1,17 +1,310 @@
+"""
+Checkers for nexus data.
+
+Checkers which need statistics of the matrix - e.g. state counts per taxon or per character -
+declare `Accumulator`s, which are fed by a `MatrixScan`. Running checkers via `run_checkers`
+makes one pass over the matrix for all of them - `check_files` does so for many files, optionally
+in parallel.
+"""
+import sys
+import time
+import array
 import string
+import warnings
+import operator
+import functools
+import itertools
 import statistics
 import collections
 
+from nexus.util import map_chunks
+
 SAFE_CHARACTERS = string.ascii_letters + string.digits + '-_'
+# Translation table deleting safe characters from a string - leaving the unsafe ones:
+_SAFE_TABLE = dict.fromkeys(map(ord, SAFE_CHARACTERS))
+EMPTY_STATES = ('?', '-', '0')
+
+
+class Accumulator(object):
+    """
+    Collects statistics of a matrix in the pass of a `MatrixScan`.
+
+    Accumulators are fed one row at a time, together with flags marking the non-empty cells of
+    the row, and may keep per-cell, per-row (i.e. per-taxon) or per-column (i.e. per-character)
+    statistics.
+
+    If all states of the matrix are single characters, rows are passed to `add_coded_row` as
+    `str` - with flags as `bytes` of 0s and 1s - allowing accumulators to compute statistics with
+    string and integer operations implemented in C, rather than cell by cell.
+
+    When the matrix is edited, `remove_row` and `set_cell` keep the statistics up-to-date.
+    """
+    def add_row(self, taxon, row, flags):  # pragma: no cover
+        raise NotImplementedError("Should be subclassed")
+
+    def remove_row(self, taxon, row, flags):  # pragma: no cover
+        raise NotImplementedError("Should be subclassed")
+
+    def set_cell(self, taxon, index, old, new, old_flag, new_flag):
+        """
+        Updates the statistics for a changed cell.
+
+        :return: `True` if the statistics were updated, `False` if the accumulator must be \
+            updated by removing the row with the old state and adding it with the new one.
+        """
+        return False
+
+    def add_coded_row(self, taxon, row, flags, symbols):
+        """
+        :param row: The states of the row as `str`.
+        :param flags: `bytes` marking non-empty cells with 1.
+        :param symbols: All states of the matrix.
+        """
+        self.add_row(taxon, row, flags)
+
+
+class StateCounter(Accumulator):
+    """Counts the states of all cells."""
+    def __init__(self):
+        self.states = collections.Counter()
+
+    def add_row(self, taxon, row, flags):
+        self.states.update(row)
+
+    def remove_row(self, taxon, row, flags):
+        self.states -= collections.Counter(row)
+
+    def set_cell(self, taxon, index, old, new, old_flag, new_flag):
+        self.states -= collections.Counter([old])
+        self.states[new] += 1
+        return True
+
+    def add_coded_row(self, taxon, row, flags, symbols):
+        # Counting in order of first occurrence keeps the order of the counter the same as for
+        # `add_row`.
+        for state in sorted((s for s in symbols if s in row), key=row.find):
+            self.states[state] += row.count(state)
+
+
+class RowCounter(Accumulator):
+    """Counts the non-empty cells per taxon."""
+    def __init__(self):
+        self.counts = {}
+
+    def add_row(self, taxon, row, flags):
+        self.counts[taxon] = sum(flags)
+
+    def remove_row(self, taxon, row, flags):
+        del self.counts[taxon]
+
+    def set_cell(self, taxon, index, old, new, old_flag, new_flag):
+        self.counts[taxon] += new_flag - old_flag
+        return True
+
+    def add_coded_row(self, taxon, row, flags, symbols):
+        self.counts[taxon] = flags.count(1)
+
+
+class ColumnCounter(Accumulator):
+    """Counts the non-empty cells per character, indexed by 0-based character index."""
+    LANE_SIZE = 4  # bytes per column in the packed counts.
+
+    def __init__(self):
+        self._counts = []
+        self._packed, self._ncols = 0, 0
+
+    @property
+    def counts(self):
+        if self._ncols:
+            # Unpack the counts of coded rows - which may all be 0 - and add them to the counts of
+            # the other rows:
+            packed = array.array('I', self._packed.to_bytes(
+                self.LANE_SIZE * self._ncols, 'little'))
+            if sys.byteorder == 'big':  # pragma: no cover
+                packed.byteswap()
+            self._packed, self._ncols = 0, 0
+            self.add_row(None, None, packed)
+        return self._counts
+
+    def _update(self, flags, op):
+        counts = self.counts
+        if len(counts) < len(flags):
+            counts.extend([0] * (len(flags) - len(counts)))
+        # Adding the flags elementwise is a lot faster than counting indices:
+        counts[:len(flags)] = map(op, counts, flags)
+
+    def add_row(self, taxon, row, flags):
+        self._update(flags, operator.add)
+
+    def remove_row(self, taxon, row, flags):
+        self._update(flags, operator.sub)
+
+    def set_cell(self, taxon, index, old, new, old_flag, new_flag):
+        self.counts[index] += new_flag - old_flag
+        return True
+
+    def add_coded_row(self, taxon, row, flags, symbols):
+        # Spreading the flags over lanes of `LANE_SIZE` bytes of a (big) integer allows adding
+        # them for all columns in one integer addition - without overflow into the next lane for
+        # up to 2^32 - 1 rows.
+        lanes = bytearray(self.LANE_SIZE * len(flags))
+        lanes[::self.LANE_SIZE] = flags
+        self._packed += int.from_bytes(lanes, 'little')
+        self._ncols = max(self._ncols, len(flags))
+
+
+class ColumnStateCounter(Accumulator):
+    """Counts the non-empty states of selected characters."""
+    def __init__(self, columns):
+        self.states = collections.OrderedDict((i, collections.Counter()) for i in columns)
+
+    def add_row(self, taxon, row, flags):
+        for i, states in self.states.items():
+            if flags[i]:
+                states[row[i]] += 1
+
+    def remove_row(self, taxon, row, flags):
+        for i, states in self.states.items():
+            if flags[i]:
+                states -= collections.Counter([row[i]])
+
+    def set_cell(self, taxon, index, old, new, old_flag, new_flag):
+        if index in self.states:
+            if old_flag:
+                self.states[index] -= collections.Counter([old])
+            if new_flag:
+                self.states[index][new] += 1
+        return True
+
+
+class MatrixScan(object):
+    """
+    One pass over the matrix of a data block, feeding all accumulators at once.
+
+    The scan registers with the data block, to keep the accumulators up-to-date with edits of
+    the matrix via `DataHandler.add_taxon`, `DataHandler.del_taxon` and `DataHandler.set_cell` -
+    updating only the statistics of the affected row and column. Thus, checkers can be re-run
+    cheaply after edits, passing the scan to `run_checkers`.
+
+    :param data: A `DataHandler`.
+    :param accumulators: `dict` mapping names to `Accumulator` instances.
+    :param coded: Flag signaling whether to pass rows as `str` to `Accumulator.add_coded_row`. \
+        By default, rows are coded if all states are single characters.
+    """
+    def __init__(self, data, accumulators=None, empty_states=EMPTY_STATES, coded=None):
+        self.data = data
+        self.empty_states = empty_states
+        self.coded = coded
+        # Mapping empty states to False allows computing the flags of a row via `map`:
+        self._nonempty = dict.fromkeys(self.empty_states, False)
+        self.accumulators = {}
+        self.require(accumulators or {})
+        data.watch(self)
+
+    def __getitem__(self, name):
+        return self.accumulators[name]
+
+    def flags(self, row):
+        """
+        :return: `list` of booleans marking the non-empty cells of `row`.
+        """
+        return list(map(self._nonempty.get, row, itertools.repeat(True)))
+
+    def add_row(self, taxon, row):
+        flags = self.flags(row)
+        for accumulator in self.accumulators.values():
+            accumulator.add_row(taxon, row, flags)
+
+    def remove_row(self, taxon, row):
+        flags = self.flags(row)
+        for accumulator in self.accumulators.values():
+            accumulator.remove_row(taxon, row, flags)
+
+    def set_cell(self, taxon, index, old, new):
+        """
+        Updates the accumulators after the state of character `index` for `taxon` changed from \
+        `old` to `new`.
+        """
+        old_flag, new_flag = self._nonempty.get(old, True), self._nonempty.get(new, True)
+        for accumulator in self.accumulators.values():
+            if not accumulator.set_cell(taxon, index, old, new, old_flag, new_flag):
+                row = self.data.matrix[taxon]
+                old_row = list(row)
+                old_row[index] = old
+                accumulator.remove_row(taxon, old_row, self.flags(old_row))
+                accumulator.add_row(taxon, row, self.flags(row))
+
+    def require(self, accumulators):
+        """
+        Makes sure the scan provides the named accumulators - scanning the matrix again only for \
+        those which are missing.
+
+        :return: The `MatrixScan` instance.
+        """
+        new = [(n, a) for n, a in accumulators.items() if n not in self.accumulators]
+        coded = self._coded_rows() if new and self.coded is not False else None
+        if coded:
+            rows, symbols = coded
+            table = {
+                ord(symbol): '\x00' if symbol in self.empty_states else '\x01'
+                for symbol in symbols}
+            for taxon, row in rows:
+                flags = row.translate(table).encode('latin-1')
+                for _, accumulator in new:
+                    accumulator.add_coded_row(taxon, row, flags, symbols)
+        elif new:
+            for taxon, row in self.data.matrix.items():
+                flags = self.flags(row)
+                for _, accumulator in new:
+                    accumulator.add_row(taxon, row, flags)
+        self.accumulators.update(new)
+        return self
+
+    def _coded_rows(self):
+        """
+        :return: Pair (`list` of (taxon, row as `str`) pairs, `list` of states) - or `None` if \
+            not all states are single characters.
+        """
+        rows, symbols, known = [], [], {}
+        for taxon, row in self.data.matrix.items():
+            text = ''.join(row)
+            if len(text) != len(row):
+                self.coded = False
+                return
+            if text.translate(known):  # Deleting the known states leaves the new ones:
+                symbols.extend(sorted(set(text.translate(known))))
+                known = dict.fromkeys(map(ord, symbols))
+            rows.append((taxon, text))
+        self.coded = True
+        return rows, symbols
 
 
 class Checker(object):
 
-    EMPTY_STATES = ('?', '-', '0')
+    EMPTY_STATES = EMPTY_STATES
 
-    def __init__(self, nex):
+    def __init__(self, nex, scan=None):
         self.errors, self.messages = [], []
+        self._scan = scan
+        start = time.perf_counter()
         self.check(nex)
+        self.time = time.perf_counter() - start
+
+    @classmethod
+    def accumulators(cls, nex):
+        """
+        :return: `dict` of named `Accumulator`s the checker reads from the `MatrixScan` of \
+            `nex.data`. Checkers requesting accumulators with the same name share them.
+        """
+        return {}
+
+    def scan(self, nex):
+        """
+        :return: The `MatrixScan` of `nex.data` - shared by checkers run via `run_checkers`.
+        """
+        if self._scan is None:
+            self._scan = MatrixScan(nex.data, empty_states=self.EMPTY_STATES)
+        return self._scan.require(self.accumulators(nex))
 
     @property
     def has_errors(self):
@@ -23,12 +316,16 @@ class Checker(object):
     def log(self, message):
         self.messages.append(message)
 
-    def status(self):  # pragma: no cover
-        print("%s\t%d errors" % (self.__class__.__name__.ljust(50), len(self.errors)))
-        for i, e in enumerate(self.messages, 1):
-            print("\t%3d. %s" % (i, e))
-        for i, e in enumerate(self.errors, 1):
-            print("\t%3d. %s" % (i, e))
+    def status(self):
+        print_status(self.__class__.__name__, self.errors, self.messages)
+
+
+def print_status(name, errors, messages):
+    print("%s\t%d errors" % (name.ljust(50), len(errors)))
+    for i, e in enumerate(messages, 1):
+        print("\t%3d. %s" % (i, e))
+    for i, e in enumerate(errors, 1):
+        print("\t%3d. %s" % (i, e))
 
 
 class DuplicateLabelChecker(Checker):
@@ -49,13 +346,47 @@ class PotentiallyUnsafeTaxaLabelsChecker(Checker):
     """
     def check(self, nex):
         for taxon in nex.data.taxa:
-            bad = [char for char in taxon if char not in SAFE_CHARACTERS]
+            bad = taxon.translate(_SAFE_TABLE)
             if len(bad):
                 self.errors.append(
                     "Potentially Unsafe Taxon Label: %s: %s" % (taxon, " ".join(bad)))
         return not self.has_errors
 
 
+class TaxaBlockChecker(Checker):
+    """
+    Checks that the taxa of data and trees blocks (if present) are declared in the taxa block
+    """
+    def check(self, nex):
+        if nex.taxa is None:
+            return not self.has_errors
+        for block in ['data', 'trees']:
+            if getattr(nex, block, None) is not None:
+                taxa = getattr(nex, block).taxa
+                if block == 'trees':
+                    taxa = self._tree_taxa(nex)
+                for taxon in nex.taxa.unknown(taxa):
+                    self.errors.append("Taxon %s in %s block not in taxa block" % (taxon, block))
+        return not self.has_errors
+
+    @staticmethod
+    def _tree_taxa(nex):
+        """
+        :return: `list` of the (unquoted) taxa of the trees block, skipping numbers which refer to \
+            taxa of the taxa block by position.
+        """
+        res = []
+        for taxon in nex.trees.taxa:
+            if not nex.trees.was_translated and taxon.isdigit() and \
+                    1 <= int(taxon) <= nex.taxa.ntaxa:
+                # Without a translate command, numbers refer to positions in the taxa block:
+                continue
+            if taxon.startswith("'") and taxon.endswith("'") and len(taxon) > 1:
+                taxon = taxon[1:-1].replace("''", "'")
+            res.append(taxon)
+        return res
+
+
 class LabelChecker(Checker):
     """
     Checks that the number of character labels (if present) is correct
@@ -79,10 +410,12 @@ class UnusualStateChecker(Checker):
     """
     THRESHOLD = 0.001  # anything less than this is flagged
 
+    @classmethod
+    def accumulators(cls, nex):
+        return {'states': StateCounter()}
+
     def check(self, nex):
-        states = collections.Counter()
-        for s in nex.data.matrix.values():
-            states.update(s)
+        states = self.scan(nex)['states'].states
         total = sum(states.values())
         for s, n in states.most_common():
             if n <= total * self.THRESHOLD:
@@ -97,16 +430,14 @@ class EmptyCharacterChecker(Checker):
     """
     MIN_COUNT = 0
 
-    def check(self, nex):
-        tally = collections.Counter()
-        for taxon in nex.data.matrix:
-            tally.update([
-                i for i, c in enumerate(nex.data.matrix[taxon], 0)
-                if c not in self.EMPTY_STATES
-            ])
+    @classmethod
+    def accumulators(cls, nex):
+        return {'columns': ColumnCounter()}
 
+    def check(self, nex):
+        tally = self.scan(nex)['columns'].counts
         for i in range(0, nex.data.nchar):
-            n = tally.get(i, 0)
+            n = tally[i] if i < len(tally) else 0
             if n == self.MIN_COUNT:
                 if 'ascert' in nex.data.charlabels.get(i, '').lower():  # ignore
                     self.log("Character %d is an ascertainment character" % i)
@@ -128,12 +459,12 @@ class LowStateCountChecker(Checker):
     """
     THRESHOLD = 3  # 3 x the standard deviation
 
-    def check(self, nex):
-        counts = {}
-        for taxon in nex.data.matrix:
-            counts[taxon] = len([
-                c for c in nex.data.matrix[taxon] if c not in self.EMPTY_STATES])
+    @classmethod
+    def accumulators(cls, nex):
+        return {'rows': RowCounter()}
 
+    def check(self, nex):
+        counts = self.scan(nex)['rows'].counts
         med = statistics.median(counts.values())
         sd = statistics.stdev(counts.values())
         sd_threshold = med - (self.THRESHOLD * sd)
@@ -150,13 +481,19 @@ class BEASTAscertainmentChecker(Checker):
     """
     Checks that the ascertainment correction for BEAST is correct
     """
-    def check(self, nex):
+    @staticmethod
+    def ascertainment_characters(nex):
         # do we have character labels? -- find characters identified as _asc
-        ascert = [c for c in nex.data.charlabels if 'ascert' in nex.data.charlabels[c]]
+        return [c for c in nex.data.charlabels if 'ascert' in nex.data.charlabels[c]]
+
+    @classmethod
+    def accumulators(cls, nex):
+        return {'ascertainment': ColumnStateCounter(cls.ascertainment_characters(nex))}
+
+    def check(self, nex):
+        ascert = self.ascertainment_characters(nex)
         # are they empty?
-        for a in ascert:
-            states = [nex.data.matrix[t][a] for t in nex.data.matrix]
-            states = collections.Counter([s for s in states if s not in self.EMPTY_STATES])
+        for a, states in self.scan(nex)['ascertainment'].states.items():
             if len(states):
                 self.errors.append(
                     "Character %d - %s should be an ascertainment character but has data (%r)" % (
@@ -169,6 +506,130 @@ class BEASTAscertainmentChecker(Checker):
         return not self.has_errors
 
 
+def shared_scan(nex, checkers, scan=None, empty_states=EMPTY_STATES):
+    """
+    :param checkers: `Checker` subclasses - which should all use `empty_states`.
+    :param scan: An existing `MatrixScan` of `nex.data` to add missing accumulators to.
+    :return: A `MatrixScan` of `nex.data` feeding the accumulators of all `checkers` - or `None` \
+        if `nex` has no data block.
+    """
+    if nex.data is not None:
+        accumulators = {}
+        for checker in checkers:
+            for name, accumulator in checker.accumulators(nex).items():
+                accumulators.setdefault(name, accumulator)
+        if scan is not None:
+            return scan.require(accumulators)
+        return MatrixScan(nex.data, accumulators, empty_states=empty_states)
+
+
+def shared_scans(nex, checkers, scan=None):
+    """
+    Since the flags passed to accumulators depend on the empty states, checkers overriding
+    `Checker.EMPTY_STATES` can't share a scan with the others. Thus, one scan is shared per set of
+    empty states.
+
+    :param scan: An existing `MatrixScan` of `nex.data` - to be used for checkers with the same \
+        empty states.
+    :return: `dict` mapping `tuple`s of empty states to `MatrixScan`s - or to `None` if `nex` \
+        has no data block.
+    """
+    scans = {}
+    if scan is not None:
+        scans[tuple(scan.empty_states)] = scan
+    groups = collections.OrderedDict()
+    for checker in checkers:
+        groups.setdefault(tuple(checker.EMPTY_STATES), []).append(checker)
+    for empty_states, group in groups.items():
+        scans[empty_states] = shared_scan(
+            nex, group, scan=scans.get(empty_states), empty_states=empty_states)
+    return scans
+
+
+def run_checkers(nex, checkers, scan=None):
+    """
+    Runs checkers, feeding the accumulators of all of them in one pass over the matrix.
+
+    :param checkers: Iterable of `Checker` subclasses.
+    :param scan: A `MatrixScan` of `nex.data` from an earlier run - kept up-to-date with edits of \
+        the matrix - to re-run the checkers without scanning the matrix again. It is used for the \
+        checkers with the same empty states, see `shared_scans`.
+    :return: `list` of `Checker` instances.
+
+    >>> scan = MatrixScan(nex.data)
+    >>> checkers = run_checkers(nex, CHECKERS['base'], scan=scan)
+    >>> nex.data.set_cell('Harry', 0, '1')
+    >>> checkers = run_checkers(nex, CHECKERS['base'], scan=scan)
+    """
+    checkers = list(checkers)
+    scans = shared_scans(nex, checkers, scan=scan)
+    return [checker(nex, scans[tuple(checker.EMPTY_STATES)]) for checker in checkers]
+
+
+def check_file(path, checkers, text=None):
+    """
+    Reads a nexus file and runs checkers on it, recording problems rather than raising them.
+
+    :param path: Path of the nexus file.
+    :param checkers: Iterable of `Checker` subclasses.
+    :param text: Content of the nexus file - if it isn't to be read from `path`, e.g. from stdin.
+    :return: JSON serializable `dict` with keys `file`, `warnings` (encountered while reading \
+        the file), `failure` (the exception which prevented reading or scanning the file, or \
+        `None`), `time` (in seconds) and `checkers` - a `list` of `dict`s with keys `checker`, \
+        `errors`, `messages`, `failure` and `time`.
+    """
+    from nexus.reader import NexusReader
+
+    start = time.perf_counter()
+    res = collections.OrderedDict(
+        [('file', str(path)), ('warnings', []), ('failure', None), ('time', None),
+         ('checkers', [])])
+    try:
+        with warnings.catch_warnings(record=True) as warned:
+            warnings.simplefilter("always")
+            nex = NexusReader.from_string(text) if text is not None \
+                else NexusReader.from_file(path)
+        res['warnings'] = [str(w.message) for w in warned]
+        checkers = list(checkers)
+        scans = shared_scans(nex, checkers)
+    except Exception as e:
+        res['failure'] = '%s: %s' % (e.__class__.__name__, e)
+    else:
+        for checker in checkers:
+            item = collections.OrderedDict(
+                [('checker', checker.__name__), ('errors', []), ('messages', []),
+                 ('failure', None), ('time', None)])
+            try:
+                c = checker(nex, scans[tuple(checker.EMPTY_STATES)])
+                item.update(errors=c.errors, messages=c.messages, time=c.time)
+            except Exception as e:
+                item['failure'] = '%s: %s' % (e.__class__.__name__, e)
+            res['checkers'].append(item)
+    res['time'] = time.perf_counter() - start
+    return res
+
+
+def _check_files(paths, checkers):
+    return [check_file(path, checkers) for path in paths]
+
+
+def check_files(paths, checkers, workers=None, executor=None):
+    """
+    Checks many nexus files - optionally in parallel.
+
+    :param paths: Paths of the nexus files.
+    :param checkers: Iterable of `Checker` subclasses - which must be importable in worker \
+        processes, when checking in parallel.
+    :return: `list` of the results of `check_file` for each path, in the order of `paths`.
+    """
+    return map_chunks(
+        functools.partial(_check_files, checkers=tuple(checkers)),
+        paths,
+        workers=workers,
+        executor=executor,
+        chunksize=1)
+
+
 # TODO check assumptions block
 
 CHECKERS = {
@@ -176,6 +637,7 @@ CHECKERS = {
         LabelChecker,
         DuplicateLabelChecker,
         PotentiallyUnsafeTaxaLabelsChecker,
+        TaxaBlockChecker,
         LowStateCountChecker,
         EmptyCharacterChecker,
     ],
@@ -1,5 +1,6 @@
 import sys
 import argparse
+import importlib
 
 from termcolor import colored
 from clldutils.clilib import PathType, ParserError
@@ -32,6 +33,43 @@ def list_of_ranges(dstring):
     return sorted(out)
 
 
+def burnin(string):
+    """
+    Validates a burn-in specification, i.e. a number of trees or a percentage like `10%`.
+
+    :return: `int` number of trees or the percentage as string.
+    """
+    try:
+        if string.strip().endswith('%'):
+            assert 0 <= float(string.strip()[:-1]) <= 100
+            return string
+        assert int(string) >= 0
+        return int(string)
+    except (ValueError, AssertionError):
+        raise argparse.ArgumentTypeError(
+            "%r is neither a number of trees nor a percentage like '10%%'" % string)
+
+
+def dotted_path(string):
+    """
+    Resolves a reference to a callable in an importable module, e.g. `package.module:function` or
+    `package.module.function`.
+    """
+    module, _, name = string.rpartition(':') if ':' in string else string.rpartition('.')
+    try:
+        return getattr(importlib.import_module(module), name)
+    except (ImportError, AttributeError, ValueError):
+        raise argparse.ArgumentTypeError("%r is not a callable in an importable module" % string)
+
+
+def add_jobs(parser):
+    parser.add_argument(
+        "-j", "--jobs",
+        type=int,
+        default=1,
+        help="Number of processes to use for parallelizable operations")
+
+
 def path_or_stdin(string):
     return None if string == '-' else PathType(type='file')(string)
 
@@ -1,14 +1,29 @@
 """
 Check nexus files for errors
+
+Many files - or directories containing nexus files - can be checked at once, optionally in
+parallel, with results written as JSON Lines: one object per file, followed by one object per
+checker.
 """
-import warnings
+import sys
+import json
+
+from clldutils.clilib import PathType
 
-from nexus.cli_util import add_nexus, get_reader
-from nexus.checker import CHECKERS
+from nexus.cli_util import add_jobs
+from nexus.checker import CHECKERS, check_file, check_files, print_status
+
+NEXUS_SUFFIXES = ('.nex', '.nexus', '.nxs')
+SEVERITIES = {'warning': 1, 'error': 2, 'failure': 3}
 
 
 def register(parser):
-    add_nexus(parser)
+    parser.add_argument(
+        "filename",
+        help='Paths to nexus files or directories - searched recursively for files with suffix '
+             '{0} - or "-" to read from stdin'.format(', '.join(NEXUS_SUFFIXES)),
+        type=lambda s: None if s == '-' else PathType()(s),
+        nargs='+')
     parser.add_argument(
         '-e', "--extra",
         help="add extra checks",
@@ -19,23 +34,85 @@ def register(parser):
         help="add ascertainment checks",
         action='store_true'
     )
+    parser.add_argument(
+        "--format",
+        help="Output format",
+        choices=['text', 'jsonl'],
+        default='text')
+    parser.add_argument(
+        "--fail-on",
+        help="Exit with a non-zero status - 1 for warnings encountered in reading a file, 2 for "
+             "errors found by checkers, 3 for files which could not be read or checked - if the "
+             "most severe problem is at least as severe as the specified one",
+        choices=list(SEVERITIES) + ['never'],
+        default='failure')
+    add_jobs(parser)
+
+
+def iter_nexus_files(paths):
+    for path in paths:
+        if path is not None and path.is_dir():
+            for p in sorted(path.rglob('*')):
+                if p.is_file() and p.suffix.lower() in NEXUS_SUFFIXES:
+                    yield p
+        else:
+            yield path
+
+
+def severity(result):
+    """
+    :return: The severity of the most severe problem recorded in a result of `check_file`.
+    """
+    if result['failure'] or any(c['failure'] for c in result['checkers']):
+        return SEVERITIES['failure']
+    if any(c['errors'] for c in result['checkers']):
+        return SEVERITIES['error']
+    return SEVERITIES['warning'] if result['warnings'] else 0
+
+
+def print_text(result, with_filename):
+    if with_filename:
+        print(result['file'])
+    if result['failure']:
+        print("Failed to check {0}: {1}".format(result['file'], result['failure']))
+    if result['warnings']:
+        print("Warnings encountered in reading nexus:")
+        for w in result['warnings']:
+            print("\t%s" % w)
+    for c in result['checkers']:
+        if c['failure']:
+            print("%s\tfailed: %s" % (c['checker'].ljust(50), c['failure']))
+        else:
+            print_status(c['checker'], c['errors'], c['messages'])
+
+
+def print_jsonl(result):
+    item = {k: v for k, v in result.items() if k != 'checkers'}
+    item['severity'] = severity(result)
+    print(json.dumps(item))
+    for c in result['checkers']:
+        print(json.dumps(dict(file=result['file'], **c)))
 
 
 def run(args):
-    checkers = CHECKERS['base']
+    checkers = list(CHECKERS['base'])
     if args.extra:
         checkers.extend(CHECKERS['extra'])
     if args.ascertainment:
         checkers.extend(CHECKERS['ascertainment'])
 
-    with warnings.catch_warnings(record=True) as warned:
-        warnings.simplefilter("always")
-        nex = get_reader(args)
+    paths = list(iter_nexus_files(args.filename))
+    results = check_files([p for p in paths if p is not None], checkers, workers=args.jobs)
+    if None in paths:
+        results.insert(paths.index(None), check_file('-', checkers, text=sys.stdin.read()))
 
-        if len(warned):
-            print("Warnings encountered in reading nexus:")
-            for w in warned:
-                print("\t%s" % w)
+    for result in results:
+        if args.format == 'jsonl':
+            print_jsonl(result)
+        else:
+            print_text(result, len(results) > 1)
 
-    for checker in checkers:
-        checker(nex).status()
+    status = max([severity(result) for result in results] + [0])
+    if args.fail_on != 'never' and status >= SEVERITIES[args.fail_on]:
+        return status
+    return 0
@@ -1,14 +1,46 @@
 """
 combines a series of nexuses into one nexus.
+
+With --trees, the trees blocks of the files are merged in one streaming pass, with a unified
+translate table.
 """
+import sys
+
 from nexus.tools import combine_nexuses
+from nexus.tools.combine_nexuses import combine_tree_files
 from nexus.cli_util import add_nexus, get_reader, add_output, write_output
 
 
 def register(parser):
     add_output(parser)
     add_nexus(parser, many=True)
+    parser.add_argument(
+        "--trees",
+        action="store_true",
+        default=False,
+        help="Merge the trees of tree files - e.g. of independent MCMC runs - streaming the files")
+    parser.add_argument(
+        "-b", "--burnin",
+        default=0,
+        help="With --trees: Remove the first N trees, or a percentage of the trees, e.g. '10%%', "
+             "of each file")
+    parser.add_argument(
+        "-r", "--resample",
+        type=int,
+        default=0,
+        help="With --trees: Resample the trees of each file every Nth tree")
 
 
 def run(args):
+    if args.trees:
+        ntrees = combine_tree_files(
+            args.filename,
+            args.output or sys.stdout,
+            burnin=args.burnin,
+            every_nth=args.resample or None,
+            log=args.log)
+        args.log.info("{0} trees written".format(ntrees))
+        if args.output:
+            print('Output written to {0}'.format(args.output))
+        return
     write_output(combine_nexuses(get_reader(args, many=True)), args)
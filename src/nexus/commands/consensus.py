@@ -0,0 +1,59 @@
+"""
+Computes clade frequencies and consensus trees for a sample of trees
+"""
+from nexus import NexusWriter
+from nexus.handlers.tree import TreeHandler
+from nexus.cli_util import add_nexus, get_reader, add_output, write_output, add_jobs
+
+
+def register(parser):
+    add_output(parser)
+    add_nexus(parser)
+    parser.add_argument(
+        "-t", "--threshold",
+        type=float,
+        default=0.5,
+        help="Include clades with frequency above this threshold in the consensus tree")
+    parser.add_argument(
+        "-g", "--greedy",
+        action="store_true",
+        default=False,
+        help="Compute a greedy consensus tree, including compatible clades below the threshold")
+    parser.add_argument(
+        "-s", "--splits",
+        action="store_true",
+        default=False,
+        help="Print a table of clade frequencies above the threshold instead of a consensus tree")
+    parser.add_argument(
+        "-m", "--mcc",
+        action="store_true",
+        default=False,
+        help="Select the maximum clade credibility tree - annotated with clade frequencies - "
+             "instead of computing a consensus tree")
+    add_jobs(parser)
+
+
+def run(args):
+    nexus = get_reader(args, required_blocks=['trees'])
+    writer = NexusWriter()
+
+    if args.mcc:
+        tree, index = nexus.trees.mcc_tree(annotate=True, workers=args.jobs)
+        args.log.info("Tree {0} is the maximum clade credibility tree".format(index + 1))
+        if nexus.trees.was_translated and not nexus.trees._been_detranslated:
+            tree = TreeHandler._detranslate_tree(tree, nexus.trees.translators)
+        writer.trees.append(tree)
+        write_output(writer, args)
+        return
+
+    splits = nexus.trees.split_frequencies(workers=args.jobs)
+    args.log.info("{0} distinct clades found in {1} trees".format(
+        len(splits.counts), splits.ntrees))
+
+    if args.splits:
+        for taxa, frequency in splits.iter_splits(threshold=args.threshold):
+            print('{0:.4f}\t{1}'.format(frequency, ' '.join(taxa)))
+        return
+
+    writer.trees.append(splits.consensus(threshold=args.threshold, greedy=args.greedy))
+    write_output(writer, args)
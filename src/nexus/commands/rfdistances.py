@@ -0,0 +1,75 @@
+"""
+Computes Robinson-Foulds distances between trees
+"""
+import sys
+import pathlib
+import contextlib
+
+from clldutils.clilib import add_random_seed, PathType
+
+from nexus.cli_util import add_nexus, get_reader, add_jobs
+from nexus.tools.distances import rf_distances
+from nexus import NexusReader
+
+
+def register(parser):
+    add_nexus(parser)
+    parser.add_argument(
+        "--other",
+        type=PathType(type='file'),
+        default=None,
+        help="Second nexus file with trees, to compute distances between the trees in both files")
+    parser.add_argument(
+        "-o", "--output",
+        default=None,
+        help="Output file for the distance matrix as tab-separated table, if not specified, the "
+             "table will be printed to stdout.")
+    parser.add_argument(
+        "--mmap",
+        default=None,
+        help="File to store the distance matrix in as 32-bit integers in row-major order - "
+             "without writing a table. Use this for very large matrices.")
+    parser.add_argument(
+        "--rooted",
+        action="store_true",
+        default=False,
+        help="Compare clades of rooted trees rather than splits of unrooted trees")
+    parser.add_argument(
+        "-n", "--sample",
+        type=int,
+        default=0,
+        help="Compute distances for a random sample of N trees (per file)")
+    add_random_seed(parser)
+    add_jobs(parser)
+
+
+def run(args):
+    nexus = get_reader(args, required_blocks=['trees'])
+    other = NexusReader.from_file(args.other) if args.other else None
+    matrix = rf_distances(
+        nexus,
+        other=other,
+        rooted=args.rooted,
+        sample=args.sample,
+        seed=args.random_seed,
+        filename=args.mmap,
+        workers=args.jobs)
+    args.log.info("Computed {0}x{1} distances".format(*matrix.shape))
+
+    with matrix:
+        if args.mmap:
+            print('Output written to {0}'.format(args.mmap))
+            return
+
+        def names(trees, indices):
+            return [trees[i].name or str(i + 1) for i in indices]
+
+        with contextlib.ExitStack() as stack:
+            out = stack.enter_context(pathlib.Path(args.output).open('w', encoding='utf8')) \
+                if args.output else sys.stdout
+            columns = names((other or nexus).trees.trees, matrix.columns)
+            out.write('\t'.join([''] + columns) + '\n')
+            for name, row in zip(names(nexus.trees.trees, matrix.rows), matrix):
+                out.write('\t'.join([name] + [str(v) for v in row]) + '\n')
+        if args.output:
+            print('Output written to {0}'.format(args.output))
@@ -1,9 +1,27 @@
 """
 Performs some functions on trees
+
+Burn-in removal, thinning and random sampling alone are done in one streaming pass over files
+containing only a trees block - as is the computation of tree statistics with --stats.
 """
+import sys
+import csv
+import pathlib
+import contextlib
+
 from clldutils.clilib import add_random_seed
-from nexus.cli_util import add_nexus, get_reader, add_output, write_output, list_of_ranges
-from nexus.tools import delete_trees, sample_trees, strip_comments_in_trees
+from nexus.cli_util import (
+    add_nexus, get_reader, add_output, write_output, list_of_ranges, add_jobs, dotted_path,
+    burnin,
+)
+from nexus.tools import (
+    delete_trees, sample_trees, strip_comments_in_trees, visit_trees, visit_tree_nodes,
+    dedupe_trees,
+)
+from nexus.reader import TreeStream
+from nexus.tools.trees import sample_tree_file, summarise_trees
+
+STREAMING = ['burnin', 'resample', 'random']
 
 
 def register(parser):
@@ -15,6 +33,11 @@ def register(parser):
         type=list_of_ranges,
         help="Remove the trees specified as comma-separated ranges of 1-based indices, "
              "e.g. '1', '1-5', '1,20-30'")
+    parser.add_argument(
+        "-b", "--burnin",
+        default=0,
+        type=burnin,
+        help="Remove the first N trees, or a percentage of the trees, e.g. '10%%'")
     parser.add_argument(
         "-r", "--resample",
         type=int,
@@ -36,9 +59,90 @@ def register(parser):
         action="store_true",
         default=False,
         help="Remove taxa translation block from the trees")
+    parser.add_argument(
+        "-T", "--translate",
+        action="store_true",
+        default=False,
+        help="Replace taxa labels in the trees with numeric IDs listed in a translation block")
+    parser.add_argument(
+        "--visitor",
+        type=dotted_path,
+        default=None,
+        help="Manipulate the trees with a callable, specified as 'module:function', which is "
+             "passed a newick.Node and returns a newick.Node, a newick string or None (to delete "
+             "the tree)")
+    parser.add_argument(
+        "--node-visitor",
+        type=dotted_path,
+        default=None,
+        help="Manipulate all nodes of the trees with a callable, specified as 'module:function', "
+             "which is passed each newick.Node")
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        default=False,
+        help="Keep only one tree per distinct topology, annotated with the number of trees with "
+             "this topology")
+    parser.add_argument(
+        "--keep",
+        type=lambda s: s.split(','),
+        default=None,
+        help="Prune the trees, keeping only the taxa specified as comma-separated list of labels")
+    parser.add_argument(
+        "--drop",
+        type=lambda s: s.split(','),
+        default=None,
+        help="Prune the trees, removing the taxa specified as comma-separated list of labels")
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        default=False,
+        help="Write tree length and root height of each tree - after burn-in removal and "
+             "thinning - as CSV, instead of the trees")
+    add_jobs(parser)
+
+
+def _streamable(args):
+    other = [
+        'deltree', 'removecomments', 'detranslate', 'translate', 'visitor', 'node_visitor',
+        'dedupe', 'keep', 'drop']
+    # Only the trees block is written when streaming, so other blocks would be lost:
+    return args.filename and any(getattr(args, a) for a in STREAMING) \
+        and not any(getattr(args, a) for a in other) \
+        and TreeStream(args.filename).blocks() == ['trees']
 
 
 def run(args):
+    if args.stats:
+        stats = summarise_trees(
+            args.filename or get_reader(args, required_blocks=['trees']),
+            burnin=args.burnin,
+            every_nth=args.resample or None,
+            workers=args.jobs)
+        with contextlib.ExitStack() as stack:
+            out = stack.enter_context(
+                pathlib.Path(args.output).open('w', encoding='utf8', newline='')) \
+                if args.output else sys.stdout
+            writer = csv.writer(out, lineterminator='\n')
+            writer.writerow(['tree', 'length', 'height'])
+            writer.writerows(stats.iter_rows())
+        if args.output:
+            print('Output written to {0}'.format(args.output))
+        return
+
+    if _streamable(args):
+        sample_tree_file(
+            args.filename,
+            args.output or sys.stdout,
+            num_trees=args.random or None,
+            every_nth=args.resample or None,
+            burnin=args.burnin,
+            seed=args.random_seed,
+            log=args.log)
+        if args.output:
+            print('Output written to {0}'.format(args.output))
+        return
+
     nexus = get_reader(args, required_blocks=['trees'])
     args.log.info("{0} trees found with {1} translated taxa".format(
         nexus.trees.ntrees, len(nexus.trees.translators)))
@@ -46,16 +150,36 @@ def run(args):
     if args.deltree:
         nexus = delete_trees(nexus, args.deltree, log=args.log)
 
-    if args.resample:
-        nexus = sample_trees(nexus, every_nth=args.resample, log=args.log)
+    if any(getattr(args, a) for a in STREAMING):
+        nexus = sample_trees(
+            nexus,
+            num_trees=args.random or None,
+            every_nth=args.resample or None,
+            burnin=args.burnin,
+            seed=args.random_seed,
+            log=args.log)
 
-    if args.random:
-        nexus = sample_trees(nexus, num_trees=args.random, log=args.log)
+    if args.keep or args.drop:
+        taxa = set(args.keep or nexus.trees.taxa) - set(args.drop or [])
+        nexus.trees.prune(taxa, workers=args.jobs)
+        args.log.info("Trees pruned to {0} taxa".format(nexus.trees.ntaxa))
 
     if args.removecomments:
-        nexus = strip_comments_in_trees(nexus, log=args.log)
+        nexus = strip_comments_in_trees(nexus, log=args.log, workers=args.jobs)
 
     if args.detranslate:
-        nexus.trees.detranslate()
+        nexus.trees.detranslate(workers=args.jobs)
+
+    if args.visitor:
+        nexus = visit_trees(nexus, args.visitor, log=args.log, workers=args.jobs)
+
+    if args.node_visitor:
+        nexus = visit_tree_nodes(nexus, args.node_visitor, log=args.log, workers=args.jobs)
+
+    if args.dedupe:
+        nexus = dedupe_trees(nexus, log=args.log, workers=args.jobs)
+
+    if args.translate:
+        nexus.trees.translate()
 
     write_output(nexus, args)
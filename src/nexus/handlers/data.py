@@ -1,9 +1,11 @@
 import re
+import weakref
 import warnings
 import collections
 
 from nexus.handlers import GenericHandler
 from nexus.handlers import QUOTED_PATTERN, WHITESPACE_PATTERN, BEGIN_PATTERN, END_PATTERN
+from nexus.registry import intern_taxon
 
 NTAX_PATTERN = re.compile(r"""ntax=(\d+)""", re.IGNORECASE)
 NCHAR_PATTERN = re.compile(r"""nchar=(\d+)""", re.IGNORECASE)
@@ -51,6 +53,7 @@ class DataHandler(GenericHandler):
         self._sitecache = {}  # cache for site patterns to parsed sites
         self._characters = None  # cache for characters list
         self._symbols = None  # cache for symbols list
+        self._scans = weakref.WeakSet()  # `MatrixScan`s to keep up-to-date with edits
 
         self.format = self.parse_format_line("\n".join(self.block))
         self.block = self._parse_charstate_block(self.block)
@@ -113,6 +116,25 @@ class DataHandler(GenericHandler):
     def __getitem__(self, index):
         return self.taxa[index], self.matrix.get(self.taxa[index])
 
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_scans']  # Copies are not watched by the scans of the original.
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._scans = weakref.WeakSet()
+
+    def watch(self, scan):
+        """
+        Registers a `nexus.checker.MatrixScan` to be updated when the matrix is edited via \
+        `add_taxon`, `del_taxon` or `set_cell`.
+        """
+        self._scans.add(scan)
+
+    def _changed(self):
+        self._characters, self._symbols = None, None
+
     def __repr__(self):
         return '<NexusDataBlock: {0.nchar} characters from {0.ntaxa} taxa>'.format(self)
 
@@ -242,7 +264,15 @@ class DataHandler(GenericHandler):
 
         :return: None
         """
+        taxon = intern_taxon(taxon)
+        if self._scans:
+            site_values, row = list(site_values), self.matrix.get(taxon)
+            for scan in self._scans:
+                if row is not None:
+                    scan.remove_row(taxon, row)
+                scan.add_row(taxon, (row or []) + site_values)
         self.matrix[taxon].extend(site_values)
+        self._changed()
 
     def del_taxon(self, taxon):
         """
@@ -253,7 +283,36 @@ class DataHandler(GenericHandler):
 
         :return: None
         """
+        for scan in self._scans:
+            scan.remove_row(taxon, self.matrix[taxon])
         del(self.matrix[taxon])
+        self._changed()
+
+    def set_cell(self, taxon, index, value):
+        """
+        Sets the state of character `index` (0-based) for `taxon` - updating registered scans \
+        for the affected row and column only.
+
+        :raises KeyError: if `taxon` is not in the matrix.
+        :raises IndexError: if `index` is out of range.
+        """
+        if taxon not in self.matrix:
+            raise KeyError(taxon)
+        row = self.matrix[taxon]
+        old = row[index]
+        row[index] = value
+        updated = []
+        try:
+            for scan in self._scans:
+                scan.set_cell(taxon, index % len(row), old, value)
+                updated.append(scan)
+        except Exception:
+            # Roll back the change, to keep the matrix and the scans in sync:
+            row[index] = old
+            for scan in updated:
+                scan.set_cell(taxon, index % len(row), value, old)
+            raise
+        self._changed()
 
     def _parse_charstate_block(self, data):
         """
@@ -1,6 +1,8 @@
 import re
+import itertools
 
 from nexus.exceptions import NexusFormatException
+from nexus.registry import intern_taxon
 from nexus.handlers import GenericHandler
 from nexus.handlers import QUOTED_PATTERN, END_PATTERN
 
@@ -8,6 +10,110 @@ TAXON_PLACEHOLDER = re.compile(r"""^\[.*\]\s+""")
 TAXON_ANNOTATION = re.compile(r"""(.*)(\[.*\])$""")
 
 
+class TaxonList(list):
+    """
+    A `list` of taxa, with a - lazily built - index of the taxa, to look up positions and check
+    membership in constant time.
+    """
+    def __init__(self, *args):
+        super(TaxonList, self).__init__(*args)
+        self._positions, self._duplicates = None, False
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+    @property
+    def positions(self):
+        """`dict` mapping taxa to their (first) position in the list."""
+        if self._positions is None:
+            self._positions = {}
+            for i, taxon in enumerate(self):
+                self._positions.setdefault(taxon, i)
+            self._duplicates = len(self._positions) < len(self)
+        return self._positions
+
+    def __contains__(self, taxon):
+        return taxon in self.positions
+
+    def index(self, taxon, *args):
+        if args:
+            return super(TaxonList, self).index(taxon, *args)
+        try:
+            return self.positions[taxon]
+        except KeyError:
+            raise ValueError('{0!r} is not in list'.format(taxon))
+
+    def append(self, taxon):
+        if self._positions is not None:
+            if taxon in self._positions:
+                self._duplicates = True
+            else:
+                self._positions[taxon] = len(self)
+        super(TaxonList, self).append(taxon)
+
+    def rename(self, taxon, new):
+        """
+        Replaces `taxon` with `new` in constant time.
+        """
+        i = self.index(taxon)
+        super(TaxonList, self).__setitem__(i, new)
+        if self._duplicates or new in self._positions:
+            self._positions = None  # Duplicates are involved, so we re-index lazily.
+        else:
+            del self._positions[taxon]
+            self._positions[new] = i
+
+    def __delitem__(self, index):
+        if self._positions is None or self._duplicates or isinstance(index, slice):
+            super(TaxonList, self).__delitem__(index)
+            self._positions = None
+            return
+        i = range(len(self))[index]
+        taxon = self[i]
+        super(TaxonList, self).__delitem__(i)
+        # Update the index in place, shifting the positions of the taxa after the removed one:
+        del self._positions[taxon]
+        for taxon in itertools.islice(self, i, None):
+            self._positions[taxon] -= 1
+
+    def remove(self, taxon):
+        del self[self.index(taxon)]
+
+    def pop(self, index=-1):
+        taxon = self[index]
+        del self[index]
+        return taxon
+
+    # All other modifications invalidate the index:
+    def __setitem__(self, index, value):
+        super(TaxonList, self).__setitem__(index, value)
+        self._positions = None
+
+    def __iadd__(self, other):
+        self.extend(other)
+        return self
+
+    def extend(self, taxa):
+        super(TaxonList, self).extend(taxa)
+        self._positions = None
+
+    def insert(self, index, taxon):
+        super(TaxonList, self).insert(index, taxon)
+        self._positions = None
+
+    def clear(self):
+        super(TaxonList, self).clear()
+        self._positions = None
+
+    def sort(self, *args, **kw):
+        super(TaxonList, self).sort(*args, **kw)
+        self._positions = None
+
+    def reverse(self):
+        super(TaxonList, self).reverse()
+        self._positions = None
+
+
 class TaxaHandler(GenericHandler):
     """Handler for `taxa` blocks"""
     is_dimensions = re.compile(r"""dimensions\s*ntax\s*=\s*(\d+)""", re.IGNORECASE)
@@ -15,7 +121,7 @@ class TaxaHandler(GenericHandler):
 
     def __init__(self, **kw):
         super(TaxaHandler, self).__init__(**kw)
-        self.taxa = []
+        self.taxa = TaxonList()
         self.attributes = []
         self.annotations = {}
 
@@ -38,7 +144,7 @@ class TaxaHandler(GenericHandler):
                 line = self.is_taxlabel_block.sub("", line)
 
             for taxon, annot in self._parse_taxa(line):
-                self.taxa.append(taxon)
+                self.taxa.append(intern_taxon(taxon))
                 if annot:
                     self.annotations[taxon] = annot
 
@@ -50,10 +156,49 @@ class TaxaHandler(GenericHandler):
     def __getitem__(self, index):
         return self.taxa[index]
 
+    def __contains__(self, taxon):
+        return taxon in self.taxa
+
     @property
     def ntaxa(self):
         return len(self.taxa)
 
+    def index(self, taxon):
+        """
+        :return: The 0-based position of `taxon` in the taxa block.
+        :raises ValueError: if `taxon` is not in the taxa block.
+        """
+        return self.taxa.index(taxon)
+
+    def remove(self, taxon):
+        """
+        Removes a taxon - and its annotation - from the taxa block.
+        """
+        self.taxa.remove(taxon)
+        self.annotations.pop(taxon, None)
+
+    def rename(self, taxon, new):
+        """
+        Renames a taxon, keeping its position and annotation.
+
+        :raises ValueError: if `new` is already in the taxa block.
+        """
+        if new in self.taxa:
+            raise ValueError('Taxon {0} exists already'.format(new))
+        new = intern_taxon(new)
+        self.taxa.rename(taxon, new)
+        if taxon in self.annotations:
+            self.annotations[new] = self.annotations.pop(taxon)
+
+    def unknown(self, taxa):
+        """
+        Validates taxa used in other blocks - e.g. in a data block or in trees - against the taxa
+        block.
+
+        :return: `list` of the taxa in `taxa` which are not in the taxa block.
+        """
+        return [taxon for taxon in taxa if taxon not in self.taxa]
+
     def _parse_taxa(self, line):
         # if we have a comment then there should be only one taxa on this line e.g.
         #    'test[&!color=#000000,!name="taxon label"]
@@ -1,15 +1,64 @@
 import re
 import typing
+import hashlib
+import functools
+import itertools
 import collections
 
-from clldutils.text import strip_brackets, split_text_with_context
+from clldutils.text import strip_brackets
 import newick
 
 from nexus.handlers import GenericHandler
+from nexus.util import map_chunks
+from nexus.registry import intern_taxon
 from nexus.exceptions import NexusFormatException, TranslateTableException
 
+# Matches the part of a tree line up to the first "(" which is not inside a comment:
+PREAMBLE_PATTERN = re.compile(r"""(?:[^\[(]|\[[^\]]*])*""")
+
+TRANSLATE_START_PATTERN = re.compile(r"""^translate\b""", re.IGNORECASE)
+# Tokens of a translate command: Quoted or unquoted words and punctuation.
+TRANSLATE_TOKEN_PATTERN = re.compile(r"""'(?:[^']|'')*'|[^\s,;']+|[,;]""")
+QUOTED_LABEL_PATTERN = re.compile(r"""'(?:[^']|'')*'""")
+# Characters which require quoting of a taxon label:
+QUOTE_PATTERN = re.compile(r"[\s()\[\],:;'=]")
+
+# Matches leaf labels (i.e. labels following "(" or ",") and - to skip over them - comments:
+LEAF_LABEL_PATTERN = re.compile(r"""
+    \[[^\]]*]                                   # a comment
+    |
+    (?P<start>[(,]\s*)                          # boundary
+    (?P<label>'(?:[^']|'')*'|[^\s()\[\],:;']+)  # quoted or unquoted label
+""", re.VERBOSE)
+
+
+def _memoised(func):
+    """
+    Turns a method into a property, computing the value only once per instance.
+
+    Note: Since `Tree` subclasses `str`, it can't have `__slots__`, so we store the values in the
+    instance `__dict__`.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def getter(self):
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            res = self.__dict__[name] = func(self)
+            return res
+    return property(getter)
+
 
 class Tree(str):
+    """
+    A tree line in a trees block.
+
+    Since `Tree` objects are immutable, the results of parsing - i.e. the preamble, name, rooting
+    and newick string - are computed on first access and then cached. The mutable `newick.Node`
+    is not cached, but parsed on each access of `newick_tree`.
+    """
     @classmethod
     def from_newick(cls,
                     new: typing.Union[str, newick.Node],
@@ -19,14 +68,20 @@ class Tree(str):
         new = new if isinstance(new, str) else new.newick
         return cls('tree {} = {}{}{}'.format(name, rooting, new, '' if new.endswith(';') else ';'))
 
-    @property
+    def __reduce__(self):
+        # Only pickle the tree line, not the cached values.
+        return self.__class__, (str(self),)
+
+    @_memoised
     def name(self):
         m = re.search(
-            r'tree\s+(?P<name>[^=]+)\s*=', strip_brackets(self, {'[': ']'}), re.IGNORECASE)
+            r'tree\s+(?P<name>[^=]+)\s*=',
+            strip_brackets(self.preamble, {'[': ']'}),
+            re.IGNORECASE)
         if m:
             return m.group('name').strip()
 
-    @property
+    @_memoised
     def rooted(self):
         """
         Three-valued attribute, specifying whether tree is rooted, unrooted or unspecified.
@@ -38,15 +93,33 @@ class Tree(str):
             return m.group('rooting') == 'R'
         return None
 
-    @property
+    @_memoised
+    def preamble(self):
+        """The string up to the first "(" which is not inside a comment."""
+        return PREAMBLE_PATTERN.match(self).group().strip()
+
+    @_memoised
     def newick_string(self):
-        # Find the string up to the first "(" which is not inside a comment ...
-        prefix = split_text_with_context(self, separators='(', brackets={'[': ']'})[0]
-        # ... the remainder of the line should be the newick representation of the tree:
-        return self[len(prefix):].strip()
+        # The remainder of the line after the preamble should be the newick representation:
+        return self[len(self.preamble):].strip()
+
+    @_memoised
+    def topology(self):
+        """
+        A hash of the canonical form of the tree's topology, i.e. ignoring branch lengths, comments,
+        labels of internal nodes and the order of children.
+        """
+        from nexus.treeset import canonical_topology
+
+        return hashlib.sha1(
+            canonical_topology(self.newick_string).encode('utf8')).hexdigest()
 
     @property
     def newick_tree(self):
+        """
+        The tree as `newick.Node` - parsed on each access, so it can be manipulated in place
+        without affecting the `Tree`.
+        """
         return newick.loads(self.newick_string)[0]
 
 
@@ -79,42 +152,35 @@ class TreeHandler(GenericHandler):
         self.was_translated = False
         # has detranslate been called?
         self._been_detranslated = False
-        self.translators = {}
+        self.translators = TranslateTable()
         self.attributes = []
         self.trees = []
 
-        translate_start = re.compile(r"""^translate$""", re.IGNORECASE)
-        translation_pattern = re.compile(r"""(\d+)\s(['"\w\d\*\.\_\-]+)[,;]?""")
-
-        lost_in_translation = False
+        # The text of the translate command, which may span any number of lines:
+        translate, lost_in_translation = [], False
         for line in self.block:
             # look for translation start, and turn on lost_in_translation
-            if translate_start.match(line):
+            if TRANSLATE_START_PATTERN.match(line):
                 lost_in_translation = True
                 self.was_translated = True
+                line = line[len('translate'):]
+                translate.append(line)
             elif self.is_mesquite_attribute(line):
                 self.attributes.append(line)
 
             # if we're in a translate block
             elif lost_in_translation:
-                if translation_pattern.match(line):
-                    taxon_id, taxon = translation_pattern.findall(line)[0]
-                    taxon = taxon.strip("'")
-                    if taxon_id in self.translators:
-                        raise NexusFormatException(
-                            "Duplicate Taxa ID %s in translate block" % taxon_id
-                        )
-                    if taxon in self.translators.values():
-                        raise NexusFormatException(
-                            "Duplicate Taxon %s in translate block" % taxon
-                        )
-                    self.translators[taxon_id] = taxon
-                if line.endswith(';'):
-                    lost_in_translation = False
+                translate.append(line)
 
             elif self.is_tree.search(line):
                 self.trees.append(Tree(line))
 
+            if lost_in_translation and ';' in QUOTED_LABEL_PATTERN.sub('', line):
+                lost_in_translation = False
+
+        if translate:
+            self.translators = TranslateTable.parse('\n'.join(translate))
+
         # if there is no translate block then get the list of taxa
         # from the first tree.
         if (not self.translators) and self.trees:
@@ -141,16 +207,170 @@ class TreeHandler(GenericHandler):
     def ntrees(self):
         return len(self.trees)
 
-    def detranslate(self):
-        """Detranslates all trees in the file"""
+    def to_treeset(self):
+        """
+        Converts the trees to a compact `nexus.treeset.TreeSet`, with taxa in the order of the
+        translate table.
+        """
+        res = self._treeset()
+        res.extend(self.trees)
+        return res
+
+    def _treeset(self):
+        from nexus.treeset import TreeSet
+
+        return TreeSet(**self._treeset_kw())
+
+    def _treeset_kw(self):
+        return dict(
+            taxa=list(self.translators.values()),
+            translators=self.translators
+            if self.was_translated and not self._been_detranslated else None)
+
+    def split_frequencies(self, workers=None, executor=None):
+        """
+        Counts the clades in all trees in one pass.
+
+        :param workers: Number of processes to count chunks of trees in parallel.
+        :param executor: Alternatively, a `concurrent.futures.Executor` to use.
+        :return: `nexus.treeset.SplitTable`
+        """
+        from nexus.treeset import SplitTable, count_splits
+
+        kw = self._treeset_kw()
+        tables = map_chunks(
+            functools.partial(count_splits, **kw),
+            self.trees,
+            workers=workers,
+            executor=executor)
+        # There are no chunks - and thus no tables - for an empty trees block. Otherwise, we merge
+        # into the first table rather than into a new one, to not copy its counts:
+        res = tables.pop(0) if tables else SplitTable(kw['taxa'])
+        for table in tables:
+            res.update(table)
+        return res
+
+    def mcc_tree(self, annotate=False, workers=None, executor=None):
+        """
+        Selects the maximum clade credibility tree, i.e. the tree with the highest product of the
+        frequencies of its clades.
+
+        :param annotate: Add the clade frequencies as `[&posterior=...]` comments to the internal \
+            nodes of the tree.
+        :param workers: Number of processes to use for both passes over the trees.
+        :param executor: Alternatively, a `concurrent.futures.Executor` to use.
+        :return: `tuple` (`Tree`, index of the tree).
+        :raises ValueError: if the block contains no trees.
+        """
+        from nexus.treeset import TreeSet, score_trees, annotate_internal_nodes
+
+        if not self.trees:
+            raise ValueError('Cannot select an MCC tree from an empty trees block')
+        splits = self.split_frequencies(workers=workers, executor=executor)
+        translators = self._treeset_kw()['translators']
+        scores = map_chunks(
+            functools.partial(score_trees, splits=splits, translators=translators),
+            self.trees,
+            workers=workers,
+            executor=executor)
+        index = max(range(len(scores)), key=lambda i: scores[i])
+        tree = self.trees[index]
+        if annotate:
+            compact = TreeSet(taxa=splits.taxa, translators=translators).compact(tree)
+            comments = {
+                i: 'posterior={0:.6g}'.format(splits.frequency(clade) if i else 1.0)
+                for i, clade in enumerate(compact.clades()) if compact.leaves[i] < 0}
+            preamble, new = preamble_and_newick(tree)
+            tree = Tree(preamble + annotate_internal_nodes(new, comments))
+        return tree, index
+
+    def annotations(self, workers=None, executor=None):
+        """
+        Parses the `[&key=value,...]` comments of the trees and their nodes, e.g. BEAST's rates
+        and height HPD intervals.
+
+        :param workers: Number of processes to parse chunks of trees in parallel.
+        :param executor: Alternatively, a `concurrent.futures.Executor` to use.
+        :return: `nexus.treeset.Annotations`
+        """
+        from nexus.treeset import Annotations, parse_tree_annotations
+
+        return Annotations(
+            map_chunks(parse_tree_annotations, self.trees, workers=workers, executor=executor))
+
+    def unique_topologies(self, workers=None, executor=None):
+        """
+        Counts the distinct topologies of the trees.
+
+        :param workers: Number of processes to compute topologies of chunks of trees in parallel.
+        :param executor: Alternatively, a `concurrent.futures.Executor` to use.
+        :return: `dict` mapping topology hashes (see `Tree.topology`) to pairs (number of trees, \
+            index of the first tree) - in order of first occurrence.
+        """
+        res = collections.OrderedDict()
+        for i, topology in enumerate(map_chunks(
+                _topologies, self.trees, workers=workers, executor=executor)):
+            if topology in res:
+                res[topology][0] += 1
+            else:
+                res[topology] = [1, i]
+        return collections.OrderedDict((k, tuple(v)) for k, v in res.items())
+
+    def detranslate(self, workers=None, executor=None):
+        """
+        Detranslates all trees in the file
+
+        :param workers: Number of processes to detranslate chunks of trees in parallel.
+        :param executor: Alternatively, a `concurrent.futures.Executor` to use.
+        """
         if not self._been_detranslated:
-            for idx, tree in enumerate(self.trees):
-                self.trees[idx] = Tree(self._detranslate_tree(tree, self.translators))
+            self.trees = map_chunks(
+                functools.partial(_detranslate_trees, translatetable=self.translators),
+                self.trees,
+                workers=workers,
+                executor=executor)
             self._been_detranslated = True
 
+    def prune(self, taxa, workers=None, executor=None):
+        """
+        Restricts all trees to a subset of the taxa, removing all other leaves - and the internal
+        nodes made redundant - from the trees, and the taxa from the translate table.
+
+        Trees are pruned in their tokenized form - see `nexus.treeset.prune_newick` - so comments
+        of the remaining nodes are retained. The IDs of the remaining taxa in the translate table
+        are renumbered consecutively.
+
+        :param taxa: Iterable of labels of the taxa to keep.
+        :param workers: Number of processes to prune chunks of trees in parallel.
+        :param executor: Alternatively, a `concurrent.futures.Executor` to use.
+        """
+        from nexus.treeset import prune_trees
+
+        taxa = set(taxa)
+        kept = sorted(
+            ((taxon_id, taxon) for taxon_id, taxon in self.translators.items() if taxon in taxa),
+            key=lambda i: taxon_id_key(i[0]))
+        if not kept:
+            raise ValueError('None of the taxa to keep are found in the trees')
+        if self.was_translated and not self._been_detranslated:
+            keep = {str(taxon_id): str(i) for i, (taxon_id, _) in enumerate(kept, start=1)}
+        else:
+            keep = {taxon for _, taxon in kept}
+        self.trees = [tree for tree in map_chunks(
+            functools.partial(prune_trees, keep=keep),
+            self.trees,
+            workers=workers,
+            executor=executor) if tree is not None]
+        self.translators = TranslateTable(
+            (str(i) if self.was_translated else i, taxon) for i, (_, taxon) in enumerate(kept, 1))
+
     @staticmethod
     def _findall_chunks(tree):
-        """Helper function to find groups used by detranslate."""
+        """
+        Helper function to find taxon labels and their branch lengths and comments.
+
+        Note: Detranslation uses the faster `_relabel_tree`.
+        """
 
         # check for beast tree or not -> decide which regex to use
         if '{' in tree and '[' in tree:  # sufficient?
@@ -173,7 +393,52 @@ class TreeHandler(GenericHandler):
             index = match.end()
         return matches
 
-    def _detranslate_tree(self, tree, translatetable):
+    def translate(self):
+        """
+        Replaces the taxon labels in all trees with numeric IDs listed in a translate table.
+
+        This is the inverse of `detranslate`, and shrinks files with many trees and long taxon
+        labels considerably.
+        """
+        if self.was_translated and not self._been_detranslated:
+            return
+        table = TranslateTable(
+            (str(taxon_id), taxon) for taxon_id, taxon in self.translators.items())
+        for idx, tree in enumerate(self.trees):
+            self.trees[idx] = Tree(self._relabel_tree(tree, table.ids)[0])
+        self.translators = table
+        self.was_translated = True
+        self._been_detranslated = False
+
+    @staticmethod
+    def _relabel_tree(tree, table):
+        """
+        Replaces the leaf labels of `tree` which are keys in `table` with the mapped values.
+
+        The tree is rebuilt in a single pass, skipping over comments - which may contain anything
+        looking like a leaf label, e.g. in BEAST's `[&height_95%_HPD={0.0,4.54}]`.
+
+        :return: `tuple` of the relabeled tree and the number of leaves found.
+        """
+        preamble, new = preamble_and_newick(tree)
+        nleaves = 0
+
+        def relabel(m):
+            nonlocal nleaves
+            start, label = m.groups()
+            if label is None:  # a comment
+                return m.group()
+            nleaves += 1
+            try:
+                return start + table[label]
+            except KeyError:
+                return m.group()
+
+        new = LEAF_LABEL_PATTERN.sub(relabel, new)
+        return preamble + new, nleaves
+
+    @staticmethod
+    def _detranslate_tree(tree, translatetable):
         """
         Takes a `tree` and expands the short format tree with translated
         taxa labels from `translatetable` into a full format tree.
@@ -186,55 +451,176 @@ class TreeHandler(GenericHandler):
 
         :return: String of detranslated tree
         """
-        preamble, new = preamble_and_newick(tree)
-        i = 0
-        for i, found in enumerate(self._findall_chunks(new), start=1):
-            if found['taxon'] in translatetable:
-                taxon = translatetable[found['taxon']]
-                # beast tree
-                if found['comment'] and found['branch'] and 'comment2' in found:
-                    sub = "{}{}:{}{}".format(
-                        taxon,
-                        found['comment'],
-                        found['comment2'] if found['comment2'] else "",
-                        found['branch'])
-                elif found['comment'] and found['branch']:
-                    # comment and branch
-                    sub = "%s:%s%s" % \
-                        (taxon, found['comment'], found['branch'])
-                elif found['comment']:
-                    # comment only
-                    sub = "%s%s" % (taxon, found['comment'])
-                elif found['branch']:
-                    # branch only
-                    sub = "%s:%s" % (taxon, found['branch'])
-                else:
-                    # taxon only
-                    sub = taxon
-                sub = "%s%s%s" % (found['start'], sub, found['end'])
-                new = new.replace(found['match'], sub)
-
+        tree, i = TreeHandler._relabel_tree(tree, translatetable)
         if len(translatetable) and len(translatetable) != i:
             raise TranslateTableException(
                 "Mismatch between translate table size (n={}) and expected taxa in trees "
                 "(n={})".format(len(translatetable), i))
-        return preamble + new
+        return tree
 
     def iter_lines(self):
         for attr in self.attributes:
             yield "\t" + attr
         if self.was_translated and not self._been_detranslated:
-            yield '\ttranslate'
-            translator_keys = [int(k) for k in self.translators.keys()]
-            for i, index in enumerate(sorted(translator_keys), start=1):
-                yield "\t%d %s%s" % (
-                    index, self.translators[str(index)], '' if i == len(translator_keys) else ',')
-            # work around bug https://github.com/CompEvol/beast2/issues/713
-            yield ';'
+            translators = self.translators
+            if not isinstance(translators, TranslateTable):
+                translators = TranslateTable(translators)
+            yield from translators.iter_lines()
         for tree in self.trees:
             yield "\t" + tree
 
 
+def _topologies(trees):
+    return [tree.topology for tree in trees]
+
+
+def _detranslate_trees(trees, translatetable):
+    return [Tree(TreeHandler._detranslate_tree(tree, translatetable)) for tree in trees]
+
+
+class TranslateTable(dict):
+    """
+    A translate table, i.e. a `dict` mapping taxon IDs to taxa, with the inverse mapping of taxa
+    to IDs available as `ids`. Both lookups as well as checks for duplicates are O(1).
+
+    .. code-block:: python
+
+        >>> table = TranslateTable.parse("1 Harry, 2 'Simon B.';")
+        >>> table['2'], table.ids['Harry']
+        ('Simon B.', '1')
+        >>> table.add('Betty')
+        '3'
+
+    Note: Looking up an unknown taxon in `ids` adds it with the next free numeric ID - so `ids`
+    can be used to relabel trees while collecting the translate table.
+    """
+    def __init__(self, *args, **kw):
+        super(TranslateTable, self).__init__()
+        self.ids = _TaxonIds(self)
+        self._next_id = 1
+        self.update(*args, **kw)
+
+    def __reduce__(self):
+        return self.__class__, (list(self.items()),)
+
+    @classmethod
+    def parse(cls, text):
+        """
+        Parses the entries of a translate command, i.e. pairs of taxon ID and - possibly quoted -
+        taxon label separated by commas and terminated by a semicolon, split or packed across
+        lines in any way.
+
+        :raises NexusFormatException: for duplicate IDs or taxa and incomplete entries.
+        """
+        res, entry = cls(), []
+        for token in itertools.chain(TRANSLATE_TOKEN_PATTERN.findall(text), [';']):
+            if token not in ',;':
+                entry.append(token)
+                continue
+            # Entries should be separated by commas, but we also accept pairs separated by space:
+            if len(entry) % 2:
+                raise NexusFormatException(
+                    "Invalid entry in translate block: %s" % ' '.join(entry))
+            for taxon_id, taxon in zip(entry[::2], entry[1::2]):
+                if taxon[0] == "'":
+                    taxon = taxon[1:-1].replace("''", "'")
+                if taxon_id in res:
+                    raise NexusFormatException(
+                        "Duplicate Taxa ID %s in translate block" % taxon_id)
+                if taxon in res.ids:
+                    raise NexusFormatException(
+                        "Duplicate Taxon %s in translate block" % taxon)
+                res[taxon_id] = taxon
+            entry = []
+        return res
+
+    def __setitem__(self, taxon_id, taxon):
+        if taxon_id in self:
+            self._forget(taxon_id)
+        taxon = intern_taxon(taxon)
+        super(TranslateTable, self).__setitem__(taxon_id, taxon)
+        if taxon not in self.ids:  # For duplicate taxa, `ids` keeps the first ID.
+            self.ids[taxon] = taxon_id
+        if str(taxon_id).isdigit():
+            self._next_id = max(self._next_id, int(taxon_id) + 1)
+
+    def _forget(self, taxon_id):
+        if self.ids.get(self[taxon_id]) == taxon_id:
+            del self.ids[self[taxon_id]]
+
+    def __delitem__(self, taxon_id):
+        self._forget(taxon_id)
+        super(TranslateTable, self).__delitem__(taxon_id)
+
+    def pop(self, taxon_id, *args):
+        if taxon_id in self:
+            self._forget(taxon_id)
+        return super(TranslateTable, self).pop(taxon_id, *args)
+
+    def popitem(self):
+        taxon_id, taxon = super(TranslateTable, self).popitem()
+        if self.ids.get(taxon) == taxon_id:
+            del self.ids[taxon]
+        return taxon_id, taxon
+
+    def setdefault(self, taxon_id, taxon=None):
+        if taxon_id not in self:
+            self[taxon_id] = taxon
+        return self[taxon_id]
+
+    def clear(self):
+        super(TranslateTable, self).clear()
+        self.ids.clear()
+
+    def update(self, *args, **kw):
+        for taxon_id, taxon in dict(*args, **kw).items():
+            self[taxon_id] = taxon
+
+    def add(self, taxon):
+        """
+        Adds a taxon - unless it is already in the table - with the next free numeric ID.
+
+        :return: The ID of the taxon.
+        """
+        if taxon not in self.ids:
+            self[str(self._next_id)] = taxon
+        return self.ids[taxon]
+
+    def iter_lines(self, indent='\t'):
+        """
+        Generates the lines of a translate command, with entries ordered by numeric ID.
+
+        Note: Labels taken from trees - rather than from a translate command - are already quoted.
+        """
+        yield indent + 'translate'
+        for i, taxon_id in enumerate(sorted(self, key=taxon_id_key), start=1):
+            taxon = self[taxon_id]
+            if QUOTE_PATTERN.search(taxon) and not QUOTED_LABEL_PATTERN.fullmatch(taxon):
+                taxon = "'{0}'".format(taxon.replace("'", "''"))
+            yield '%s%s %s%s' % (indent, taxon_id, taxon, '' if i == len(self) else ',')
+        # work around bug https://github.com/CompEvol/beast2/issues/713
+        yield ';'
+
+
+class _TaxonIds(dict):
+    """
+    The inverse mapping of a `TranslateTable`, adding unknown taxa to the table upon lookup.
+    """
+    def __init__(self, table):
+        super(_TaxonIds, self).__init__()
+        self.table = table
+
+    def __missing__(self, taxon):
+        return self.table.add(taxon)
+
+
+def taxon_id_key(taxon_id):
+    """
+    Sort key for taxon IDs of a translate table, ordering numeric IDs numerically before others.
+    """
+    return (0, int(taxon_id), '') if str(taxon_id).isdigit() else (1, 0, str(taxon_id))
+
+
 def preamble_and_newick(tree):
     """
     Find (and split at) the first non-bracketed "="
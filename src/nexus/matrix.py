@@ -0,0 +1,169 @@
+"""
+Compact storage for character matrices
+"""
+import array
+import operator
+import collections.abc
+
+
+class _Column(collections.abc.MutableMapping):
+    """A view of one character in a `CodedMatrix` as mapping of taxa to values."""
+    def __init__(self, matrix, character):
+        self.matrix = matrix
+        self.character = character
+
+    def __getitem__(self, taxon):
+        value = self.matrix.get_value(taxon, self.character)
+        if value is None:
+            raise KeyError(taxon)
+        return value
+
+    def get(self, taxon, default=None):
+        value = self.matrix.get_value(taxon, self.character)
+        return default if value is None else value
+
+    def __contains__(self, taxon):
+        return self.matrix.get_value(taxon, self.character) is not None
+
+    def __setitem__(self, taxon, value):
+        self.matrix.set_value(taxon, self.character, value)
+
+    def __delitem__(self, taxon):
+        if self.matrix.get_value(taxon, self.character) is None:
+            raise KeyError(taxon)
+        self.matrix.set_value(taxon, self.character, None)
+
+    def __iter__(self):
+        j = self.matrix.characters.get(self.character)
+        if j is not None:
+            for taxon, i in self.matrix.taxa.items():
+                row = self.matrix.rows[i]
+                if j < len(row) and row[j]:
+                    yield taxon
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class CodedMatrix(collections.abc.MutableMapping):
+    """
+    A character matrix storing values as integer codes into a symbol table.
+
+    The matrix behaves like the `dict` of characters mapping to `dict`s of taxa and values used by
+    `NexusWriter`, but stores one `array.array` of codes per taxon. Rows grow in chunks of
+    `CHUNK_SIZE` characters, and use one byte per cell as long as there are less than 256 distinct
+    values.
+    """
+    CHUNK_SIZE = 1024
+
+    def __init__(self):
+        self.taxa = {}  # taxon -> row index
+        self.characters = {}  # character -> column index
+        self.rows = []
+        self.symbols = [None]  # code -> value, code 0 marks missing values.
+        self._codes = {}  # value -> code
+        self._typecode = 'B'
+
+    def __getitem__(self, character):
+        return _Column(self, character)
+
+    def __setitem__(self, character, values):
+        for taxon, value in values.items():
+            self.set_value(taxon, character, value)
+
+    def __delitem__(self, character):
+        j = self.characters.pop(character)
+        for c, k in self.characters.items():
+            if k > j:
+                self.characters[c] = k - 1
+        for row in self.rows:
+            if j < len(row):
+                del row[j]
+
+    def __iter__(self):
+        return iter(self.characters)
+
+    def __len__(self):
+        return len(self.characters)
+
+    def __contains__(self, character):
+        return character in self.characters
+
+    def pop(self, character, *args):
+        if character not in self.characters and args:
+            return args[0]
+        values = dict(self[character])
+        del self[character]
+        return values
+
+    def _code(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.symbols)
+            self.symbols.append(value)
+            if code == 256:
+                self._typecode = 'H'
+                self.rows = [array.array(self._typecode, row) for row in self.rows]
+        return code
+
+    def get_value(self, taxon, character):
+        i, j = self.taxa.get(taxon), self.characters.get(character)
+        if i is None or j is None:
+            return None
+        row = self.rows[i]
+        return self.symbols[row[j]] if j < len(row) else None
+
+    def set_value(self, taxon, character, value):
+        """Sets the value of `character` for `taxon`, `None` removes the value."""
+        if value is None:
+            i, j = self.taxa.get(taxon), self.characters.get(character)
+            if i is not None and j is not None and j < len(self.rows[i]):
+                self.rows[i][j] = 0
+            return
+        code = self._codes.get(value)
+        if code is None:
+            code = self._code(value)
+        i = self.taxa.get(taxon)
+        if i is None:
+            i = self.taxa[taxon] = len(self.rows)
+            self.rows.append(array.array(self._typecode))
+        j = self.characters.get(character)
+        if j is None:
+            j = self.characters[character] = len(self.characters)
+        row = self.rows[i]
+        if j >= len(row):
+            row.extend(bytes(max(self.CHUNK_SIZE, j + 1 - len(row))))
+        row[j] = code
+
+    def iter_rows(self, taxa, characters, missing, wrap=None):
+        """
+        Generates the values of `characters` as one string per taxon.
+
+        :param missing: Symbol used for missing values.
+        :param wrap: Optional format string for values of more than one character.
+        """
+        cols = [self.characters[c] for c in characters]
+        ncols = len(cols)
+        identity = cols == list(range(ncols))
+        getter = operator.itemgetter(*cols) if ncols > 1 else None
+        labels = {0: missing}
+        for code, value in enumerate(self.symbols[1:], start=1):
+            labels[code] = wrap % value if (wrap and len(value) > 1) else value
+
+        for taxon in taxa:
+            row = self.rows[self.taxa[taxon]]
+            if len(row) < ncols:
+                row.extend(bytes(ncols - len(row)))
+            if identity:
+                codes = row[:ncols]
+            elif getter:
+                codes = array.array(self._typecode, getter(row))
+            else:
+                codes = array.array(self._typecode, [row[c] for c in cols])
+            if self._typecode == 'B':
+                yield codes.tobytes().decode('latin-1').translate(labels)
+            else:
+                yield ''.join(map(chr, codes)).translate(labels)
@@ -10,7 +10,7 @@ from nexus.handlers import GenericHandler
 from nexus.handlers import BEGIN_PATTERN, END_PATTERN
 from nexus.handlers.taxa import TaxaHandler
 from nexus.handlers.data import CharacterHandler, DataHandler
-from nexus.handlers.tree import TreeHandler
+from nexus.handlers.tree import TreeHandler, Tree
 from nexus.exceptions import NexusFormatException
 
 HANDLERS = {
@@ -144,16 +144,19 @@ class NexusReader(object):
             yield block, lines
 
     @staticmethod
-    def _blocks_from_file(filename, encoding='utf-8-sig'):
+    def _open(filename, encoding='utf-8-sig'):
         filename = pathlib.Path(filename)
 
         if not (filename.exists() and filename.is_file()):
             raise IOError("Unable To Read File %s" % filename)
 
         if filename.suffix == '.gz':
-            handle = gzip.open(str(filename), 'rt', encoding=encoding)
-        else:
-            handle = filename.open('r', encoding=encoding)
+            return gzip.open(str(filename), 'rt', encoding=encoding)
+        return filename.open('r', encoding=encoding)
+
+    @staticmethod
+    def _blocks_from_file(filename, encoding='utf-8-sig'):
+        handle = NexusReader._open(filename, encoding=encoding)
         res = NexusReader._iter_blocks(handle.readlines())
         handle.close()
         return res
@@ -189,3 +192,80 @@ class NexusReader(object):
         """
         with pathlib.Path(filename).open('w', encoding='utf8') as handle:
             handle.writelines(self.write())
+
+
+class TreeStream(object):
+    """
+    Reads the trees block of a nexus file one tree at a time, i.e. with constant memory.
+
+    .. code-block:: python
+
+        >>> trees = TreeStream('posterior.trees')
+        >>> for tree in trees:
+        ...     print(tree.name)
+        >>> trees.translators
+        {'1': 'Harry', '2': 'Simon'}
+
+    The translate table - `translators` and `was_translated` as for `TreeHandler` - is available
+    once the first tree has been read.
+    """
+    def __init__(self, filename, encoding='utf-8-sig'):
+        self.filename = filename
+        self.encoding = encoding
+        self.translators = {}
+        self.was_translated = False
+
+    def _iter_lines(self):
+        """Generates the lines of the trees block."""
+        handle = NexusReader._open(self.filename, encoding=self.encoding)
+        try:
+            in_trees = False
+            for line in handle:
+                line = line.strip()
+                if not line or (line.startswith('[') and line.endswith(']')):
+                    continue
+                start = BEGIN_PATTERN.findall(line)
+                if start:
+                    if in_trees:
+                        break  # "end" is optional.
+                    in_trees = start[0][0].lower() == 'trees'
+                if in_trees:
+                    yield line
+                    if END_PATTERN.search(line):
+                        break
+        finally:
+            handle.close()
+
+    def __iter__(self):
+        header = []
+        for line in self._iter_lines():
+            if TreeHandler.is_tree.search(line):
+                if header is not None:
+                    # We parse the translate table using `TreeHandler`, passing the first tree as
+                    # well, to derive the taxa from it if there is no translate table.
+                    handler = TreeHandler(name='trees', data=header + [line])
+                    self.translators = handler.translators
+                    self.was_translated = handler.was_translated
+                    header = None
+                yield Tree(line)
+            elif header is not None:
+                header.append(line)
+
+    def blocks(self):
+        """
+        :return: `list` of the (lowercased) names of all blocks in the file, read without parsing \
+            the blocks.
+        """
+        handle = NexusReader._open(self.filename, encoding=self.encoding)
+        try:
+            return [
+                start[0][0].lower() for start in (BEGIN_PATTERN.findall(line) for line in handle)
+                if start]
+        finally:
+            handle.close()
+
+    def count(self):
+        """
+        :return: The number of trees, counted without parsing the trees.
+        """
+        return sum(1 for line in self._iter_lines() if TreeHandler.is_tree.search(line))
@@ -0,0 +1,24 @@
+"""
+Interning of taxon labels.
+
+Taxon labels are stored in many places - as keys of `DataHandler.matrix`, in `TaxaHandler.taxa`,
+as values of `TreeHandler.translators` and in the per-character dicts of `NexusWriter.data`.
+Interning the labels upon parsing makes all these places - across blocks and files - share one
+`str` instance per label.
+
+Labels are interned with `sys.intern`, i.e. an interned label is released once no block or file
+refers to it anymore, so long-running processes reading many files don't accumulate labels.
+"""
+import sys
+
+__all__ = ['intern_taxon']
+
+
+def intern_taxon(label):
+    """
+    :return: The canonical `str` instance equal to `label` - or `label` itself, if it isn't a \
+        `str`, e.g. `None` for unlabeled nodes in translate tables.
+    """
+    if not isinstance(label, str):
+        return label
+    return sys.intern(str(label))  # `sys.intern` doesn't accept subclasses of `str`.
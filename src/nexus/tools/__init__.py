@@ -8,8 +8,10 @@ from nexus.tools.sites import new_nexus_without_sites
 from nexus.tools.sites import tally_by_site
 from nexus.tools.sites import tally_by_taxon
 from nexus.tools.sites import count_binary_set_size
+from nexus.tools.distances import rf_distances
 from nexus.tools.trees import (
-    delete_trees, sample_trees, strip_comments_in_trees, visit_trees, visit_tree_nodes)
+    delete_trees, sample_trees, strip_comments_in_trees, visit_trees, visit_tree_nodes,
+    dedupe_trees)
 
 __all__ = [
     "binarise",
@@ -30,4 +32,6 @@ __all__ = [
     "strip_comments_in_trees",
     "visit_trees",
     "visit_tree_nodes",
+    "dedupe_trees",
+    "rf_distances",
 ]
@@ -82,7 +82,7 @@ def binarise(nexus_obj, keep_zero=False):
     :raises AssertionError: if nexus_obj is not a nexus
     :raises NexusFormatException: if nexus_obj does not have a `data` block
     """
-    n = NexusWriter()
+    n = NexusWriter(storage='array')
 
     for i in sorted(nexus_obj.data.charlabels):
         label = nexus_obj.data.charlabels[i]  # character label
@@ -1,6 +1,9 @@
 import os
 
 from nexus import NexusWriter
+from nexus.handlers.tree import (
+    Tree, TreeHandler, TranslateTable, _detranslate_trees, taxon_id_key,
+)
 from .util import get_nexus_reader
 
 
@@ -33,10 +36,60 @@ def combine_nexuses(*nexuslist):
 
 def combine_treeblocks(out, nexuslist):
     for nex in nexuslist:
-        out.trees.extend(nex.trees.trees)
+        if nex.trees.was_translated and not nex.trees._been_detranslated:
+            # Translate tables may number taxa differently, so we add the trees with labels:
+            out.trees.extend(_detranslate_trees(nex.trees.trees, nex.trees.translators))
+        else:
+            out.trees.extend(nex.trees.trees)
     return out
 
 
+def combine_tree_files(filenames, output, burnin=0, every_nth=None, log=None):
+    """
+    Merges the trees of several nexus files - e.g. of independent MCMC runs - into one tree file,
+    in one streaming pass per file, i.e. with constant memory.
+
+    The trees are written with a translate table unifying the translate tables of all files (or
+    the taxa of the first tree, for files without translate table), and relabeled accordingly.
+
+    :param filenames: Paths of the nexus files.
+    :param output: Path or file-like object to write the trees to, see `TreeWriter`.
+    :param burnin: Number of trees - or percentage of trees as string like `10%` - to discard \
+        from the start of each file.
+    :param every_nth: Only keep every `every_nth` tree of each file after the burn-in.
+    :return: The number of trees written.
+    """
+    from nexus.reader import TreeStream
+    from nexus.writer import TreeWriter
+    from nexus.tools.trees import iter_thinned_trees, burnin_count
+
+    streams = [TreeStream(fname) for fname in filenames]
+    table = TranslateTable()
+    for stream in streams:
+        # The translate table of a stream is known once the first tree has been read:
+        trees = iter(stream)
+        next(trees, None)
+        trees.close()
+        for _, taxon in sorted(stream.translators.items(), key=lambda i: taxon_id_key(i[0])):
+            table.add(taxon)
+
+    with TreeWriter(output, translate=table) as writer:
+        for fname, stream in zip(filenames, streams):
+            relabel = {
+                str(taxon_id) if stream.was_translated else taxon: table.ids[taxon]
+                for taxon_id, taxon in stream.translators.items()}
+            ntrees = writer.ntrees
+            for tree in iter_thinned_trees(
+                    stream,
+                    burnin=burnin_count(
+                        burnin, stream.count() if isinstance(burnin, str) else None),
+                    every_nth=every_nth):
+                writer.add(Tree(TreeHandler._relabel_tree(tree, relabel)[0]))
+            if log:
+                log.info("%d trees from %s" % (writer.ntrees - ntrees, fname))
+    return writer.ntrees
+
+
 def combine_datablocks(out, nexuslist):
     charpos = 0
     for nex_id, nex in enumerate(nexuslist, 1):
@@ -0,0 +1,179 @@
+"""
+Distances between trees
+"""
+import mmap
+import array
+import random
+import pathlib
+import functools
+import contextlib
+import concurrent.futures
+
+from ..treeset import TreeSet
+from ..util import map_chunks
+from .util import get_nexus_reader
+
+__all__ = ['DistanceMatrix', 'rf_distances']
+
+ROW_BLOCK_SIZE = 1024
+
+
+class DistanceMatrix(object):
+    """
+    A matrix of integer distances, stored as 32-bit integers in row-major order - in memory or,
+    for very large matrices, in a memory-mapped file.
+
+    .. code-block:: python
+
+        >>> with rf_distances(nex, filename='rf.bin') as matrix:
+        ...     print(matrix[0, 1])
+    """
+    def __init__(self, rows, columns, filename=None):
+        """
+        :param rows: `list` of indices of the trees in the rows.
+        :param columns: `list` of indices of the trees in the columns.
+        :param filename: Path of a file to store the matrix in.
+        """
+        self.rows, self.columns = rows, columns
+        self.filename = pathlib.Path(filename) if filename else None
+        size = len(rows) * len(columns) * 4
+        self._mmap = None
+        if self.filename and size:
+            with self.filename.open('w+b') as fp:
+                fp.truncate(size)
+                self._mmap = mmap.mmap(fp.fileno(), size)
+        self.values = memoryview(self._mmap if self._mmap else bytearray(size)).cast('i')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.values.release()
+        if self._mmap:
+            self._mmap.close()
+            self._mmap = None
+
+    @property
+    def shape(self):
+        return len(self.rows), len(self.columns)
+
+    def __getitem__(self, index):
+        i, j = index
+        return self.values[i * len(self.columns) + j]
+
+    def __setitem__(self, index, value):
+        i, j = index
+        self.values[i * len(self.columns) + j] = value
+
+    def row(self, i):
+        """
+        :return: `array` of the values in row `i`.
+        """
+        return array.array('i', self.values[i * len(self.columns):(i + 1) * len(self.columns)])
+
+    def __iter__(self):
+        for i in range(len(self.rows)):
+            yield self.row(i)
+
+
+def _tree_splits(nexus_obj, taxa, ids, rooted):
+    """
+    Encodes the splits of all trees, mapping the bitset of each distinct split to an integer ID.
+
+    :param taxa: Shared `list` of taxon labels, extended with taxa not seen before.
+    :param ids: Shared `dict` mapping splits to IDs.
+    """
+    trees = nexus_obj.trees
+    treeset = TreeSet(
+        taxa=taxa,
+        translators=trees.translators if trees.was_translated and not trees._been_detranslated
+        else None)
+    res = []
+    for tree in trees.trees:
+        tree = treeset.compact(tree)
+        if len(treeset.taxa) > len(taxa):  # The tree contains new taxa.
+            taxa.extend(treeset.taxa[len(taxa):])
+        res.append(frozenset(ids.setdefault(split, len(ids)) for split in tree.splits(rooted)))
+    return res
+
+
+def _rf_rows(rows, splits, symmetric):
+    """
+    Computes rows of RF distances - for a symmetric matrix only the part above the diagonal.
+
+    :param rows: `list` of pairs (row index, splits).
+    :param splits: `list` of splits of the trees in the columns.
+    """
+    res, sizes = [], [len(s) for s in splits]
+    for i, row_splits in rows:
+        # The size of the symmetric difference, computed via the - cheaper - intersection:
+        size, intersection = len(row_splits), row_splits.intersection
+        start = i + 1 if symmetric else 0
+        row = array.array('i', [0]) * start
+        row.extend([
+            size + sizes[j] - 2 * len(intersection(splits[j])) for j in range(start, len(splits))])
+        res.append(row)
+    return res
+
+
+def rf_distances(nexus_obj,
+                 other=None,
+                 rooted=False,
+                 sample=None,
+                 seed=None,
+                 filename=None,
+                 workers=None,
+                 executor=None):
+    """
+    Computes the Robinson-Foulds distances between trees, i.e. the number of splits found in only
+    one of two trees.
+
+    The splits of each tree are encoded once - as bitsets over a taxon index shared by all trees -
+    and each distinct split is mapped to an integer, so that distances can be computed as size of
+    the symmetric difference of integer sets.
+
+    :param nexus_obj: A `NexusReader` (or something `get_nexus_reader` accepts) with trees.
+    :param other: Optional second nexus with trees. If given, distances between the trees in \
+        `nexus_obj` (rows) and the trees in `other` (columns) are computed. Taxa are matched by \
+        label, so differing translate tables are aligned automatically.
+    :param rooted: Compare clades of rooted trees rather than bipartitions of unrooted trees.
+    :param sample: Compute distances only for a random sample of this many trees (per nexus).
+    :param seed: Seed for the random number generator used for sampling.
+    :param filename: Store the matrix in a memory-mapped file.
+    :param workers: Number of processes to compute chunks of rows in parallel.
+    :param executor: Alternatively, a `concurrent.futures.Executor` to use.
+    :return: `DistanceMatrix`
+    """
+    nexus_obj = get_nexus_reader(nexus_obj)
+    taxa, ids = list(nexus_obj.trees.taxa), {}
+    splits = _tree_splits(nexus_obj, taxa, ids, rooted)
+    other_splits = _tree_splits(get_nexus_reader(other), taxa, ids, rooted) if other else splits
+
+    rnd = random.Random(seed)
+
+    def indices(n):
+        return sorted(rnd.sample(range(n), sample)) if sample and sample < n else list(range(n))
+
+    rows = indices(len(splits))
+    columns = indices(len(other_splits)) if other else rows
+
+    res = DistanceMatrix(rows, columns, filename=filename)
+    func = functools.partial(
+        _rf_rows, splits=[other_splits[j] for j in columns], symmetric=not other)
+    items = [(i, splits[index]) for i, index in enumerate(rows)]
+    ncols = len(columns)
+    with contextlib.ExitStack() as stack:
+        if executor is None and (workers or 1) > 1:
+            executor = stack.enter_context(concurrent.futures.ProcessPoolExecutor(workers))
+        # We compute blocks of rows, to keep memory usage bounded for big matrices:
+        for start in range(0, len(items), ROW_BLOCK_SIZE):
+            values = map_chunks(func, items[start:start + ROW_BLOCK_SIZE], executor=executor)
+            for i, row in enumerate(values, start=start):
+                res.values[i * ncols:(i + 1) * ncols] = memoryview(row)
+    if not other:  # Copy the upper triangle of the symmetric matrix to the lower triangle.
+        for i in range(ncols):
+            res.values[i * ncols:i * ncols + i] = res.values[i:i * ncols:ncols]
+    return res
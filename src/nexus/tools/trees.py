@@ -1,8 +1,17 @@
+import array
 import random
+import pathlib
 import functools
+import itertools
+import contextlib
+import concurrent.futures
 
-from ..handlers.tree import Tree
-from .util import with_nexus_reader
+from ..handlers.tree import Tree, preamble_and_newick
+from ..handlers import GenericHandler
+from ..util import map_chunks
+from .util import with_nexus_reader, get_nexus_reader
+
+TREE_BLOCK_SIZE = 10000
 
 
 def replace_trees(func):
@@ -22,9 +31,30 @@ def replace_trees(func):
     return _
 
 
+def _visit_trees(trees, visitor):
+    res = []
+    for tree in trees:
+        new = visitor(tree.newick_tree)
+        res.append(Tree.from_newick(new, name=tree.name, rooted=tree.rooted) if new else None)
+    return res
+
+
+def _visit_tree_nodes(trees, visitor):
+    res = []
+    for tree in trees:
+        ntree = tree.newick_tree
+        ntree.visit(visitor)
+        res.append(Tree.from_newick(ntree, name=tree.name, rooted=tree.rooted))
+    return res
+
+
+def _strip_comments(trees):
+    return [Tree(GenericHandler.remove_comments(tree)) for tree in trees]
+
+
 @with_nexus_reader
 @replace_trees
-def visit_trees(nexus_obj, visitor, log=None):
+def visit_trees(nexus_obj, visitor, log=None, workers=None, executor=None):
     """
     Manipulate all trees in a `NexusReader` by running a callable with the following signature:
 
@@ -34,25 +64,35 @@ def visit_trees(nexus_obj, visitor, log=None):
 
     If the visitor returns `None`, the tree is deleted, otherwise replaced with the returned
     newick representation.
+
+    :param workers: Number of processes to visit chunks of trees in parallel - requires a \
+        picklable `visitor`, e.g. a module-level function.
+    :param executor: Alternatively, a `concurrent.futures.Executor` to use.
     """
-    for tree in nexus_obj.trees:
-        res = visitor(tree.newick_tree)
-        if res:
-            yield Tree.from_newick(res, name=tree.name, rooted=tree.rooted)
+    trees = map_chunks(
+        functools.partial(_visit_trees, visitor=visitor),
+        nexus_obj.trees,
+        workers=workers,
+        executor=executor)
+    yield from (tree for tree in trees if tree)
 
 
 @with_nexus_reader
 @replace_trees
-def visit_tree_nodes(nexus_obj, visitor, log=None):
+def visit_tree_nodes(nexus_obj, visitor, log=None, workers=None, executor=None):
     """
     Manipulate all trees in a `NexusReader` by running a callable on each node of each tree.
 
     :param visitor: callable suitable for passing into `newick.Node.visit`.
+    :param workers: Number of processes to visit chunks of trees in parallel - requires a \
+        picklable `visitor`, e.g. a module-level function.
+    :param executor: Alternatively, a `concurrent.futures.Executor` to use.
     """
-    for tree in nexus_obj.trees:
-        ntree = tree.newick_tree
-        ntree.visit(visitor)
-        yield Tree.from_newick(ntree, name=tree.name, rooted=tree.rooted)
+    yield from map_chunks(
+        functools.partial(_visit_tree_nodes, visitor=visitor),
+        nexus_obj.trees,
+        workers=workers,
+        executor=executor)
 
 
 @with_nexus_reader
@@ -75,11 +115,70 @@ def delete_trees(nexus_obj, delitems, log=None):
             yield tree
 
 
+def burnin_count(burnin, ntrees=None):
+    """
+    Converts a burn-in specification into a number of trees.
+
+    :param burnin: A number of trees, or a percentage of trees as string like `10%`.
+    :param ntrees: The total number of trees, required for percentages.
+    """
+    if isinstance(burnin, str) and burnin.strip().endswith('%'):
+        assert ntrees is not None, 'Percentage burn-in requires the number of trees'
+        return int(ntrees * float(burnin.strip()[:-1]) / 100)
+    return int(burnin or 0)
+
+
+def iter_thinned_trees(trees, burnin=0, every_nth=None):
+    """
+    Skips the first `burnin` trees and keeps every `every_nth` tree of the remaining ones.
+
+    :param trees: An iterable of trees - consumed lazily.
+    :param burnin: Number of trees to skip.
+    """
+    for index, tree in enumerate(itertools.islice(trees, burnin, None), 1):
+        if not every_nth or index % every_nth == 0:
+            yield tree
+
+
+def reservoir_sample(items, k, rnd=random):
+    """
+    Samples `k` items uniformly from an iterable of unknown length in one pass, keeping only `k`
+    items in memory.
+
+    :param rnd: A random number generator, e.g. `random.Random(seed)`.
+    :return: `list` of the sampled items, in the order of `items`.
+    """
+    reservoir = []
+    for index, item in enumerate(items):
+        if index < k:
+            reservoir.append((index, item))
+        else:
+            j = rnd.randrange(index + 1)
+            if j < k:
+                reservoir[j] = (index, item)
+    return [item for _, item in sorted(reservoir, key=lambda i: i[0])]
+
+
+def _sample(trees, ntrees, num_trees=None, every_nth=None, burnin=0, seed=None):
+    """
+    The sampling shared by `sample_trees` and `sample_tree_file`, guaranteeing identical results
+    for the same seed.
+    """
+    trees = iter_thinned_trees(trees, burnin=burnin_count(burnin, ntrees), every_nth=every_nth)
+    if not num_trees:
+        return trees
+    res = reservoir_sample(trees, num_trees, random.Random(seed) if seed is not None else random)
+    if len(res) < num_trees:
+        raise ValueError("Treefile only has %d trees in it." % len(res))
+    return res
+
+
 @with_nexus_reader
 @replace_trees
-def sample_trees(nexus_obj, num_trees=None, every_nth=None, log=None):
+def sample_trees(nexus_obj, num_trees=None, every_nth=None, log=None, burnin=0, seed=None):
     """
-    Returns a specified number (`num_trees`) of random trees from the nexus.
+    Returns a specified number (`num_trees`) of random trees from the nexus, or every `every_nth`
+    tree - after removing `burnin` trees.
 
     :param num_trees: The number of trees to resample
     :type num_trees: Integer
@@ -87,39 +186,202 @@ def sample_trees(nexus_obj, num_trees=None, every_nth=None, log=None):
     :param nexus_obj: A `NexusReader` instance
     :type nexus_obj: NexusReader
 
+    :param burnin: Number of trees - or percentage of trees as string like `10%` - to discard \
+        from the start.
+    :param seed: Seed for the random number generator used for sampling.
+
     :return: A NexusReader instance.
 
     :raises ValueError: if num_trees is larger than population
     """
-    assert (num_trees or every_nth) and not (num_trees and every_nth), \
-        "One of num_trees and every_nth must be selected"
-    if num_trees:
-        if num_trees > nexus_obj.trees.ntrees:
-            raise ValueError("Treefile only has %d trees in it." % nexus_obj.trees.ntrees)
-        if num_trees == nexus_obj.trees.ntrees:  # pragma: no cover
-            return nexus_obj  # um. ok.
-        trees = random.sample(nexus_obj.trees.trees, num_trees)
-    else:
-        trees = [tree for index, tree in enumerate(nexus_obj.trees, 1) if index % every_nth == 0]
+    assert num_trees or every_nth or burnin, \
+        "One of num_trees, every_nth or burnin must be selected"
+    trees = list(_sample(
+        nexus_obj.trees.trees,
+        nexus_obj.trees.ntrees,
+        num_trees=num_trees,
+        every_nth=every_nth,
+        burnin=burnin,
+        seed=seed))
 
     if log:
         log.info("%d trees read. Sampling %d" % (nexus_obj.trees.ntrees, len(trees)))
     yield from trees
 
 
+def sample_tree_file(filename,
+                     output,
+                     num_trees=None,
+                     every_nth=None,
+                     burnin=0,
+                     seed=None,
+                     log=None):
+    """
+    Streaming version of `sample_trees`, reading trees from `filename` and writing the sampled
+    trees to `output` with constant memory (or memory for `num_trees` trees when sampling
+    randomly).
+
+    :param output: Path or file-like object to write the trees to, see `TreeWriter`.
+    :return: The number of trees written.
+    """
+    from nexus.reader import TreeStream
+    from nexus.writer import TreeWriter
+
+    stream = TreeStream(filename)
+    ntrees = stream.count() if isinstance(burnin, str) and burnin.strip().endswith('%') else None
+    trees = iter(_sample(
+        stream, ntrees, num_trees=num_trees, every_nth=every_nth, burnin=burnin, seed=seed))
+    # The translate table is known once the first tree has been read:
+    first = next(trees, None)
+    translate = stream.translators if stream.was_translated else None
+    with TreeWriter(output, translate=translate) as writer:
+        for tree in itertools.chain([first] if first else [], trees):
+            writer.add(tree)
+    if log:
+        log.info("%d trees written" % writer.ntrees)
+    return writer.ntrees
+
+
 @with_nexus_reader
 @replace_trees
-def strip_comments_in_trees(nexus_obj, log=None):
+def strip_comments_in_trees(nexus_obj, log=None, workers=None, executor=None):
     """
     Removes comments from the trees in a nexus
 
     :param nexus_obj: A `NexusReader` instance
     :type nexus_obj: NexusReader
 
+    :param workers: Number of processes to strip comments from chunks of trees in parallel.
+    :param executor: Alternatively, a `concurrent.futures.Executor` to use.
+
     :return: A NexusReader instance with the comments removed.
     """
-    for tree in nexus_obj.trees:
-        yield Tree(nexus_obj.trees.remove_comments(tree))
+    yield from map_chunks(_strip_comments, nexus_obj.trees, workers=workers, executor=executor)
 
     if log:
         log.info("Removed comments")
+
+
+@with_nexus_reader
+@replace_trees
+def dedupe_trees(nexus_obj, log=None, workers=None, executor=None):
+    """
+    Keeps only the first tree of each distinct topology (see `Tree.topology`), annotated with the
+    number of trees with this topology as `[&count=N]` comment in the preamble.
+
+    :param workers: Number of processes to compute topologies of chunks of trees in parallel.
+    :param executor: Alternatively, a `concurrent.futures.Executor` to use.
+    """
+    topologies = nexus_obj.trees.unique_topologies(workers=workers, executor=executor)
+    if log:
+        log.info("%d trees read. %d distinct topologies found" % (
+            nexus_obj.trees.ntrees, len(topologies)))
+    for count, index in topologies.values():
+        preamble, newick = preamble_and_newick(nexus_obj.trees.trees[index])
+        yield Tree('{0} [&count={1}] ={2}'.format(preamble[:-1].rstrip(), count, newick))
+
+
+class TreeStatistics(object):
+    """
+    Statistics of a sample of trees.
+
+    :ivar names: `list` of tree names.
+    :ivar length: `array` of tree lengths, i.e. the sums of the branch lengths, per tree.
+    :ivar height: `array` of root heights, i.e. the maximal distances from root to leaf, per tree.
+    :ivar splits: `nexus.treeset.SplitTable` with counts and branch length sums per clade - if \
+        requested.
+    """
+    def __init__(self):
+        self.names = []
+        self.length = array.array('d')
+        self.height = array.array('d')
+        self.splits = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def iter_rows(self):
+        yield from zip(self.names, self.length, self.height)
+
+
+def _lengths_and_heights(trees):
+    from nexus.treeset import split_tree, length_and_height
+
+    res = []
+    for tree in trees:
+        name, _, newick = split_tree(tree)
+        res.append((name,) + length_and_height(newick))
+    return res
+
+
+def summarise_trees(source,
+                    burnin=0,
+                    every_nth=None,
+                    clades=False,
+                    workers=None,
+                    executor=None):
+    """
+    Computes tree length and root height for each tree - and optionally branch length summaries
+    per clade - without parsing the trees into `newick.Node`s.
+
+    Trees are processed in blocks of `TREE_BLOCK_SIZE`, so when reading from a file, memory does
+    not grow with the number of trees (except for the result).
+
+    .. code-block:: python
+
+        >>> stats = summarise_trees(pathlib.Path('posterior.trees'), burnin='10%')
+        >>> sum(stats.height) / len(stats)
+        >>> stats = summarise_trees(pathlib.Path('posterior.trees'), clades=True)
+        >>> mean, sd = stats.splits.length_summary(clade)
+
+    :param source: Path of a nexus file - streamed with `nexus.reader.TreeStream` - or anything \
+        `get_nexus_reader` accepts.
+    :param burnin: Number of trees - or percentage of trees as string like `10%` - to discard \
+        from the start.
+    :param every_nth: Only summarise every `every_nth` tree after the burn-in.
+    :param clades: Also count clades and their branch lengths, see `TreeStatistics.splits`.
+    :param workers: Number of processes to summarise chunks of trees in parallel.
+    :param executor: Alternatively, a `concurrent.futures.Executor` to use.
+    :return: `TreeStatistics`
+    """
+    from nexus.reader import TreeStream
+    from nexus.treeset import count_splits
+
+    if isinstance(source, pathlib.Path):
+        trees = TreeStream(source)
+        ntrees = trees.count() if isinstance(burnin, str) else None
+    else:
+        trees = get_nexus_reader(source).trees
+        ntrees = trees.ntrees
+
+    res = TreeStatistics()
+    trees_iter = iter_thinned_trees(
+        iter(trees), burnin=burnin_count(burnin, ntrees), every_nth=every_nth)
+    with contextlib.ExitStack() as stack:
+        if executor is None and (workers or 1) > 1:
+            executor = stack.enter_context(concurrent.futures.ProcessPoolExecutor(workers))
+        while True:
+            block = list(itertools.islice(trees_iter, TREE_BLOCK_SIZE))
+            if not block:
+                break
+            for name, length, height in map_chunks(
+                    _lengths_and_heights, block, executor=executor):
+                res.names.append(name)
+                res.length.append(length)
+                res.height.append(height)
+            if clades:
+                # The translate table of a stream is known once the first tree has been read:
+                for table in map_chunks(
+                        functools.partial(
+                            count_splits,
+                            taxa=list(trees.translators.values()),
+                            translators=trees.translators
+                            if trees.was_translated and not getattr(
+                                trees, '_been_detranslated', False) else None),
+                        block,
+                        executor=executor):
+                    if res.splits is None:
+                        res.splits = table
+                    else:
+                        res.splits.update(table)
+    return res
@@ -0,0 +1,891 @@
+"""
+Compact, array-backed storage of tree samples
+"""
+import re
+import math
+import array
+import itertools
+import collections
+
+from nexus.handlers.tree import Tree, PREAMBLE_PATTERN, preamble_and_newick
+
+__all__ = ['TreeSet', 'CompactTree', 'SplitTable', 'Annotations', 'iter_nodes']
+
+# Tokens of a newick string: Punctuation, branch lengths (possibly preceded by comments, as in
+# BEAST's "label:[&rate=1.0]0.5") and labels. Comments elsewhere are matched but ignored.
+NEWICK_TOKEN_PATTERN = re.compile(r"""
+    \[[^\]]*]
+    |
+    (?P<punctuation>[(),;])
+    |
+    :\s*(?:\[[^\]]*]\s*)*(?P<length>[^\s()\[\],:;]*)
+    |
+    (?P<label>'(?:[^']|'')*'|[^\s()\[\],:;']+)
+""", re.VERBOSE)
+ROOTING_PATTERN = re.compile(r'\[&(?P<rooting>[RU])]')
+CANONICAL_QUOTE_PATTERN = re.compile(r"[\s()\[\],:;']")
+NAME_PATTERN = re.compile(r'tree\s+(?P<name>[^=]+?)\s*=', re.IGNORECASE)
+# Only the tokens needed to compute distances - i.e. skipping labels:
+LENGTH_TOKEN_PATTERN = re.compile(r"""
+    \[[^\]]*]
+    |
+    '(?:[^']|'')*'
+    |
+    (?P<punctuation>[(),;])
+    |
+    :\s*(?:\[[^\]]*]\s*)*(?P<length>[^\s()\[\],:;]*)
+""", re.VERBOSE)
+ANNOTATION_COMMENT_PATTERN = re.compile(r'\[&(?P<content>[^\]]*)]')
+# key=value pairs in annotation comments, where values may be sets like {0.1,0.5} or quoted:
+ANNOTATION_PATTERN = re.compile(r"""
+    (?P<key>[^\s=,{}"][^=,{}"]*?)\s*=\s*
+    (?P<value>{[^}]*}|"[^"]*"|'[^']*'|[^,]*)
+""", re.VERBOSE)
+
+
+def parse_nodes(newick):
+    """
+    Scans a newick string, collecting the nodes in pre-order.
+
+    :return: Triple of `list`s, with the index of the parent node (or `-1` for the root), the \
+        unquoted label of a leaf (or `None` for internal nodes) and the branch length as `float` \
+        (or `nan`) for each node.
+    """
+    parents, labels, lengths = [], [], []
+    nan = float('nan')
+    current, last, after_boundary = -1, None, True
+    for punctuation, length, label in NEWICK_TOKEN_PATTERN.findall(newick):
+        if punctuation == '(':
+            parents.append(current)
+            labels.append(None)
+            lengths.append(nan)
+            current = last = len(parents) - 1
+            after_boundary = True
+        elif punctuation == ',':
+            after_boundary = True
+        elif punctuation == ')':
+            last = current
+            current = parents[current]
+            after_boundary = False
+        elif punctuation == ';':
+            break
+        elif label:
+            if after_boundary:
+                if label[0] == "'":
+                    label = label[1:-1].replace("''", "'")
+                last = len(parents)
+                parents.append(current)
+                labels.append(label)
+                lengths.append(nan)
+            after_boundary = False
+        elif length and last is not None:
+            lengths[last] = float(length)
+    return parents, labels, lengths
+
+
+def iter_nodes(newick):
+    """
+    Scans a newick string, generating one `tuple` per node, in pre-order.
+
+    :return: Generator of `(parent, label, length)` tuples, where `parent` is the index of the \
+        parent node (or `-1` for the root), `label` is the unquoted label of a leaf (or `None` for \
+        internal nodes) and `length` is the branch length as `float` or `None`.
+    """
+    for parent, label, length in zip(*parse_nodes(newick)):
+        yield parent, label, None if math.isnan(length) else length
+
+
+def length_and_height(newick):
+    """
+    Computes the tree length - i.e. the sum of all branch lengths - and the root height - i.e. the
+    maximal distance from the root to a leaf - of a tree, scanning just punctuation and branch
+    lengths of the newick string. Missing branch lengths are counted as 0.
+
+    :return: `tuple` of `float`s (length, height)
+    """
+    total, current, stack = 0.0, 0.0, []
+    for punctuation, length in LENGTH_TOKEN_PATTERN.findall(newick):
+        if punctuation == '(':
+            stack.append(0.0)
+            current = 0.0
+        elif punctuation == ',':
+            if stack:
+                stack[-1] = max(stack[-1], current)
+            current = 0.0
+        elif punctuation == ')':
+            if stack:
+                current = max(stack.pop(), current)
+        elif punctuation == ';':
+            break
+        elif length and stack:  # The length of the root branch is ignored.
+            length = float(length)
+            total += length
+            current += length
+    while stack:  # Only for incomplete newick strings.
+        current = max(stack.pop(), current)
+    return total, current
+
+
+def quote_label(label):
+    """
+    :return: `label` - quoted if it contains whitespace or punctuation - for use in newick.
+    """
+    if CANONICAL_QUOTE_PATTERN.search(label):
+        return "'{0}'".format(label.replace("'", "''"))
+    return label
+
+
+def canonical_topology(newick):
+    """
+    Formats the topology of a tree canonically, i.e. without branch lengths, comments and labels
+    of internal nodes, and with the children of each node sorted.
+    """
+    parents, labels, _ = parse_nodes(newick)
+    children = [[] for _ in parents]
+    form = ''
+    # Children have higher indices than their parents, so we can build the forms bottom-up:
+    for i in range(len(parents) - 1, -1, -1):
+        if labels[i] is not None:
+            form = quote_label(labels[i])
+        else:
+            form = '({0})'.format(','.join(sorted(children[i])))
+        if parents[i] >= 0:
+            children[parents[i]].append(form)
+    return form + ';'
+
+
+def split_tree(tree):
+    """
+    Splits a tree line into name, rooting and newick string.
+    """
+    preamble = PREAMBLE_PATTERN.match(tree).group()
+    m = NAME_PATTERN.search(re.sub(r'\[[^\]]*]', '', preamble))
+    m2 = ROOTING_PATTERN.search(preamble)
+    return (
+        m.group('name') if m else None,
+        (m2.group('rooting') == 'R') if m2 else None,
+        tree[len(preamble):].strip())
+
+
+class CompactTree(object):
+    """
+    The topology and branch lengths of one tree in a `TreeSet`.
+
+    Nodes are numbered in pre-order, i.e. the root has index 0 and each node has a higher index
+    than its parent.
+
+    :ivar parents: `array` of the parent index for each node, `-1` for the root.
+    :ivar leaves: `array` of the taxon index for each leaf node, `-1` for internal nodes.
+    :ivar lengths: `array` of branch lengths, `nan` where no length was given.
+    """
+    __slots__ = ('name', 'rooted', 'parents', 'leaves', 'lengths')
+
+    def __init__(self, name, rooted, parents, leaves, lengths):
+        self.name = name
+        self.rooted = rooted
+        self.parents = parents
+        self.leaves = leaves
+        self.lengths = lengths
+
+    def __len__(self):
+        return len(self.parents)
+
+    def children(self):
+        """
+        :return: `list` of `list`s of child indices per node.
+        """
+        res = [[] for _ in self.parents]
+        for i, parent in enumerate(self.parents):
+            if parent >= 0:
+                res[parent].append(i)
+        return res
+
+    def clades(self):
+        """
+        :return: `list` of clades per node, encoded as bitsets of taxon indices, i.e. as `int` \
+            with bit `i` set if the taxon with index `i` is a descendant of the node.
+        """
+        res = [0] * len(self.parents)
+        # Since children have higher indices than their parents, one pass in reverse suffices:
+        for i in range(len(self.parents) - 1, -1, -1):
+            if self.leaves[i] >= 0:
+                res[i] |= 1 << self.leaves[i]
+            if self.parents[i] >= 0:
+                res[self.parents[i]] |= res[i]
+        return res
+
+    def splits(self, rooted=False):
+        """
+        :param rooted: If `True`, return the clades, otherwise the bipartitions of the taxa, each \
+            encoded as the clade not containing the taxon with lowest index.
+        :return: `set` of non-trivial splits, encoded as bitsets of taxon indices.
+        """
+        clades = self.clades()
+        root = clades[0] if clades else 0
+        lowest = root & -root
+        res = set()
+        for clade in clades[1:]:
+            if not rooted:
+                if clade & lowest:
+                    clade = root ^ clade
+                rest = root ^ clade
+                if not rest & (rest - 1):  # Only one taxon on the other side.
+                    continue
+            if clade & (clade - 1) and clade != root:
+                res.add(clade)
+        return res
+
+    def newick(self, taxa):
+        """
+        :param taxa: Sequence of taxon labels, to look up the taxon indices.
+        :return: The tree formatted in newick.
+        """
+        def label(i):
+            res = quote_label(taxa[self.leaves[i]]) if self.leaves[i] >= 0 else ''
+            return res if math.isnan(self.lengths[i]) else '%s:%r' % (res, self.lengths[i])
+
+        return format_newick(self.children(), label)
+
+
+def format_newick(children, label, root=0):
+    """
+    Formats a tree in newick.
+
+    :param children: `list` of `list`s of child indices per node.
+    :param label: Callable returning the label - including branch length - for a node index.
+    :param root: Index of the root node.
+    """
+    # Serialize the tree iteratively, to avoid hitting the recursion limit for big trees:
+    out, stack = [], [(root, False)]
+    while stack:
+        i, closing = stack.pop()
+        if i is None:
+            out.append(',')
+        elif closing:
+            out.append(')' + label(i))
+        elif children[i]:
+            out.append('(')
+            stack.append((i, True))
+            for j, child in enumerate(reversed(children[i])):
+                stack.append((child, False))
+                if j < len(children[i]) - 1:
+                    stack.append((None, None))
+        else:
+            out.append(label(i))
+    return ''.join(out) + ';'
+
+
+def _scan_node_spans(newick):
+    """
+    Scans a newick string like `parse_nodes`, additionally recording where the text of each node -
+    i.e. the label of a leaf or what follows the closing parenthesis of an internal node, up to the
+    next punctuation - is located in the string.
+
+    :return: `tuple` of `list`s (parents, labels, lengths, text spans, end of leaf labels, \
+        triples (start of the branch length token, start and end of the number)).
+    """
+    parents, labels, lengths, spans, label_ends, length_spans = [], [], [], [], [], []
+    nan = float('nan')
+    current, last, pending, after_boundary = -1, None, None, True
+
+    def new_node(label, start, label_end):
+        parents.append(current)
+        labels.append(label)
+        lengths.append(nan)
+        spans.append([start, None])
+        label_ends.append(label_end)
+        length_spans.append(None)
+        return len(parents) - 1
+
+    for m in NEWICK_TOKEN_PATTERN.finditer(newick):
+        punctuation, length, label = m.groups()
+        if punctuation and pending is not None:
+            spans[pending][1], pending = m.start(), None
+        if punctuation == '(':
+            current = last = new_node(None, None, None)
+            after_boundary = True
+        elif punctuation == ',':
+            after_boundary = True
+        elif punctuation == ')':
+            last = pending = current
+            spans[current][0] = m.end()
+            current = parents[current]
+            after_boundary = False
+        elif punctuation == ';':
+            break
+        elif label:
+            if after_boundary:
+                if label[0] == "'":
+                    label = label[1:-1].replace("''", "'")
+                last = pending = new_node(label, m.start(), m.end())
+            after_boundary = False
+        elif length and last is not None:
+            lengths[last] = float(length)
+            length_spans[last] = (m.start(), m.start('length'), m.end('length'))
+    if pending is not None:
+        spans[pending][1] = len(newick)
+    return parents, labels, lengths, spans, label_ends, length_spans
+
+
+def prune_newick(newick, keep):
+    """
+    Removes all leaves with labels not in `keep` from a tree. Internal nodes left without children
+    are removed as well, internal nodes left with one child are replaced by this child - with the
+    branch lengths summed. If the root is left with one child, the first descendant with more than
+    one child becomes the new root.
+
+    Labels, comments and branch lengths of the remaining nodes are retained as they are.
+
+    :param newick: Newick string of the tree.
+    :param keep: Container of (unquoted) labels of the leaves to keep - or `dict` mapping these \
+        labels to new labels, to relabel the leaves in the same pass.
+    :return: The newick string of the pruned tree or `None` if no leaf is left.
+    """
+    parents, labels, lengths, spans, label_ends, length_spans = _scan_node_spans(newick)
+    children = [[] for _ in parents]
+    survives = False
+    # Children have higher indices than their parents, so we can decide bottom-up which nodes
+    # survive. Note that children are collected in reverse order.
+    for i in range(len(parents) - 1, -1, -1):
+        survives = bool(children[i]) if labels[i] is None else labels[i] in keep
+        if survives and parents[i] >= 0:
+            children[parents[i]].append(i)
+    if not survives:  # The root - if there's any node at all - didn't survive.
+        return None
+
+    added = {}  # Maps nodes to the summed branch lengths of the unary nodes they replace.
+
+    def resolve(i, root=False):
+        length = None
+        while labels[i] is None and len(children[i]) == 1:
+            if not math.isnan(lengths[i]):
+                length = (length or 0.0) + lengths[i]
+            i = children[i][0]
+        if root:
+            added[i] = None
+        elif length is not None:
+            added[i] = length
+        return i
+
+    # The branches between the root and the first node with more than one child are dropped:
+    root = resolve(0, root=True)
+    stack = [root]
+    while stack:
+        i = stack.pop()
+        children[i] = [resolve(j) for j in reversed(children[i])]
+        stack.extend(children[i])
+
+    def label(i):
+        start, end = spans[i]
+        if labels[i] is not None and isinstance(keep, dict):
+            res = keep[labels[i]] + newick[label_ends[i]:end]
+            start = label_ends[i] - len(keep[labels[i]])
+        else:
+            res = newick[start:end]
+        if i in added:
+            if added[i] is None:  # The new root of a pruned tree.
+                if i and length_spans[i]:
+                    res = res[:length_spans[i][0] - start] + res[length_spans[i][2] - start:]
+                return res.strip()
+            length = added[i] + (0.0 if math.isnan(lengths[i]) else lengths[i])
+            if length_spans[i]:
+                res = '{0}{1!r}{2}'.format(
+                    res[:length_spans[i][1] - start], length, res[length_spans[i][2] - start:])
+            else:
+                res = '{0}:{1!r}'.format(res.rstrip(), length)
+        return res.strip()
+
+    return format_newick(children, label, root=root)
+
+
+def prune_trees(trees, keep):
+    """
+    Prunes a `list` of `Tree`s - see `prune_newick`.
+
+    :return: `list` of pruned `Tree`s, with `None` for trees without any leaves left.
+    """
+    res = []
+    for tree in trees:
+        # Tree-level comments between "=" and the first "(" - e.g. rooting `[&R]` - are part of
+        # the preamble and thus retained:
+        preamble = PREAMBLE_PATTERN.match(tree).group()
+        if len(preamble) == len(tree):  # A tree without any "(", i.e. a single leaf.
+            preamble, _ = preamble_and_newick(tree)
+        newick = prune_newick(tree[len(preamble):], keep)
+        res.append(Tree(preamble.rstrip() + ' ' + newick) if newick else None)
+    return res
+
+
+class TreeSet(object):
+    """
+    A sample of trees over a common set of taxa, stored compactly in arrays.
+
+    Per node, we store the index of the parent node, the index of the taxon (for leaves) and the
+    branch length - i.e. 16 bytes - in `array`s concatenated for all trees. Node labels of internal
+    nodes and comments are not retained.
+
+    .. code-block:: python
+
+        >>> treeset = NexusReader.from_file('posterior.trees').trees.to_treeset()
+        >>> treeset[0].parents
+        array('i', [-1, 0, 1, 1, 0])
+        >>> treeset.tree(0)
+        'tree STATE_0 = ((A:0.1,B:0.2):0.3,C:0.4);'
+    """
+    __slots__ = ('taxa', 'index', 'names', 'rooted', 'offsets', 'parents', 'leaves', 'lengths')
+
+    def __init__(self, taxa=None, translators=None):
+        """
+        :param taxa: Sequence of taxon labels.
+        :param translators: Mapping of taxon IDs used in trees to taxon labels, e.g. the \
+            translate table of a `TreeHandler`.
+        """
+        self.taxa = []
+        self.index = {}  # Maps taxon labels - and IDs - to taxon indices.
+        self.names, self.rooted = [], []
+        self.offsets = array.array('q', [0])
+        self.parents, self.leaves = array.array('i'), array.array('i')
+        self.lengths = array.array('d')
+        for taxon in taxa or []:
+            self.taxon_index(taxon)
+        for taxon_id, taxon in (translators or {}).items():
+            self.index[str(taxon_id)] = self.taxon_index(taxon)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return CompactTree(
+            self.names[i],
+            self.rooted[i],
+            self.parents[start:end],
+            self.leaves[start:end],
+            self.lengths[start:end])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    @property
+    def nbytes(self):
+        """Memory used by the node arrays."""
+        return sum(a.itemsize * len(a) for a in [self.parents, self.leaves, self.lengths])
+
+    def taxon_index(self, taxon):
+        """
+        :return: The index of `taxon`, adding `taxon` to the taxa if necessary.
+        """
+        if taxon not in self.index:
+            self.index[taxon] = len(self.taxa)
+            self.taxa.append(taxon)
+        return self.index[taxon]
+
+    def compact(self, tree):
+        """
+        Parses a tree into a `CompactTree` using the taxon index of the set - without adding it.
+
+        :param tree: A `Tree` or a tree line.
+        """
+        name, rooted, newick = split_tree(tree)
+        parents, labels, lengths = parse_nodes(newick)
+        index = self.index
+        leaves = [
+            -1 if label is None else (index[label] if label in index else self.taxon_index(label))
+            for label in labels]
+        return CompactTree(
+            name,
+            rooted,
+            array.array('i', parents),
+            array.array('i', leaves),
+            array.array('d', lengths))
+
+    def add(self, tree):
+        """
+        Adds a tree.
+
+        :param tree: A `Tree` or a tree line.
+        """
+        tree = self.compact(tree)
+        self.parents.extend(tree.parents)
+        self.leaves.extend(tree.leaves)
+        self.lengths.extend(tree.lengths)
+        self.names.append(tree.name)
+        self.rooted.append(tree.rooted)
+        self.offsets.append(len(self.parents))
+
+    def extend(self, trees):
+        for tree in trees:
+            self.add(tree)
+
+    def newick(self, i):
+        """
+        :return: The `i`-th tree as newick string.
+        """
+        return self[i].newick(self.taxa)
+
+    def tree(self, i):
+        """
+        :return: The `i`-th tree as `Tree`.
+        """
+        tree = self[i]
+        return Tree.from_newick(
+            tree.newick(self.taxa), name=tree.name or 'tree', rooted=tree.rooted)
+
+
+def _popcount(clade):
+    return bin(clade).count('1')
+
+
+def _compatible(clade, other):
+    common = clade & other
+    return common == 0 or common == clade or common == other
+
+
+class SplitTable(object):
+    """
+    Frequencies of clades in a sample of trees.
+
+    Clades are encoded as bitsets of taxon indices (see `CompactTree.clades`) and counted in a
+    `Counter`, so memory depends on the number of distinct clades, not on the number of trees.
+
+    .. code-block:: python
+
+        >>> splits = NexusReader.from_file('posterior.trees').trees.split_frequencies()
+        >>> for taxa, frequency in splits.iter_splits():
+        ...     print(frequency, ' '.join(taxa))
+        >>> print(splits.consensus())
+    """
+    def __init__(self, taxa):
+        """
+        :param taxa: `list` of taxon labels, indexed by the bits of the clades.
+        """
+        self.taxa = taxa
+        self.ntrees = 0
+        self.counts = collections.Counter()
+        self.lengths = {}  # Sum of branch lengths per clade.
+        self.squares = {}  # Sum of squared branch lengths per clade.
+
+    def add(self, tree):
+        """
+        Counts the clades of a `CompactTree`.
+        """
+        self.ntrees += 1
+        clades = tree.clades()
+        # We don't count the root:
+        self.counts.update(itertools.islice(clades, 1, None))
+        lengths, squares = self.lengths, self.squares
+        for clade, length in zip(itertools.islice(clades, 1, None), tree.lengths[1:]):
+            if length == length:  # i.e. not nan
+                lengths[clade] = lengths.get(clade, 0.0) + length
+                squares[clade] = squares.get(clade, 0.0) + length * length
+
+    def update(self, other):
+        """
+        Adds the counts of another `SplitTable`, e.g. computed for another chunk of trees.
+        """
+        if other.taxa != self.taxa[:len(other.taxa)]:
+            # The taxon indices differ, so we must re-encode the clades of `other`:
+            index = {taxon: i for i, taxon in enumerate(self.taxa)}
+            for taxon in other.taxa:
+                if taxon not in index:
+                    index[taxon] = len(self.taxa)
+                    self.taxa.append(taxon)
+            mapping = [index[taxon] for taxon in other.taxa]
+
+            def remap(clade):
+                return sum(1 << j for i, j in enumerate(mapping) if clade >> i & 1)
+        else:
+            def remap(clade):
+                return clade
+
+        self.ntrees += other.ntrees
+        for clade, count in other.counts.items():
+            self.counts[remap(clade)] += count
+        for clade, length in other.lengths.items():
+            square, clade = other.squares[clade], remap(clade)
+            self.lengths[clade] = self.lengths.get(clade, 0.0) + length
+            self.squares[clade] = self.squares.get(clade, 0.0) + square
+
+    def frequency(self, clade):
+        return self.counts[clade] / self.ntrees if self.ntrees else 0.0
+
+    def length_summary(self, clade):
+        """
+        :return: `tuple` of mean and standard deviation of the branch lengths of a clade - `nan` \
+            if there are none.
+        """
+        n = self.counts[clade]
+        if clade not in self.lengths or not n:
+            return math.nan, math.nan
+        mean = self.lengths[clade] / n
+        return mean, math.sqrt(max(self.squares[clade] / n - mean * mean, 0.0))
+
+    def log_credibility(self, tree):
+        """
+        Computes the clade credibility of a `CompactTree`, i.e. the sum of the log frequencies of
+        the clades of its internal nodes.
+
+        :return: `float`, `-inf` if the tree contains a clade which has not been counted.
+        """
+        counts, res = self.counts, 0.0
+        for i, clade in enumerate(tree.clades()):
+            if i and tree.leaves[i] < 0:
+                count = counts[clade]
+                if not count:
+                    return float('-inf')
+                res += math.log(count)
+        return res - math.log(self.ntrees) * sum(1 for i in tree.leaves[1:] if i < 0)
+
+    def taxa_of(self, clade):
+        """
+        :return: `list` of the labels of the taxa in `clade`.
+        """
+        return [taxon for i, taxon in enumerate(self.taxa) if clade >> i & 1]
+
+    def iter_splits(self, threshold=0.0):
+        """
+        Generates the non-trivial clades with frequency above `threshold` in order of decreasing
+        frequency.
+
+        :return: Generator of (`list` of taxon labels, frequency) pairs.
+        """
+        for clade, count in self.counts.most_common():
+            frequency = count / self.ntrees
+            if frequency <= threshold:
+                break
+            if _popcount(clade) > 1:
+                yield self.taxa_of(clade), frequency
+
+    def consensus(self, threshold=0.5, greedy=False, name='consensus'):
+        """
+        Computes a consensus tree.
+
+        Internal nodes are labeled with the frequency of the clade, branch lengths are the mean of
+        the lengths of the clade's branches in the sample.
+
+        :param threshold: Include clades with frequency above `threshold` - i.e. a majority-rule \
+            consensus tree for the default `0.5`.
+        :param greedy: Also include clades below `threshold`, in order of decreasing frequency, \
+            if compatible with the clades already included.
+        :return: `Tree`
+        """
+        leaves = [clade for clade in self.counts if not clade & (clade - 1)]
+        clades = []
+        for clade, count in self.counts.most_common():
+            if len(clades) >= len(leaves) - 2:  # The tree is fully resolved.
+                break
+            if not greedy and count / self.ntrees <= threshold:
+                break
+            if clade & (clade - 1) and all(_compatible(clade, other) for other in clades):
+                clades.append(clade)
+
+        # Build the tree top-down, from bigger to smaller clades, keeping track of the smallest
+        # clade each taxon is assigned to:
+        clades.sort(key=_popcount, reverse=True)
+        node_of_taxon = {}
+        nodes, children = [0], [[]]
+        for clade in clades + leaves:
+            members = [i for i in range(len(self.taxa)) if clade >> i & 1]
+            nodes.append(clade)
+            children.append([])
+            children[node_of_taxon.get(members[0], 0)].append(len(nodes) - 1)
+            for i in members:
+                node_of_taxon[i] = len(nodes) - 1
+
+        def label(i):
+            clade = nodes[i]
+            if not clade:  # The root.
+                return ''
+            res = quote_label(self.taxa_of(clade)[0]) if not children[i] else '{0:.4g}'.format(
+                self.frequency(clade))
+            if clade in self.lengths:
+                res += ':{0:.6g}'.format(self.lengths[clade] / self.counts[clade])
+            return res
+
+        return Tree.from_newick(format_newick(children, label), name=name)
+
+
+def annotate_internal_nodes(newick, comments):
+    """
+    Adds comments to internal nodes of a newick string, merging them with existing `[&...]`
+    comments.
+
+    :param comments: Mapping of node indices - in the order used by `parse_nodes` - to comment \
+        content, like `posterior=0.5`.
+    """
+    out, pos, stack, n, after_boundary = [], 0, [], 0, True
+    for m in NEWICK_TOKEN_PATTERN.finditer(newick):
+        punctuation, _, label = m.groups()
+        if punctuation == '(':
+            stack.append(n)
+            n += 1
+            after_boundary = True
+        elif punctuation == ',':
+            after_boundary = True
+        elif punctuation == ')':
+            node = stack.pop()
+            after_boundary = False
+            if node in comments:
+                out.append(newick[pos:m.end()])
+                pos = m.end()
+                if newick.startswith('[&', pos):
+                    out.append('[&{0},'.format(comments[node]))
+                    pos += 2
+                else:
+                    out.append('[&{0}]'.format(comments[node]))
+        elif punctuation == ';':
+            break
+        elif label:
+            if after_boundary:
+                n += 1
+            after_boundary = False
+    out.append(newick[pos:])
+    return ''.join(out)
+
+
+def count_splits(trees, taxa=None, translators=None):
+    """
+    Counts the clades in a chunk of trees.
+
+    :return: `list` containing one `SplitTable` - to be used with `nexus.util.map_chunks`.
+    """
+    treeset = TreeSet(taxa=taxa, translators=translators)
+    res = SplitTable(treeset.taxa)
+    for tree in trees:
+        res.add(treeset.compact(tree))
+    return [res]
+
+
+def score_trees(trees, splits, translators=None):
+    """
+    Computes the log clade credibility for a chunk of trees.
+
+    :return: `list` of `float`.
+    """
+    treeset = TreeSet(taxa=splits.taxa, translators=translators)
+    return [splits.log_credibility(treeset.compact(tree)) for tree in trees]
+
+
+def _annotation_value(value):
+    value = value.strip()
+    if value and value[0] in '"\'':
+        return value[1:-1]
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def parse_annotations(comment):
+    """
+    Parses the content of an annotation comment like `[&rate=0.5,height_95%_HPD={1.2,3.4}]`, as
+    written by BEAST or MrBayes.
+
+    :param comment: The comment content, i.e. the text between `[&` and `]`.
+    :return: `dict` mapping keys to values - `float`s if possible, `tuple`s for sets of values \
+        and `str` otherwise.
+    """
+    res = {}
+    for m in ANNOTATION_PATTERN.finditer(comment):
+        key, value = m.group('key').strip(), m.group('value').strip()
+        if value.startswith('{'):
+            res[key] = tuple(_annotation_value(v) for v in value[1:-1].split(','))
+        else:
+            res[key] = _annotation_value(value)
+    return res
+
+
+def parse_tree_annotations(trees):
+    """
+    Parses the annotations of a chunk of trees.
+
+    :return: `list` with one triple (number of nodes, `dict` of tree annotations, `dict` mapping \
+        keys to `dict`s mapping node indices to values) per tree.
+    """
+    res = []
+    for tree in trees:
+        preamble = PREAMBLE_PATTERN.match(tree).group()
+        newick = tree[len(preamble):]
+        tree_values, node_values = {}, collections.defaultdict(dict)
+        for m in ANNOTATION_COMMENT_PATTERN.finditer(preamble):
+            tree_values.update(parse_annotations(m.group('content')))
+        parents, _, _, spans, _, _ = _scan_node_spans(newick)
+        for i, (start, end) in enumerate(spans):
+            if start is not None:
+                for m in ANNOTATION_COMMENT_PATTERN.finditer(newick, start, end):
+                    for key, value in parse_annotations(m.group('content')).items():
+                        node_values[key][i] = value
+        res.append((len(parents), tree_values, dict(node_values)))
+    return res
+
+
+def _column(values):
+    if all(v is None or isinstance(v, float) for v in values):
+        return array.array('d', [math.nan if v is None else v for v in values])
+    return values
+
+
+class Annotations(object):
+    """
+    Annotations of trees and their nodes - i.e. the content of `[&key=value,...]` comments as
+    written by BEAST or MrBayes - stored in columns.
+
+    Node annotations are stored in one column per key, concatenated for all trees, with the nodes
+    of each tree numbered as in `TreeSet`. Numeric columns are `array`s of `float`s - with `nan`
+    for missing values - other columns are `list`s of `str` or `tuple`, with `None` for missing
+    values. Tree annotations are stored in the same way, with one value per tree.
+
+    .. code-block:: python
+
+        >>> annotations = nexus.trees.annotations()
+        >>> annotations.nodes['rate']
+        array('d', [nan, 0.5, 0.4, ...])
+        >>> rates = annotations.by_clade('rate', nexus.trees.to_treeset())
+    """
+    __slots__ = ('offsets', 'trees', 'nodes')
+
+    def __init__(self, items):
+        """
+        :param items: Iterable of triples as returned by `parse_tree_annotations`.
+        """
+        self.offsets = array.array('q', [0])
+        trees, nodes = [], collections.defaultdict(dict)
+        for nnodes, tree_values, node_values in items:
+            for key, values in node_values.items():
+                offset = self.offsets[-1]
+                nodes[key].update((offset + i, v) for i, v in values.items())
+            trees.append(tree_values)
+            self.offsets.append(self.offsets[-1] + nnodes)
+        self.trees = {
+            key: _column([t.get(key) for t in trees])
+            for key in sorted(set(itertools.chain(*trees)))}
+        self.nodes = {
+            key: _column([nodes[key].get(i) for i in range(self.offsets[-1])])
+            for key in sorted(nodes)}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def node_values(self, key, i):
+        """
+        :return: The values for annotation `key` of the nodes of the `i`-th tree.
+        """
+        return self.nodes[key][self.offsets[i]:self.offsets[i + 1]]
+
+    def by_clade(self, key, treeset):
+        """
+        Collects the values of a node annotation per clade, e.g. to compute mean rates per clade.
+
+        :param treeset: `TreeSet` of the same trees, to look up the clades of the nodes.
+        :return: `dict` mapping clades - encoded as bitsets of the taxon indices of `treeset` - to \
+            `list`s of values.
+        """
+        res = collections.defaultdict(list)
+        for i, tree in enumerate(treeset):
+            for clade, value in zip(tree.clades(), self.node_values(key, i)):
+                if value is not None and value == value:  # Skip missing values, i.e. None or nan.
+                    res[clade].append(value)
+        return res
@@ -1,4 +1,7 @@
+import math
 import pathlib
+import itertools
+import concurrent.futures
 
 
 class FileWriterMixin(object):
@@ -11,3 +14,30 @@ class FileWriterMixin(object):
         res = pathlib.Path(filename)
         res.write_text(self.write(**kw), encoding=encoding)
         return res
+
+
+def map_chunks(func, items, workers=None, executor=None, chunksize=None):
+    """
+    Applies `func` to chunks of `items` - optionally in parallel - and returns the concatenated
+    results in the order of `items`.
+
+    :param func: Callable accepting a `list` of items and returning a `list` of results. To run \
+        in a process pool, `func` must be picklable, e.g. a module-level function or a \
+        `functools.partial` of one.
+    :param workers: Number of worker processes. If `None` or `1`, and no `executor` is passed, \
+        `func` is called on all items in the current process.
+    :param executor: A `concurrent.futures.Executor` to submit the chunks to.
+    :param chunksize: Number of items per chunk, by default such that each worker gets about \
+        four chunks.
+    """
+    items = list(items)
+    if executor is None and (workers or 1) <= 1:
+        return func(items)
+    if not chunksize:
+        nworkers = workers or getattr(executor, '_max_workers', None) or 1
+        chunksize = max(1, math.ceil(len(items) / (4 * nworkers)))
+    chunks = [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+    if executor is None:
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            return list(itertools.chain.from_iterable(executor.map(func, chunks)))
+    return list(itertools.chain.from_iterable(executor.map(func, chunks)))
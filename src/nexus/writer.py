@@ -1,9 +1,16 @@
 """
 Tools for writing a nexus file
 """
+import pathlib
 import collections
 
 from nexus.util import FileWriterMixin
+from nexus.registry import intern_taxon
+from nexus.matrix import CodedMatrix
+from nexus.handlers import END_PATTERN
+from nexus.handlers.tree import (
+    Tree, TreeHandler, TranslateTable, QUOTED_LABEL_PATTERN, TRANSLATE_START_PATTERN,
+)
 
 TEMPLATE = """\
 #NEXUS
@@ -31,22 +38,38 @@ END;
 """
 
 
+STORAGES = {
+    'dict': lambda: collections.defaultdict(dict),
+    'array': CodedMatrix,
+}
+
+
 class NexusWriter(FileWriterMixin):
 
     MISSING = '?'
     GAP = '-'
     DATATYPE = 'STANDARD'
 
-    def __init__(self):
+    def __init__(self, storage='dict'):
+        """
+        :param storage: Storage backend for the data - `dict` or `array`. `array` stores values \
+            as integer codes in arrays, cutting memory use and write time for big matrices.
+        """
         self.comments = []
         self.collabels = []
-        self._taxa = None
-        self._characters = None
-        self.data = collections.defaultdict(dict)
+        # Note: `data` should only be changed via `add` and the `remove*` methods, to keep the
+        # inventory below in sync.
+        self.data = STORAGES[storage]()
         self.is_binary = False
         self.trees = []
-        self._taxa_in = []
-        self._chars_in = []
+        # Inventory of the data, updated incrementally:
+        self._taxa_in = collections.Counter()  # taxon -> number of values, in insertion order
+        self._chars_in = {}  # characters in insertion order
+        self._states = collections.Counter()  # value -> number of occurrences
+        # Caches of the ordered taxa and characters, keyed by `preserve_order`:
+        self._taxa = {}
+        self._characters = {}
+        self._taxon_width = None
         self.preserve_order = False
         self.padding = 3
 
@@ -64,10 +87,15 @@ class NexusWriter(FileWriterMixin):
 
     @property
     def characters(self):
-        if self._characters is None:
-            self._characters = list(sorted(self.data.keys(), key=lambda x: self._chars_in.index(x)
-                                           if self.preserve_order else x))
-        return self._characters
+        if self.preserve_order not in self._characters:
+            self._characters[self.preserve_order] = \
+                list(self._chars_in) if self.preserve_order else sorted(self._chars_in)
+        return self._characters[self.preserve_order]
+
+    @property
+    def nchar(self):
+        """Number of Characters"""
+        return len(self._chars_in)
 
     @property
     def ntrees(self):
@@ -75,19 +103,43 @@ class NexusWriter(FileWriterMixin):
 
     @property
     def taxa(self):
-        if self._taxa is None:
-            self._taxa = set()
-            [self._taxa.update(self.data[c].keys()) for c in self.data]
-            self._taxa = list(sorted(self._taxa, key=lambda x: self._taxa_in.index(x)
-                                     if self.preserve_order else x))
-        return self._taxa
+        if self.preserve_order not in self._taxa:
+            self._taxa[self.preserve_order] = \
+                list(self._taxa_in) if self.preserve_order else sorted(self._taxa_in)
+        return self._taxa[self.preserve_order]
+
+    @property
+    def ntaxa(self):
+        """Number of Taxa"""
+        return len(self._taxa_in)
 
     @property
     def symbols(self):
-        symbols = set()
-        [symbols.update(self.data[c].values()) for c in self.data]
-        symbols = [s for s in symbols if s not in ('-', '?')]
-        return symbols
+        return [s for s in self._states if s not in ('-', '?')]
+
+    def _taxa_changed(self):
+        self._taxa = {}
+        self._taxon_width = None
+
+    def _characters_changed(self):
+        self._characters = {}
+
+    def _remove_value(self, taxon, value):
+        self._taxa_in[taxon] -= 1
+        if not self._taxa_in[taxon]:
+            del self._taxa_in[taxon]
+            self._taxa_changed()
+        self._remove_state(value)
+
+    def _remove_state(self, value):
+        self._states[value] -= 1
+        if not self._states[value]:
+            del self._states[value]
+
+    def _get_taxon_width(self):
+        if self._taxon_width is None:
+            self._taxon_width = max([len(t) for t in self._taxa_in]) + self.padding
+        return self._taxon_width
 
     def _iter_charlabels(self):
         """Generates a character label block"""
@@ -100,25 +152,40 @@ class NexusWriter(FileWriterMixin):
 
     def _iter_matrix(self, interleave):
         """Generates a matrix block"""
-        max_taxon_size = max([len(t) for t in self.taxa]) + self.padding
+        max_taxon_size = self._get_taxon_width()
+        taxa = self.taxa
+        columns = [self.data[c] for c in self.characters]
 
         if interleave:
-            for c in self.characters:
-                for t in self.taxa:
-                    yield "%s %s" % (t.ljust(max_taxon_size), self.data[c].get(t, self.MISSING))
+            for column in columns:
+                for t in taxa:
+                    yield "%s %s" % (t.ljust(max_taxon_size), column.get(t, self.MISSING))
                 yield ""
+        elif isinstance(self.data, CodedMatrix):
+            rows = self.data.iter_rows(taxa, self.characters, self.MISSING, wrap="(%s)")
+            for t, row in zip(taxa, rows):
+                yield "%s %s" % (t.ljust(max_taxon_size), row)
         else:
-            for t in self.taxa:
-                s = []
-                for c in self.characters:
-                    value = self.data[c].get(t, self.MISSING)
-                    if len(value) > 1:  # wrap equivocal states in ()'s
-                        value = "(%s)" % value
-                    s.append(value)
+            # wrap equivocal states in ()'s
+            wrapped = {s: "(%s)" % s for s in self._states if len(s) > 1}
+            for t in taxa:
+                s = [column.get(t, self.MISSING) for column in columns]
+                if wrapped:
+                    s = [wrapped.get(value, value) for value in s]
                 yield "%s %s" % (t.ljust(max_taxon_size), ''.join(s))
 
-    def make_treeblock(self):
-        return "\n".join(["    %s" % t.lstrip().strip() for t in self.trees])
+    def make_treeblock(self, translate=False):
+        """
+        Generates a trees block
+
+        :param translate: Replace taxon labels with numeric IDs listed in a translate block
+        :type translate: Boolean
+        """
+        if not translate:
+            return "\n".join(["    %s" % t.lstrip().strip() for t in self.trees])
+        table = TranslateTable()
+        trees = ["    %s" % TreeHandler._relabel_tree(t.strip(), table.ids)[0] for t in self.trees]
+        return "\n".join(list(table.iter_lines(indent='    ')) + trees)
 
     def _make_comments(self):
         """Generates a comments block"""
@@ -130,7 +197,7 @@ class NexusWriter(FileWriterMixin):
 
     def _make_collabels(self):
         """Generates a matrix column labels block as comment"""
-        pad = " " * (max([len(t) for t in self.taxa]) + self.padding)
+        pad = " " * self._get_taxon_width()
         return "\n".join(["%s[%s]" % (pad, c) if len(c) else "" for c in self.collabels])
 
     def add_collabels(self, collabel):
@@ -150,51 +217,59 @@ class NexusWriter(FileWriterMixin):
         if check:
             assert isinstance(character, (str, int)), 'Character must not be of type {}'.format(
                 type(character))
-            if self.characters:
-                assert all(isinstance(c, str) for c in [character] + self.characters) or \
-                    all(isinstance(c, int) for c in [character] + self.characters), \
+            if self._chars_in:
+                characters = [character] + list(self._chars_in)
+                assert all(isinstance(c, str) for c in characters) or \
+                    all(isinstance(c, int) for c in characters), \
                     "Characters of mixed type are not supported"
         value = str(value)
-
-        if taxon not in self._taxa_in:
-            self._taxa_in.append(taxon)
-        if character not in self.data:
-            self._chars_in.append(character)
-
-        self._taxa = None
-        self._characters = None
-
-        # have multiple entries
-        if taxon in self.data[character]:
-            self.data[character][taxon] += value
+        taxon = intern_taxon(taxon)
+
+        if character not in self._chars_in:
+            self._chars_in[character] = None
+            self._characters_changed()
+
+        # `CodedMatrix` cells are accessed directly, rather than via column views:
+        coded = isinstance(self.data, CodedMatrix)
+        old = self.data.get_value(taxon, character) if coded else self.data[character].get(taxon)
+        if old is None:
+            if taxon not in self._taxa_in:
+                self._taxa_changed()
+            self._taxa_in[taxon] += 1
+        else:  # have multiple entries
+            # Update the value in place, keeping the position of the taxon in the inventory:
+            self._remove_state(old)
+            value = old + value
+        self._states[value] += 1
+        if coded:
+            self.data.set_value(taxon, character, value)
         else:
             self.data[character][taxon] = value
 
     def remove(self, taxon, character):
         """Removes a `character` for the given `taxon` and sets it to empty"""
-        del(self.data[character][taxon])
-        self._taxa = None
-        self._characters = None
-        for char in self.data:
-            if taxon in self.data[char]:
-                break
-        else:
-            self._taxa_in.remove(taxon)
+        self._remove_value(taxon, self.data[character].pop(taxon))
 
     def remove_taxon(self, taxon):
         """Removes a given `taxon` from the nexus file"""
+        if taxon not in self._taxa_in:
+            raise KeyError(taxon)
         for char in self.data:
-            del(self.data[char][taxon])
-        self._taxa = None
-        self._taxa_in.remove(taxon)
+            if taxon in self.data[char]:
+                self._states[self.data[char].pop(taxon)] -= 1
+        self._states = +self._states  # drop states which are no longer used.
+        del self._taxa_in[taxon]
+        self._taxa_changed()
 
     def remove_character(self, character):
         """Removes a given `character` from the nexus file"""
-        del(self.data[character])
-        self._characters = None
-        self._chars_in.remove(character)
+        for taxon, value in self.data.pop(character).items():
+            self._remove_value(taxon, value)
+        del self._chars_in[character]
+        self._characters_changed()
 
-    def write(self, interleave=False, charblock=False, preserve_order=False, **kw):
+    def write(self, interleave=False, charblock=False, preserve_order=False, translate=False,
+              **kw):
         """
         Generates a string representation of the nexus
         (basically a wrapper around make_nexus)
@@ -205,20 +280,23 @@ class NexusWriter(FileWriterMixin):
         :type charblock: Boolean
         :param preserve_order: Preserve input order of taxa and characters or not
         :type preserve_order: Boolean
+        :param translate: Write trees with a translate block or not
+        :type translate: Boolean
 
         :return: String
         """
-        return self.make_nexus(interleave, charblock, preserve_order)
+        return self.make_nexus(interleave, charblock, preserve_order, translate)
 
     def _is_valid(self):
         """Checks the nexus is valid to write (i.e. not empty)"""
-        if self.data and self.taxa:
+        if self._chars_in and self._taxa_in:
             return True
         if self.ntrees:
             return True
         return False
 
-    def make_nexus(self, interleave=False, charblock=False, preserve_order=False):
+    def make_nexus(self, interleave=False, charblock=False, preserve_order=False,
+                   translate=False):
         """
         Generates a string representation of the nexus
 
@@ -228,6 +306,8 @@ class NexusWriter(FileWriterMixin):
         :type charblock: Boolean
         :param preserve_order: Preserve input order of taxa and characters or not
         :type preserve_order: Boolean
+        :param translate: Write trees with a translate block or not
+        :type translate: Boolean
 
         :return: String
         """
@@ -236,10 +316,10 @@ class NexusWriter(FileWriterMixin):
         if not self._is_valid():
             raise ValueError("Nexus has no data!")
 
-        if self.data:
+        if self._chars_in:
             datablock = DATA_TEMPLATE % {
-                'ntax': len(self.taxa),
-                'nchar': len(self.characters),
+                'ntax': self.ntaxa,
+                'nchar': self.nchar,
                 'charblock': '\n'.join(self._iter_charlabels()) if charblock else '',
                 'matrix': '\n'.join(self._iter_matrix(interleave=interleave)),
                 'interleave': 'INTERLEAVE' if interleave else '',
@@ -253,7 +333,8 @@ class NexusWriter(FileWriterMixin):
         else:
             datablock = ""
 
-        treeblock = TREE_TEMPLATE % {'trees': self.make_treeblock()} if self.ntrees else ""
+        treeblock = TREE_TEMPLATE % {'trees': self.make_treeblock(translate)} \
+            if self.ntrees else ""
         return TEMPLATE % {'datablock': datablock, 'treeblock': treeblock}
 
     def write_as_table(self, preserve_order=False):
@@ -286,3 +367,136 @@ class NexusWriter(FileWriterMixin):
         from .reader import NexusReader
         return NexusReader.from_string(
             self.make_nexus(interleave=False, charblock=True, preserve_order=False))
+
+
+class TreeWriter(object):
+    """
+    Writes trees to a nexus file incrementally, e.g. while they are sampled.
+
+    Only the trees which haven't been flushed yet are kept in memory, so memory use is constant
+    no matter how many trees are written:
+
+    .. code-block:: python
+
+        with TreeWriter('posterior.trees', translate=['Harry', 'Simon', 'Betty']) as writer:
+            for tree in sampler:
+                writer.add(tree)
+
+    The trees block is closed when leaving the context (even if an exception was raised). An
+    interrupted file can be continued by passing `append=True`, in which case a trailing `END;`
+    and an incomplete last line are dropped before new trees are appended. The translate table of
+    the existing file is used - a `translate` argument must match it.
+    """
+    def __init__(self, filename, translate=None, buffer_size=1000, append=False, encoding='utf8'):
+        """
+        :param filename: Path of the tree file to write - or a file-like object, e.g. \
+            `sys.stdout`, which will not be closed.
+        :param translate: Optional translate table, either a `dict` mapping taxon IDs to taxa or \
+            a sequence of taxa, which will be numbered starting with 1.
+        :param buffer_size: Number of trees to buffer before they are written to disk.
+        :param append: Continue writing to an existing file rather than overwriting it.
+        :raises ValueError: if `translate` is passed when appending to a file with a different \
+            translate table.
+        """
+        self._owns_handle = not hasattr(filename, 'write')
+        self.filename = pathlib.Path(filename) if self._owns_handle else None
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        if translate is not None and not isinstance(translate, dict):
+            translate = {str(i): taxon for i, taxon in enumerate(translate, start=1)}
+        self.translators = TranslateTable(translate or {})
+        self.ntrees = 0
+        self._buffer = []
+
+        if self._owns_handle and append and self.filename.exists():
+            self._recover(self.translators if translate is not None else None)
+            self._handle = self.filename.open('a', encoding=self.encoding)
+        else:
+            self._handle = self.filename.open('w', encoding=self.encoding) \
+                if self._owns_handle else filename
+            self._handle.write(''.join(line + '\n' for line in self._iter_header()))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._handle is None
+
+    def _iter_header(self):
+        yield '#NEXUS'
+        yield ''
+        yield 'begin trees;'
+        if self.translators:
+            yield from self.translators.iter_lines()
+
+    def _recover(self, translate):
+        """
+        Reads the translate table and counts the trees in an existing file, and truncates it
+        before a trailing `END;` or an incomplete last line.
+
+        :param translate: `TranslateTable` which must match the one of the file, or `None`.
+        """
+        offset, truncate_at = 0, None
+        lines, in_translate = [], False
+        with self.filename.open('rb') as fp:
+            for line in fp:
+                text = line.decode(self.encoding).strip()
+                if TRANSLATE_START_PATTERN.match(text):
+                    in_translate, text = True, text[len('translate'):]
+                if in_translate:
+                    lines.append(text)
+                    in_translate = ';' not in QUOTED_LABEL_PATTERN.sub('', text)
+                elif not line.endswith(b'\n') or END_PATTERN.match(text):
+                    truncate_at = offset if truncate_at is None else truncate_at
+                elif TreeHandler.is_tree.search(text):
+                    self.ntrees += 1
+                    truncate_at = None
+                offset += len(line)
+        existing = TranslateTable.parse('\n'.join(lines)) if lines else TranslateTable()
+        if translate is not None and {str(k): v for k, v in translate.items()} != existing:
+            raise ValueError('Translate table does not match the one in {0}'.format(self.filename))
+        self.translators = existing
+        if truncate_at is not None:
+            with self.filename.open('r+b') as fp:
+                fp.truncate(truncate_at)
+
+    def add(self, tree, name=None, rooted=None):
+        """
+        Adds a tree.
+
+        :param tree: A `Tree` (or complete tree line), a newick string or a `newick.Node`.
+        :param name: Name of the tree if it is passed as newick - defaults to `tree_<n>`.
+        :param rooted: Rooting of the tree if it is passed as newick.
+        """
+        if self.closed:
+            raise ValueError('TreeWriter is closed')
+        is_tree_line = isinstance(tree, str) and TreeHandler.is_tree.search(tree)
+        if not (isinstance(tree, Tree) or is_tree_line):
+            tree = Tree.from_newick(
+                tree, name=name or 'tree_%d' % (self.ntrees + 1), rooted=rooted)
+        self._buffer.append('\t%s\n' % tree.strip())
+        self.ntrees += 1
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Writes buffered trees to disk."""
+        if self._buffer:
+            self._handle.write(''.join(self._buffer))
+            self._buffer = []
+        self._handle.flush()
+
+    def close(self):
+        """Writes remaining trees, closes the trees block and the file."""
+        if not self.closed:
+            self.flush()
+            self._handle.write('end;\n')
+            if self._owns_handle:
+                self._handle.close()
+            else:
+                self._handle.flush()
+            self._handle = None
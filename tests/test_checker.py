@@ -1,5 +1,12 @@
 """Tests for nexus checkers"""
+import copy
+
+import pytest
+
 from nexus.reader import NexusReader
+from nexus.checker import CHECKERS, MatrixScan, RowCounter, StateCounter, run_checkers
+from nexus.checker import Accumulator, ColumnCounter, ColumnStateCounter
+from nexus.checker import check_file, check_files, print_status
 from nexus.checker import BEASTAscertainmentChecker
 from nexus.checker import DuplicateLabelChecker
 from nexus.checker import EmptyCharacterChecker
@@ -7,6 +14,7 @@ from nexus.checker import LabelChecker
 from nexus.checker import LowStateCountChecker
 from nexus.checker import PotentiallyUnsafeTaxaLabelsChecker
 from nexus.checker import SingletonCharacterChecker
+from nexus.checker import TaxaBlockChecker
 from nexus.checker import UnusualStateChecker
 
 
@@ -151,7 +159,7 @@ def test_SingletonCharacterChecker():
     assert len(c.errors) == 2
 
 
-def test_LowStateCountChecker():
+def test_LowStateCountChecker(monkeypatch):
     nex = NexusReader.from_string(
         """
         #NEXUS
@@ -169,12 +177,12 @@ def test_LowStateCountChecker():
         G              00000000000000000000000000000000000000000000000001
         ;
     """)
-    LowStateCountChecker.THRESHOLD = 1
+    monkeypatch.setattr(LowStateCountChecker, 'THRESHOLD', 1)
     c = LowStateCountChecker(nex)
     assert len(c.errors) == 1
 
 
-def test_UnusualStateChecker():
+def test_UnusualStateChecker(monkeypatch):
     nex = NexusReader.from_string(
         """
         #NEXUS
@@ -188,7 +196,7 @@ def test_UnusualStateChecker():
         C              00A
         ;
     """)
-    UnusualStateChecker.THRESHOLD = 0.3
+    monkeypatch.setattr(UnusualStateChecker, 'THRESHOLD', 0.3)
     c = UnusualStateChecker(nex)
     assert len(c.errors) == 1
 
@@ -298,3 +306,208 @@ def test_BEASTAscertainmentChecker_fail_with_non_empty():
     """)
     c = BEASTAscertainmentChecker(nex)
     assert len(c.errors) == 1  # should ONLY be one
+
+
+def test_TaxaBlockChecker(nex2, trees):
+    assert not TaxaBlockChecker(trees).errors
+    assert not TaxaBlockChecker(nex2).errors
+    nex2.taxa.remove('Paul')
+    assert TaxaBlockChecker(nex2).errors == ['Taxon Paul in data block not in taxa block']
+
+
+@pytest.mark.parametrize(
+    'trees,errors',
+    [
+        ('tree t = (1,2,3);', []),  # Numbers refer to positions in the taxa block.
+        ("tree t = ('Simon-B.',Harry,'Tom');", []),
+        ('tree t = (1,2,4);', ['Taxon 4 in trees block not in taxa block']),
+        ('translate 1 Harry, 2 Simon;\ntree t = (1,2);',
+         ['Taxon Simon in trees block not in taxa block']),
+    ]
+)
+def test_TaxaBlockChecker_trees(trees, errors):
+    nex = NexusReader.from_string("""#NEXUS
+begin taxa;
+    dimensions ntax=3;
+    taxlabels 'Simon-B.' Harry Tom;
+end;
+begin trees;
+    %s
+end;""" % trees)
+    assert TaxaBlockChecker(nex).errors == errors
+
+
+def test_TaxaBlockChecker_examples(examples):
+    assert not TaxaBlockChecker(NexusReader.from_file(examples / 'example-comments.nex')).errors
+
+
+def test_run_checkers(nex, trees):
+    checkers = CHECKERS['base'] + CHECKERS['extra'] + CHECKERS['ascertainment']
+    for res, checker in zip(run_checkers(nex, checkers), checkers):
+        expected = checker(nex)
+        assert (res.errors, res.messages) == (expected.errors, expected.messages)
+    assert not run_checkers(trees, [TaxaBlockChecker])[0].errors
+
+
+def test_run_checkers_empty_states():
+    class MissingCharacterChecker(EmptyCharacterChecker):
+        EMPTY_STATES = ('?',)
+
+    nex = NexusReader.from_string("""#NEXUS
+begin data;
+    dimensions ntax=2 nchar=2;
+    format datatype=standard symbols="01" gap=-;
+    matrix
+    A 0?
+    B 0?
+    ;
+end;""")
+    checkers = [EmptyCharacterChecker, MissingCharacterChecker]
+    expected = [c(nex).errors for c in checkers]
+    assert expected == [['Character 0 has count 0', 'Character 1 has count 0'],
+                        ['Character 1 has count 0']]
+    assert [c.errors for c in run_checkers(nex, checkers)] == expected
+    assert [c['errors'] for c in check_file('-', checkers, text=nex.write())['checkers']] == \
+        expected
+
+
+def test_MatrixScan(nex, mocker):
+    scan = MatrixScan(nex.data, {'rows': RowCounter()})
+    assert scan['rows'].counts == {'Harry': 0, 'Simon': 1, 'Betty': 1, 'Louise': 2}
+    rows = mocker.Mock()
+    assert scan.require({'rows': rows, 'states': StateCounter()}) is scan
+    assert not rows.add_row.called
+    assert scan['states'].states == {'0': 4, '1': 4}
+
+
+def test_check_files(examples, tmp_path, capsys):
+    res = check_files(
+        [examples / 'example.nex', tmp_path / 'missing.nex'], CHECKERS['base'], workers=2)
+    assert res[0]['failure'] is None and res[0]['time'] > 0
+    assert [c['checker'] for c in res[0]['checkers']] == [c.__name__ for c in CHECKERS['base']]
+    assert res[1]['failure'].startswith('OSError') and not res[1]['checkers']
+
+    run_checkers(NexusReader.from_file(examples / 'example.nex'), [LabelChecker])[0].status()
+    out, _ = capsys.readouterr()
+    assert out.startswith('LabelChecker') and '0 errors' in out
+    print_status('Checker', ['error'], ['message'])
+    out, _ = capsys.readouterr()
+    assert out.split('\n')[1:3] == ['\t  1. message', '\t  1. error']
+
+
+def test_MatrixScan_coded():
+    nex = NexusReader.from_string("""#NEXUS
+begin data;
+    dimensions ntax=4 nchar=6;
+    format datatype=standard symbols="012" gap=- missing=?;
+    charstatelabels 1 ascert, 2 a, 3 b, 4 c, 5 d, 6 e;
+    matrix
+    Harry!  0-1?21
+    Simon   0-0?21
+    Betty   1??020
+    Louise  0??0-1
+    ;
+end;""")
+    checkers = CHECKERS['base'] + CHECKERS['extra'] + CHECKERS['ascertainment']
+    scan = MatrixScan(nex.data)
+    fallback = MatrixScan(nex.data, coded=False)
+    for checker in checkers:
+        coded, expected = checker(nex, scan), checker(nex, fallback)
+        assert (coded.errors, coded.messages) == (expected.errors, expected.messages)
+    assert scan.coded and scan['columns'].counts == [1, 0, 1, 0, 3, 3]
+    assert list(scan['states'].states) == list(fallback['states'].states) == list('0-1?2')
+
+    nex.data.matrix['Simon'][2] = '(0,1)'
+    assert not MatrixScan(nex.data, {'rows': RowCounter()}).coded
+
+
+class RowCollector(Accumulator):
+    def __init__(self):
+        self.rows = {}
+
+    def add_row(self, taxon, row, flags):
+        self.rows[taxon] = ''.join(row)
+
+    def remove_row(self, taxon, row, flags):
+        del self.rows[taxon]
+
+
+def test_incremental(nex2):
+    checkers = CHECKERS['base'] + CHECKERS['extra'] + CHECKERS['ascertainment']
+    scan = MatrixScan(nex2.data, {'collected': RowCollector()})
+    run_checkers(nex2, checkers, scan=scan)
+    nex2.data.set_cell('John', 0, '?')
+    nex2.data.set_cell('George', -1, 'a')
+    nex2.data.add_taxon('Pete', ['a', '-', 'g'])
+    nex2.data.add_taxon('Pete', ['t'])
+    nex2.data.del_taxon('Paul')
+    with pytest.raises(KeyError):
+        nex2.data.set_cell('Paul', 0, 'a')
+
+    fresh = MatrixScan(nex2.data, {'collected': RowCollector()}, coded=False)
+    for c1, c2 in zip(run_checkers(nex2, checkers, scan), run_checkers(nex2, checkers, fresh)):
+        assert (sorted(c1.errors), c1.messages) == (sorted(c2.errors), c2.messages)
+    for name, attr in [
+        ('collected', 'rows'),
+        ('rows', 'counts'),
+        ('columns', 'counts'),
+        ('states', 'states'),
+        ('ascertainment', 'states'),
+    ]:
+        assert getattr(scan[name], attr) == getattr(fresh[name], attr)
+    assert scan['rows'].counts['Pete'] == 3
+    assert nex2.data.symbols == {'a', 'c', 't', 'g', '?', '-'}
+
+    # Copies of the data are not watched:
+    data = copy.deepcopy(nex2.data)
+    data.del_taxon('Pete')
+    assert 'Pete' in scan['rows'].counts
+
+
+def test_incremental_empty_matrix():
+    nex = NexusReader.from_string("""#NEXUS
+begin data;
+    dimensions ntax=3 nchar=2;
+    format datatype=standard symbols="01" gap=-;
+    matrix
+    A ??
+    B ??
+    C ??
+    ;
+end;""")
+    scan = MatrixScan(nex.data)
+    assert len(run_checkers(nex, CHECKERS['base'], scan=scan)[-1].errors) == 2
+    nex.data.set_cell('A', 1, '1')
+    assert scan['columns'].counts == [0, 1]
+    assert run_checkers(nex, CHECKERS['base'], scan=scan)[-1].errors == [
+        'Character 0 has count 0']
+
+
+def test_set_cell_rollback(nex2, mocker):
+    scan = MatrixScan(nex2.data, {'rows': RowCounter()})
+    failing = MatrixScan(nex2.data, {'columns': ColumnCounter()})
+    mocker.patch.object(failing, 'set_cell', side_effect=ValueError)
+    mocker.patch.object(nex2.data, '_scans', [scan, failing])
+    row, counts = list(nex2.data.matrix['John']), dict(scan['rows'].counts)
+    with pytest.raises(ValueError):
+        nex2.data.set_cell('John', 0, '?')
+    assert nex2.data.matrix['John'] == row
+    assert scan['rows'].counts == counts
+
+
+def test_ColumnCounter_incremental():
+    columns = ColumnCounter()
+    columns.add_coded_row('a', '011', b'\x00\x01\x01', ['0', '1'])
+    columns.remove_row('a', ['0', '1', '1'], [False, True, True])
+    columns.add_row('b', ['1', '1'], [True, True])
+    columns.set_cell('b', 1, '1', '0', True, False)
+    assert columns.counts == [1, 0, 0]
+
+    states = ColumnStateCounter([0])
+    states.add_row('a', ['1', '1'], [True, True])
+    states.add_row('b', ['0', '1'], [False, True])
+    states.set_cell('b', 0, '0', '2', False, True)
+    states.set_cell('b', 1, '1', '0', True, False)
+    states.remove_row('a', ['1', '1'], [True, True])
+    states.set_cell('b', 0, '2', '1', True, True)
+    assert states.states == {0: {'1': 1}}
@@ -1,11 +1,18 @@
+import io
 import re
+import json
 import pathlib
 
 import pytest
 
+from nexus import NexusReader
 from nexus.__main__ import main
 
 
+def rename_node(node):
+    node.name = node.name.upper() if node.name else node.name
+
+
 def _make_nexus(tmpdir, block):
     n = pathlib.Path(str(tmpdir)) / 't.nex'
     n.write_text('#NEXUS\n\n' + block, encoding='utf8')
@@ -40,6 +47,27 @@ End;
     main(['check', str(n)])
     out, _ = capsys.readouterr()
     assert 'Warnings encountered' in out
+    assert main(['check', '--fail-on', 'warning', str(n)]) == 1
+    capsys.readouterr()
+
+    main(['check', '--format', 'jsonl', '-j', '2', str(n), str(examples / 'example.nex')])
+    out, _ = capsys.readouterr()
+    res = [json.loads(line) for line in out.strip().split('\n')]
+    assert [r['file'] for r in res if 'checker' not in r] == [str(n), str(examples / 'example.nex')]
+    assert res[0]['warnings'] == ['Expected 2 characters, got 1'] and res[0]['severity'] == 1
+    assert res[1]['checker'] == 'LabelChecker' and res[1]['file'] == str(n)
+
+    n.write_text('#NEXUS\nbegin data;\nmatrix\nA! 0\nB 1\n;\nend;', encoding='utf8')
+    assert main(['check', '--fail-on', 'error', str(n)]) == 2
+    n.write_text('#NEXUS\nbegin data;\nmatrix\nA 0\n;\nend;', encoding='utf8')
+    pathlib.Path(str(tmpdir)).joinpath('x.nex').write_bytes(b'\xff')
+    mocker.patch('nexus.commands.check.sys.stdin', io.StringIO(n.read_text(encoding='utf8')))
+    capsys.readouterr()
+    assert main(['check', str(tmpdir), '-']) == 3
+    out, _ = capsys.readouterr()
+    assert str(n) in out and 'LowStateCountChecker' in out and 'failed' in out
+    assert 'Failed to check' in out
+    assert main(['check', '--fail-on', 'never', str(n)]) == 0
 
 
 def test_tally(capsys, examples):
@@ -119,6 +147,26 @@ End;""")
             ['tree1', 'tree2', 'tree3'],
             ['-c', '-t'],
             lambda o: '[comment]' not in o),
+        (
+            ['tree1', 'tree2', 'tree3'],
+            ['-T'],
+            lambda o: ('1 a' in o) and ('tree1 = (1[comment]);' in o)),
+        (
+            ['tree1', 'tree2', 'tree3'],
+            ['--visitor', 'copy:copy', '--node-visitor', 'test_cli:rename_node', '-j', '2'],
+            lambda o: 'tree3 = (A[comment]);' in o),
+        (
+            ['tree1', 'tree2', 'tree3'],
+            ['--dedupe'],
+            lambda o: 'tree1 [&count=3] = (a[comment]);' in o and 'tree2' not in o),
+        (
+            ['tree1'],
+            ['--keep', 'a,c'],
+            lambda o: 'tree tree1 = a[comment];' in o),
+        (
+            ['tree1'],
+            ['--drop', 'b', '-t'],
+            lambda o: 'tree tree1 = a[comment];' in o),
     ]
 )
 def test_trees(trees, options, check, capsys, tmpdir):
@@ -131,12 +179,120 @@ def test_trees(trees, options, check, capsys, tmpdir):
     assert check(out)
 
 
+def test_trees_streaming(capsys, tmp_path, examples, mocker):
+    fname = examples / 'example-translated.trees'
+    log = mocker.Mock()
+    main(['trees', '-b', '50%', '-r', '2', str(fname)], log=log)
+    out, _ = capsys.readouterr()
+    assert 'tree.20000.883.396049' in out and 'tree.10000' not in out and '12 David' in out
+    assert [c[0][0] for c in log.info.call_args_list].count('1 trees written') == 1
+
+    main(
+        ['trees', '-n', '1', '--random-seed', '2', '-o', str(tmp_path / 'out.trees'), str(fname)],
+        log=mocker.Mock())
+    assert NexusReader.from_file(tmp_path / 'out.trees').trees.ntrees == 1
+
+    # Not streamable, because detranslation is requested:
+    main(['trees', '-b', '2', '-t', str(fname)], log=mocker.Mock())
+    out, _ = capsys.readouterr()
+    assert 'tree tree.20000.883.396049 = ((((Tom' in out
+
+
+def test_trees_sample_keeps_blocks(capsys, tmp_path, mocker):
+    fname = tmp_path / 'test.trees'
+    fname.write_text("""#NEXUS
+begin taxa;
+    dimensions ntax=2;
+    taxlabels A B;
+end;
+begin trees;
+    tree t1 = (A,B);
+    tree t2 = (B,A);
+end;
+""", encoding='utf8')
+    main(['trees', '-r', '2', str(fname)], log=mocker.Mock())
+    out, _ = capsys.readouterr()
+    assert 'begin taxa;' in out.lower() and 't2' in out and 't1' not in out
+
+
+def test_trees_invalid_burnin(examples, mocker):
+    with pytest.raises(SystemExit):
+        main(['trees', '-b', 'abc', str(examples / 'example.trees')], log=mocker.Mock())
+
+
+def test_trees_stats(capsys, tmp_path, examples, mocker):
+    fname = examples / 'example-translated.trees'
+    main(['trees', '--stats', '-b', '1', str(fname)], log=mocker.Mock())
+    out, _ = capsys.readouterr()
+    assert out.split('\n')[:2] == [
+        'tree,length,height', 'tree.10000.874.808756,11.2964919313,3.9761034272']
+
+    main(
+        ['trees', '--stats', '-j', '2', '-o', str(tmp_path / 'stats.csv'), str(fname)],
+        log=mocker.Mock())
+    assert len(tmp_path.joinpath('stats.csv').read_text(encoding='utf8').split()) == 4
+
+
+def test_consensus(capsys, tmpdir, mocker):
+    n = _make_nexus(
+        tmpdir,
+        'begin trees;\n{0}\nend;\n'.format('\n'.join([
+            'tree a = (((A,B),C),D);',
+            'tree b = (((A,B),D),C);',
+            'tree c = (((A,C),B),D);',
+        ])))
+    main(['consensus', str(n)], log=mocker.Mock())
+    out, _ = capsys.readouterr()
+    assert 'tree consensus = (((A,B)0.6667,C)0.6667,D);' in out
+
+    main(['consensus', '-g', '-t', '0.9', str(n)], log=mocker.Mock())
+    out, _ = capsys.readouterr()
+    assert '(((A,B)0.6667,C)0.6667,D)' in out
+
+    main(['consensus', '--splits', '-t', '0.5', str(n)], log=mocker.Mock())
+    out, _ = capsys.readouterr()
+    assert sorted(out.strip().split('\n')) == ['0.6667\tA B', '0.6667\tA B C']
+
+    main(['consensus', '--mcc', str(n)], log=mocker.Mock())
+    out, _ = capsys.readouterr()
+    assert 'tree a = (((A,B)[&posterior=0.666667],C)[&posterior=0.666667],D)' in out
+
+
+def test_consensus_mcc(capsys, examples, mocker):
+    main(['consensus', '--mcc', str(examples / 'example-translated.trees')], log=mocker.Mock())
+    out, _ = capsys.readouterr()
+    assert 'tree tree.10000.874.808756 = ((Tom:' in out
+
+
+def test_rfdistances(capsys, tmp_path, examples, mocker):
+    main(
+        ['rfdistances', str(examples / 'example.trees'),
+         '--other', str(examples / 'example-translated.trees')],
+        log=mocker.Mock())
+    out, _ = capsys.readouterr()
+    assert out.split('\n')[2] == 'tree.10000.874.808756\t18\t0\t14'
+
+    main(
+        ['rfdistances', str(examples / 'example.trees'), '-o', str(tmp_path / 'rf.tsv')],
+        log=mocker.Mock())
+    assert tmp_path.joinpath('rf.tsv').read_text(encoding='utf8').split('\n')[1].endswith('18')
+
+    main(
+        ['rfdistances', str(examples / 'example.trees'), '--mmap', str(tmp_path / 'rf.bin'),
+         '-n', '2'],
+        log=mocker.Mock())
+    assert tmp_path.joinpath('rf.bin').stat().st_size == 16
+
+
 def test_combine(capsys, tmpdir, examples):
     o = tmpdir.join('out.nex')
     main(['combine', '-o', str(o), str(examples / 'example.nex')])
     out, _ = capsys.readouterr()
     assert 'out.nex' in out
 
+    main(['combine', '--trees', '-b', '1', '-o', str(o), str(examples / 'example.trees')])
+    assert NexusReader.from_file(str(o)).trees.ntrees == 2
+
 
 def test_randomise(capsys, examples):
     main(['randomise', '-n', '10', str(examples / 'example.nex')])
@@ -4,7 +4,7 @@ import argparse
 import pytest
 from clldutils.clilib import ParserError
 
-from nexus.cli_util import list_of_ranges, get_reader
+from nexus.cli_util import list_of_ranges, get_reader, dotted_path, burnin
 
 
 def test_get_reader(monkeypatch):
@@ -38,3 +38,17 @@ def test_list_of_ranges(in_, out_):
 def test_error(in_):
     with pytest.raises(argparse.ArgumentTypeError):
         list_of_ranges(in_)
+
+
+def test_burnin():
+    assert burnin('10') == 10 and burnin('10%') == '10%'
+    for spec in ['abc', '-1', '10.5', '120%', 'x%']:
+        with pytest.raises(argparse.ArgumentTypeError):
+            burnin(spec)
+
+
+def test_dotted_path():
+    assert dotted_path('copy:copy') == dotted_path('copy.copy')
+    for spec in ['copy', 'copy:xyz', 'xyz.abc']:
+        with pytest.raises(argparse.ArgumentTypeError):
+            dotted_path(spec)
@@ -87,6 +87,15 @@ def test_characters_cached(nex):
     assert nex.data.characters == nex.data._characters
 
 
+def test_set_cell(nex):
+    assert nex.data.characters[0]['Harry'] == '0'
+    nex.data.set_cell('Harry', 0, '1')
+    assert nex.data.matrix['Harry'] == ['1', '0']
+    assert nex.data.characters[0]['Harry'] == '1'
+    with pytest.raises(IndexError):
+        nex.data.set_cell('Harry', 2, '1')
+
+
 def test_iterable(nex):
     for taxon, block in nex.data:
         assert block == expected[taxon]
@@ -1,8 +1,10 @@
 """Tests for TaxaHandler"""
+import pickle
+
 import pytest
 
 from nexus.reader import NexusReader
-from nexus.handlers.taxa import TaxaHandler
+from nexus.handlers.taxa import TaxaHandler, TaxonList
 from nexus.exceptions import NexusFormatException
 
 expected = ['John', 'Paul', 'George', 'Ringo']
@@ -32,6 +34,70 @@ def test_wrap_label_in_quotes_only_when_needed(nex2):
     assert "[4] Ringo" in output
 
 
+def test_index(nex2):
+    assert nex2.taxa.index('George') == 2
+    assert 'George' in nex2.taxa and 'Yoko' not in nex2.taxa
+    with pytest.raises(ValueError):
+        nex2.taxa.index('Yoko')
+    assert nex2.taxa.unknown(['Yoko', 'Paul']) == ['Yoko']
+
+    nex2.taxa.annotations['Paul'] = '[&x=1]'
+    nex2.taxa.rename('Paul', 'Paul McCartney')
+    assert nex2.taxa.index('Paul McCartney') == 1 and 'Paul' not in nex2.taxa
+    assert "[2] 'Paul McCartney[&x=1]'" in nex2.taxa.write()
+    with pytest.raises(ValueError):
+        nex2.taxa.rename('John', 'Ringo')
+
+    nex2.taxa.remove('Paul McCartney')
+    assert nex2.taxa.index('Ringo') == 2 and not nex2.taxa.annotations
+
+
+def test_TaxonList():
+    taxa = TaxonList(['a', 'b', 'a'])
+    assert taxa.index('a') == 0 and taxa.index('a', 1) == 2
+    taxa.rename('a', 'c')
+    assert taxa.index('a') == 2 and taxa.index('c') == 0
+    taxa.append('b')
+    taxa.rename('b', 'd')
+    assert taxa.index('b') == 3
+    taxa += ['e']
+    taxa.insert(0, 'f')
+    assert taxa.index('e') == 5
+    taxa[0] = 'g'
+    assert 'g' in taxa and 'f' not in taxa
+    del taxa[0]
+    taxa.sort()
+    assert taxa.index('a') == 0
+    taxa.reverse()
+    assert taxa.pop() == 'a' and 'a' not in taxa
+    assert pickle.loads(pickle.dumps(taxa)).index('e') == 0
+    taxa.clear()
+    assert 'e' not in taxa
+
+    taxa = TaxonList(['a'])
+    assert 'a' in taxa
+    taxa.append('b')
+    taxa.append('b')
+    taxa.rename('a', 'c')
+    assert taxa.index('c') == 0 and taxa.index('b') == 1
+
+
+def test_TaxonList_remove():
+    taxa = TaxonList(['a', 'b', 'c', 'd', 'e'])
+    assert 'a' in taxa
+    taxa.remove('b')
+    assert taxa._positions is not None  # The index is updated, not rebuilt.
+    assert 'b' not in taxa and taxa.index('c') == 1 and taxa.index('e') == 3
+    del taxa[-1]
+    assert 'e' not in taxa and taxa.index('d') == 2
+    assert taxa.pop(0) == 'a'
+    assert taxa.positions == {'c': 0, 'd': 1}
+    with pytest.raises(IndexError):
+        del taxa[5]
+    del taxa[:1]
+    assert taxa.index('d') == 0
+
+
 def test_write_produces_end(nex2):
     assert "end;" in nex2.taxa.write()
 
@@ -1,9 +1,14 @@
 """Tests for TreeHandler"""
+import math
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
 
 from nexus.reader import NexusReader
+from nexus.writer import NexusWriter
 from nexus.exceptions import NexusFormatException
-from nexus.handlers.tree import TreeHandler, Tree
+from nexus.handlers.tree import TreeHandler, Tree, TranslateTable
 
 
 def test_Tree():
@@ -13,6 +18,35 @@ def test_Tree():
     assert t.name == 'name'
 
 
+def test_Tree_memoised():
+    t = Tree('tree name [&x=1] = [&R] (A,B)C;')
+    t.newick_tree.name = 'D'  # The newick.Node is not cached.
+    assert t.newick_tree.name == 'C'
+    assert t.preamble == 'tree name [&x=1] = [&R]'
+    assert (t.name, t.rooted, t.newick_string) == ('name', True, '(A,B)C;')
+    t2 = pickle.loads(pickle.dumps(t))
+    assert t2 == t and isinstance(t2, Tree) and 'newick_string' not in t2.__dict__
+
+
+@pytest.mark.parametrize(
+    'tree1,tree2,same',
+    [
+        ('tree a = ((A:1,B)x,C[&x=1]);', 'tree b = [&R] (C,(B[&y],A:2));', True),
+        ('tree a = ((A,B),C);', 'tree a = ((A,C),B);', False),
+        ("tree a = (('A B',B),C);", "tree a = (('A B','B'),C);", True),
+    ]
+)
+def test_Tree_topology(tree1, tree2, same):
+    assert (Tree(tree1).topology == Tree(tree2).topology) is same
+
+
+def test_unique_topologies(trees):
+    trees.trees.trees.append(Tree('tree x = ' + trees.trees[1].newick_string))
+    topologies = trees.trees.unique_topologies()
+    assert list(topologies.values()) == [(1, 0), (2, 1), (1, 2)]
+    assert list(topologies) == [t.topology for t in trees.trees[:3]]
+
+
 def test_block_find(trees):
     # did we get a tree block?
     assert 'trees' in trees.blocks
@@ -110,6 +144,88 @@ def test_writet(trees_translated, examples):
     assert expected == written, "%s\n----\n%s" % (expected, written)
 
 
+def test_translate(trees, trees_translated):
+    trees.trees.translate()
+    assert trees.trees.was_translated and not trees.trees._been_detranslated
+    assert trees.trees.translators['1'] == 'Chris'
+    assert trees.trees[0].startswith('tree tree.0.1065.603220 = (((((((1:0.0668822155,2:')
+    trees.trees.translate()  # should not cause an error
+    nex = NexusReader.from_string(trees.write())
+    nex.trees.detranslate()
+    trees_translated.trees.detranslate()
+    assert nex.trees.trees == trees_translated.trees.trees
+
+    trees_translated.trees.translate()
+    assert trees_translated.trees.translators['8'] == 'Chris'
+    assert trees_translated.trees[0].startswith('tree tree.0.1065.603220 = (((((((8:0.0668822155')
+
+
+def test_translate_quoted_labels():
+    tree = "tree t = (('Simon B.':1,B:2):3,C:4);"
+    nex = NexusReader.from_string("#NEXUS\nbegin trees;\n%s\nend;\n" % tree)
+    nex.trees.translate()
+    assert "\t1 'Simon B.',\n" in nex.write()
+    nex = NexusReader.from_string(nex.write())
+    assert nex.trees.translators['1'] == 'Simon B.'
+
+    writer = NexusWriter()
+    writer.trees.append(tree)
+    assert "    1 'Simon B.',\n" in writer.write(translate=True)
+
+
+def test_detranslate_parallel(trees_translated, trees):
+    trees_translated.trees.detranslate(workers=2)
+    assert trees_translated.trees.trees == trees.trees.trees
+
+
+def test_mcc_tree(trees_translated, trees):
+    tree, index = trees_translated.trees.mcc_tree(workers=2)
+    assert (tree, index) == (trees_translated.trees.trees[1], 1)
+    assert trees.trees.mcc_tree()[1] == 1
+
+    tree, _ = trees.trees.mcc_tree(annotate=True, executor=ThreadPoolExecutor(2))
+    assert tree.name == 'tree.10000.874.808756'
+    assert '(Henry:0.2881753290,Timothy:0.9317885157)[&posterior=1]:' in tree
+    assert tree.newick_string.endswith(')[&posterior=1];')
+
+
+def test_mcc_tree_empty():
+    nex = NexusReader.from_string('#NEXUS\nbegin trees;\nend;\n')
+    assert nex.trees.split_frequencies(workers=2).ntrees == 0
+    with pytest.raises(ValueError):
+        nex.trees.mcc_tree()
+
+
+def test_annotations(trees_beast):
+    annotations = trees_beast.trees.annotations(executor=ThreadPoolExecutor(2))
+    assert annotations.trees['lnP'][0] == pytest.approx(-15795.47019648783)
+    assert len(annotations.nodes['rate']) == annotations.offsets[1] == 75
+    assert math.isnan(annotations.nodes['rate'][0])
+    assert annotations.nodes['rate'][1] == pytest.approx(9.363171791537587E-5)
+
+
+def test_prune(trees_translated, trees):
+    trees_translated.trees.prune(['Tom', 'Simon', 'Jane'], executor=ThreadPoolExecutor(2))
+    assert trees_translated.trees.translators == {'1': 'Tom', '2': 'Simon'}
+    assert trees_translated.trees[0].newick_string == '(1:0.1131822039,2:0.10193540699999999);'
+    trees_translated.trees.detranslate()
+    assert trees_translated.trees[2].newick_string.startswith('(Tom:2.3009153453,Simon:')
+
+    trees.trees.prune(['Roger', 'David', 'Henry'])
+    assert trees.trees.translators == {1: 'Henry', 2: 'Roger', 3: 'David'}
+    assert trees.trees.ntrees == 3
+    with pytest.raises(ValueError):
+        trees.trees.prune(['Tom'])
+
+
+def test_prune_non_numeric_ids():
+    nex = NexusReader.from_string(
+        "#NEXUS\nbegin trees;\ntranslate b Simon, 2 Tom, a Harry;\ntree t = ((a,b),2);\nend;\n")
+    nex.trees.prune(['Harry', 'Simon'])
+    assert nex.trees.translators == {'1': 'Harry', '2': 'Simon'}
+    assert nex.trees[0].newick_string == '(1,2);'
+
+
 def test_no_error_on_multiple_translate(trees_translated):
     assert not trees_translated.trees._been_detranslated
     trees_translated.trees.detranslate()
@@ -261,6 +377,54 @@ def test_ok_starting_with_one():
     assert '3' in nex.trees.translators
 
 
+def test_TranslateTable():
+    table = TranslateTable.parse("""
+        1 Tom, 2 'Simon B.',
+        3
+        Jane,
+        4 'O''Brien' 10 Bob
+        ;""")
+    assert table == {'1': 'Tom', '2': 'Simon B.', '3': 'Jane', '4': "O'Brien", '10': 'Bob'}
+    assert table.ids['Simon B.'] == '2'
+    assert table.add('Tom') == '1' and table.add('Ann') == '11'
+    assert table.ids['Bea'] == '12'
+    assert list(table.iter_lines(indent=''))[1:4] == ['1 Tom,', "2 'Simon B.',", '3 Jane,']
+
+    table['x'] = 'Tom'
+    assert table.ids['Tom'] == '1'
+    del table['1']
+    assert 'Tom' not in table.ids
+    table['1'] = 'Tom'
+    assert table.pop('1') == 'Tom' and table.pop('1', None) is None
+    assert table.popitem() == ('x', 'Tom') and 'Tom' not in table.ids
+    assert table.setdefault('2') == 'Simon B.' and table.setdefault('20', 'Z') == 'Z'
+    assert list(table.iter_lines(indent=''))[-2:] == ['20 Z', ';']
+    table['5'] = 'Eve'
+    table['5'] = 'Eva'
+    assert 'Eve' not in table.ids
+    assert table.popitem() == ('5', 'Eva') and 'Eva' not in table.ids
+    table = pickle.loads(pickle.dumps(table))
+    assert table.ids['Z'] == '20'
+    table.clear()
+    assert not table.ids
+
+    for text in ['1 A, 1 B;', '1 A, 2 A;', '1 A, 2;']:
+        with pytest.raises(NexusFormatException):
+            TranslateTable.parse(text)
+
+
+def test_translate_block_layout():
+    nex = NexusReader.from_string("""#NEXUS
+    begin trees;
+        translate 1 Tom, 2 Simon,
+            3 Jane;
+        tree tree = (1,2,3);
+    end;""")
+    assert nex.trees.translators == {'1': 'Tom', '2': 'Simon', '3': 'Jane'}
+    nex.trees.translators = dict(nex.trees.translators)
+    assert '\t3 Jane\n;' in nex.trees.write()
+
+
 def test_error_on_duplicate_taxa_id():
     with pytest.raises(NexusFormatException):
         NexusReader.from_string("""
@@ -585,3 +749,26 @@ def test_invalid_preamble():
     with pytest.raises(ValueError):
         TreeHandler()._detranslate_tree(
             'tree STATE_0 [abcde=1234 = ((1:[&rate=1.0]48.056,3:[&rate=1.0]48.056):[&rate=1.0]161.121,2:[&rate=1.0]209.177);', {})
+
+
+@pytest.mark.parametrize(
+    'tree,expected',
+    [
+        (
+            "tree a = ((1:[&rate=1.0,hpd={0.1,2}]0.1,2:[&rate=2,hpd={0.1,2}]0.2),3:[&x={3,1}]0.3);",
+            "tree a = ((Chris:[&rate=1.0,hpd={0.1,2}]0.1,Bruce:[&rate=2,hpd={0.1,2}]0.2),"
+            "Tom:[&x={3,1}]0.3);"),
+        (
+            "tree a = ((1[&x={1,2}]:[&y=1]0.1,2[&x={2,1}]),3[&x={3,1}]);",
+            "tree a = ((Chris[&x={1,2}]:[&y=1]0.1,Bruce[&x={2,1}]),Tom[&x={3,1}]);"),
+        (
+            "tree a = (( 1 , 2 )1:1,3:1);",
+            "tree a = (( Chris , Bruce )1:1,Tom:1);"),
+        (
+            "tree a = (('1',2),'3 x');",
+            "tree a = (('1',Bruce),'3 x');"),
+    ]
+)
+def test_detranslate_single_pass(tree, expected):
+    translatetable = {'1': 'Chris', '2': 'Bruce', '3': 'Tom'}
+    assert TreeHandler()._detranslate_tree(tree, translatetable) == expected
@@ -0,0 +1,62 @@
+"""Tests for CodedMatrix"""
+import pytest
+
+from nexus.matrix import CodedMatrix
+
+
+@pytest.fixture
+def matrix():
+    res = CodedMatrix()
+    res['c1'] = {'A': '0', 'B': '1'}
+    res['c2'] = {'A': '1', 'C': '12'}
+    return res
+
+
+def test_mapping(matrix):
+    assert list(matrix) == ['c1', 'c2'] and len(matrix) == 2
+    assert matrix['c1'] == {'A': '0', 'B': '1'}
+    assert dict(matrix['c2']) == {'A': '1', 'C': '12'}
+    assert 'C' not in matrix['c1'] and 'A' in matrix['c1'] and len(matrix['c1']) == 2
+    assert matrix['x'] == {} and 'x' not in matrix
+    assert repr(matrix['c1']) == "{'A': '0', 'B': '1'}"
+    with pytest.raises(KeyError):
+        matrix['c1']['C']
+    with pytest.raises(KeyError):
+        del matrix['c1']['C']
+    del matrix['c1']['A']
+    matrix['c1']['D'] = '0'
+    assert matrix['c1'] == {'B': '1', 'D': '0'}
+    matrix.set_value('X', 'c1', None)
+    assert matrix.get_value('X', 'c1') is None
+
+
+def test_delete_character(matrix):
+    assert matrix.pop('x', None) is None
+    assert matrix.pop('c1') == {'A': '0', 'B': '1'}
+    assert list(matrix) == ['c2']
+    assert matrix['c2'] == {'A': '1', 'C': '12'}
+
+
+def test_iter_rows(matrix):
+    rows = list(matrix.iter_rows(['A', 'B', 'C'], ['c1', 'c2'], '?', wrap='(%s)'))
+    assert rows == ['01', '1?', '?(12)']
+    rows = list(matrix.iter_rows(['A', 'C'], ['c2', 'c1'], '?'))
+    assert rows == ['10', '12?']
+    assert list(matrix.iter_rows(['A'], ['c2'], '?')) == ['1']
+
+
+def test_many_symbols(matrix):
+    for i in range(300):
+        matrix.set_value('A', i, str(i))
+    assert matrix.rows[0].typecode == 'H'
+    assert matrix['c1']['A'] == '0' and matrix[299]['A'] == '299'
+    row = list(matrix.iter_rows(['A'], [298, 299], '?'))[0]
+    assert row == '298299'
+
+
+def test_short_rows():
+    matrix = CodedMatrix()
+    matrix.CHUNK_SIZE = 1
+    matrix.set_value('A', 'c1', '0')
+    matrix.set_value('B', 'c2', '1')
+    assert list(matrix.iter_rows(['A', 'B'], ['c1', 'c2'], '?')) == ['0?', '?1']
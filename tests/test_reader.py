@@ -5,7 +5,7 @@ import warnings
 
 import pytest
 
-from nexus.reader import NexusReader
+from nexus.reader import NexusReader, TreeStream
 from nexus.exceptions import NexusFormatException
 
 
@@ -108,3 +108,28 @@ def test_error_on_duplicate_block():
             Matrix
             Harry              1
             """)
+
+
+def test_TreeStream(examples, tmp_path):
+    stream = TreeStream(examples / 'example-translated.trees')
+    assert stream.count() == 3
+    trees = list(stream)
+    assert trees == NexusReader.from_file(examples / 'example-translated.trees').trees.trees
+    assert stream.was_translated and stream.translators['0'] == 'Tom'
+
+    fname = tmp_path / 'test.trees.gz'
+    with gzip.open(str(fname), 'wt', encoding='utf8') as fp:
+        fp.write("""#NEXUS
+begin data;
+end;
+[comment]
+begin trees;
+    tree a = (A,B);
+
+    tree b = (B,A);
+begin other;
+    tree c = (C,A);
+end;""")
+    stream = TreeStream(fname)
+    assert [t.name for t in stream] == ['a', 'b']
+    assert not stream.was_translated and list(stream.translators.values()) == ['A', 'B']
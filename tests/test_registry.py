@@ -0,0 +1,51 @@
+import gc
+import sys
+import weakref
+
+from nexus import NexusReader, NexusWriter
+from nexus.registry import intern_taxon
+
+
+def test_intern_taxon():
+    label = intern_taxon(''.join(['Har', 'ry']))
+    assert intern_taxon(''.join(['Harr', 'y'])) is label is sys.intern('Harry')
+    assert intern_taxon(None) is None
+
+
+def test_intern_taxon_str_subclass():
+    class Label(str):
+        pass
+
+    label = Label('x' * 100)
+    ref = weakref.ref(label)
+    assert type(intern_taxon(label)) is str and intern_taxon(label) == label
+    del label
+    gc.collect()
+    assert ref() is None  # No reference to the label passed in is kept.
+
+
+def test_shared_labels(nex):
+    other = NexusReader.from_string(nex.write())
+    taxon = next(iter(nex.data.matrix))
+    assert taxon is next(t for t in other.data.matrix if t == taxon)
+
+    writer = NexusWriter()
+    writer.add(''.join(list(taxon)), 'c', '1')
+    assert next(iter(writer.data['c'])) is taxon
+    assert intern_taxon(''.join(list(taxon))) is taxon
+
+
+def test_shared_labels_across_blocks():
+    nex = NexusReader.from_string("""#NEXUS
+begin taxa;
+    dimensions ntax=2;
+    taxlabels Harry Simon;
+end;
+begin trees;
+    translate 1 Harry, 2 Simon;
+    tree one = (1,2);
+end;
+""")
+    assert nex.taxa[0] is nex.trees.translators['1']
+    nex.taxa.rename('Simon', ''.join(['Sim', 'one']))
+    assert nex.taxa[1] is intern_taxon('Simone')
@@ -3,7 +3,8 @@ import re
 import pytest
 
 from nexus import NexusReader
-from nexus.tools.combine_nexuses import combine_nexuses
+from nexus.handlers.tree import TreeHandler
+from nexus.tools.combine_nexuses import combine_nexuses, combine_tree_files
 
 
 @pytest.fixture
@@ -159,3 +160,43 @@ def test_combine():
     assert newnex.trees[0] == "tree 1 = (a,b,c);"
     assert newnex.trees[1] == "tree 2 = (b,a,c);"
     assert newnex.trees[2] == "tree 3 = (b,c,a);"
+
+
+def test_combine_translated(trees, trees_translated):
+    newnex = combine_nexuses([trees_translated, trees])
+    assert newnex.trees[0] == newnex.trees[3]
+
+
+@pytest.mark.parametrize(
+    'kw,names',
+    [
+        (dict(), ['tree.0.1065.603220', 'tree.10000.874.808756', 'tree.20000.883.396049'] * 2),
+        (dict(burnin='50%', every_nth=2), ['tree.20000.883.396049'] * 2),
+    ]
+)
+def test_combine_tree_files(kw, names, examples, tmp_path, trees):
+    with tmp_path.joinpath('t.trees').open('w', encoding='utf8') as fp:
+        fp.write(trees.write().replace('Tom', 'Thomas'))
+    ntrees = combine_tree_files(
+        [examples / 'example-translated.trees', tmp_path / 't.trees'],
+        tmp_path / 'out.trees',
+        **kw)
+    assert ntrees == len(names)
+
+    res = NexusReader.from_file(tmp_path / 'out.trees')
+    assert [t.name for t in res.trees] == names
+    assert list(res.trees.taxa)[-2:] == ['David', 'Thomas']
+    relabeled = [
+        TreeHandler._relabel_tree(t, res.trees.translators)[0].replace('Thomas', 'Tom')
+        for t in res.trees]
+    assert relabeled[0] == relabeled[len(names) // 2] == trees.trees[0 if not kw else 2].strip()
+
+
+def test_combine_tree_files_non_numeric_ids(tmp_path):
+    tmp_path.joinpath('t.trees').write_text(
+        "#NEXUS\nbegin trees;\ntranslate b Simon, a Harry;\ntree t = (a,b);\nend;\n",
+        encoding='utf8')
+    assert combine_tree_files([tmp_path / 't.trees'], tmp_path / 'out.trees') == 1
+    res = NexusReader.from_file(tmp_path / 'out.trees')
+    assert res.trees.translators == {'1': 'Harry', '2': 'Simon'}
+    assert res.trees[0].newick_string == '(1,2);'
@@ -0,0 +1,54 @@
+import concurrent.futures
+
+import pytest
+
+from nexus.tools import rf_distances
+from nexus.tools import distances
+
+TREES = """#NEXUS
+begin trees;
+    tree a = ((A,B),(C,D),E);
+    tree b = ((A,C),(B,D),E);
+    tree c = (((A,B),C),(D,E));
+end;
+"""
+
+
+@pytest.mark.parametrize(
+    'rooted,expected',
+    [
+        (False, [[0, 4, 2], [4, 0, 4], [2, 4, 0]]),
+        (True, [[0, 4, 3], [4, 0, 5], [3, 5, 0]]),
+    ]
+)
+def test_rf_distances(rooted, expected):
+    with rf_distances(TREES, rooted=rooted) as matrix:
+        assert [list(row) for row in matrix] == expected
+        assert matrix.shape == (3, 3)
+
+
+def test_rf_distances_other(trees, trees_translated, tmp_path, mocker):
+    mocker.patch.object(distances, 'ROW_BLOCK_SIZE', 2)
+    matrix = rf_distances(
+        trees,
+        other=trees_translated,
+        filename=tmp_path / 'rf.bin',
+        executor=concurrent.futures.ThreadPoolExecutor(2))
+    assert [matrix[i, i] for i in range(3)] == [0, 0, 0]
+    assert matrix[0, 1] == matrix[1, 0] == 18
+    matrix[0, 0] = 5
+    matrix.close()
+    assert tmp_path.joinpath('rf.bin').stat().st_size == 3 * 3 * 4
+    assert tmp_path.joinpath('rf.bin').read_bytes()[:4] == (5).to_bytes(4, 'little')
+
+
+def test_rf_distances_sample(trees):
+    matrix = rf_distances(trees, sample=2, seed=5, workers=2)
+    assert matrix.shape == (2, 2) and matrix[0, 1] == matrix[1, 0] > 0
+    assert matrix.rows == rf_distances(trees, sample=2, seed=5).rows
+
+
+def test_rf_distances_new_taxa():
+    matrix = rf_distances(TREES.replace('(D,E)', '(D,F)'), other=TREES)
+    # With different taxa, all splits differ:
+    assert matrix[2, 2] == 4
@@ -1,8 +1,17 @@
 """Tests for utils in bin directory"""
+import io
+import random
+import itertools
+import collections
+import concurrent.futures
+
 import pytest
 
+from nexus import NexusReader
 from nexus.tools import (
-    delete_trees, sample_trees, strip_comments_in_trees, visit_tree_nodes, visit_trees)
+    delete_trees, sample_trees, strip_comments_in_trees, visit_tree_nodes, visit_trees,
+    dedupe_trees)
+from nexus.tools.trees import burnin_count, reservoir_sample, sample_tree_file, summarise_trees
 
 
 def test_decorator_order(trees, tmp_path):
@@ -20,6 +29,10 @@ def test_visit_tree_nodes(trees):
     res = visit_tree_nodes(trees.write(), rename)
     assert 'chris' in res.write()
 
+    tree = trees.trees[0]
+    visit_tree_nodes(trees, rename)
+    assert 'Chris' in tree and 'Chris' in tree.newick_tree.newick
+
 
 def test_visit_trees(trees):
     def prune_chris(tree):
@@ -70,3 +83,93 @@ def test_run_randomise_sample_toobig(trees_translated):
     # raises ValueError, sample size too big (only 3 trees in this file)
     with pytest.raises(ValueError):
         sample_trees(trees_translated, 10)
+
+
+def test_parallel(trees_beast, trees):
+    expected = strip_comments_in_trees(trees_beast.write()).trees.trees
+    assert strip_comments_in_trees(trees_beast, workers=2).trees.trees == expected
+
+    def drop_second(tree):
+        return None if 'Bruce' in tree.get_leaf_names()[:2] else tree
+
+    expected = visit_trees(trees.write(), drop_second).trees.trees
+    assert len(expected) == 2
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        assert visit_trees(trees, drop_second, executor=executor).trees.trees == expected
+
+
+def test_dedupe_trees(trees_beast, mocker):
+    nex = dedupe_trees("""#NEXUS
+begin trees;
+    tree a [&lnP=1] = [&R] ((A:1,B:2):1,C:1);
+    tree b = [&R] ((B[&x=1],A),C);
+    tree c = ((A,C),B);
+end;""", log=mocker.Mock(), workers=2)
+    assert [t.name for t in nex.trees] == ['a', 'c']
+    assert nex.trees[0] == 'tree a [&lnP=1] [&count=2] = [&R] ((A:1,B:2):1,C:1);'
+    assert nex.trees[1] == 'tree c [&count=1] = ((A,C),B);'
+    assert dedupe_trees(trees_beast).trees.ntrees == 1
+
+
+@pytest.mark.parametrize(
+    'burnin,ntrees,expected',
+    [(0, None, 0), ('5', None, 5), (3, 10, 3), ('10%', 25, 2), (' 50% ', 3, 1)]
+)
+def test_burnin_count(burnin, ntrees, expected):
+    assert burnin_count(burnin, ntrees) == expected
+
+
+def test_reservoir_sample():
+    assert reservoir_sample(range(3), 5) == [0, 1, 2]
+    sample = reservoir_sample(range(100), 10, random.Random(1))
+    assert len(sample) == 10 and sample == sorted(sample)
+    assert sample == reservoir_sample(iter(range(100)), 10, random.Random(1))
+    # Each item has the same chance to be sampled:
+    counts = collections.Counter(itertools.chain.from_iterable(
+        reservoir_sample(range(10), 5, random.Random(i)) for i in range(2000)))
+    assert all(800 < n < 1200 for n in counts.values())
+
+
+def test_sample_trees_burnin(trees_translated):
+    nex = sample_trees(trees_translated.write(), burnin='34%')
+    assert [t.name for t in nex.trees] == ['tree.10000.874.808756', 'tree.20000.883.396049']
+    nex = sample_trees(trees_translated, burnin=1, every_nth=2)
+    assert [t.name for t in nex.trees] == ['tree.20000.883.396049']
+
+
+@pytest.mark.parametrize(
+    'kw',
+    [
+        dict(num_trees=2, seed=1),
+        dict(num_trees=1, burnin='40%', seed=12),
+        dict(every_nth=2),
+        dict(burnin=2),
+    ]
+)
+def test_sample_tree_file(kw, examples, tmp_path, trees_translated):
+    fname = examples / 'example-translated.trees'
+    assert sample_tree_file(fname, tmp_path / 'out.trees', **kw) == \
+        sample_trees(fname, **kw).trees.ntrees
+    nex = NexusReader.from_file(tmp_path / 'out.trees')
+    assert nex.trees.translators == trees_translated.trees.translators
+    assert nex.trees.trees == sample_trees(fname, **kw).trees.trees
+
+
+def test_sample_tree_file_untranslated(examples, mocker):
+    out = io.StringIO()
+    sample_tree_file(examples / 'example.trees', out, num_trees=1, seed=1, log=mocker.Mock())
+    assert 'translate' not in out.getvalue() and out.getvalue().count('tree ') == 1
+    with pytest.raises(ValueError):
+        sample_tree_file(examples / 'example.trees', io.StringIO(), num_trees=5)
+
+
+def test_summarise_trees(examples, trees_translated, mocker):
+    mocker.patch('nexus.tools.trees.TREE_BLOCK_SIZE', 2)
+    stats = summarise_trees(examples / 'example-translated.trees', burnin='10%', clades=True)
+    assert len(stats) == 3 and stats.splits.ntrees == 3
+    assert list(stats.height) == pytest.approx([0.3193944443, 3.9761034272, 12.0986929964])
+
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        other = summarise_trees(trees_translated, every_nth=1, clades=True, executor=executor)
+    assert list(other.iter_rows()) == list(stats.iter_rows())
+    assert other.splits.counts == stats.splits.counts
@@ -0,0 +1,259 @@
+import math
+
+import pytest
+
+from nexus.treeset import (
+    TreeSet, SplitTable, iter_nodes, split_tree, count_splits, score_trees, annotate_internal_nodes,
+    canonical_topology, prune_newick, prune_trees, length_and_height, parse_annotations,
+    parse_tree_annotations, Annotations,
+)
+from nexus.handlers.tree import Tree
+
+
+@pytest.mark.parametrize(
+    'newick,expected',
+    [
+        ('(A,B)C;', [(-1, None, None), (0, 'A', None), (0, 'B', None)]),
+        ("('a b':1,(B:2,'c''d'):3.5);",
+         [(-1, None, None), (0, 'a b', 1.0), (0, None, 3.5), (2, 'B', 2.0), (2, "c'd", None)]),
+        ('(A[&x=1]:[&rate=1]1e-3,B):0.5;',
+         [(-1, None, 0.5), (0, 'A', 0.001), (0, 'B', None)]),
+    ]
+)
+def test_iter_nodes(newick, expected):
+    assert list(iter_nodes(newick)) == expected
+
+
+@pytest.mark.parametrize(
+    'newick,expected',
+    [
+        ('(C,(B:1,A)x[&y=1]);', '((A,B),C);'),
+        ("((b,'a''b'),(A, B));", "(('a''b',b),(A,B));"),
+        ('', ';'),
+    ]
+)
+def test_canonical_topology(newick, expected):
+    assert canonical_topology(newick) == expected
+
+
+@pytest.mark.parametrize(
+    'tree,expected',
+    [
+        ('tree a = (A,B);', ('a', None, '(A,B);')),
+        ('tree a [&lnP=1] = [&U] (A,B);', ('a', False, '(A,B);')),
+        ('TREE a = [&R] (A,B);', ('a', True, '(A,B);')),
+        ('(A,B);', (None, None, '(A,B);')),
+    ]
+)
+def test_split_tree(tree, expected):
+    assert split_tree(tree) == expected
+
+
+def test_TreeSet(trees_translated):
+    treeset = trees_translated.trees.to_treeset()
+    assert len(treeset) == 3
+    assert treeset.taxa[:2] == ['Tom', 'Simon']
+    assert treeset.nbytes == 3 * 25 * 16
+    tree = treeset[-1]
+    assert (tree.name, len(tree)) == ('tree.20000.883.396049', 25)
+    assert tree.parents[0] == -1 and all(tree.parents[i] < i for i in range(1, len(tree)))
+    assert sorted(i for i in tree.leaves if i >= 0) == list(range(13))
+
+    trees_translated.trees.detranslate()
+    for i, t in enumerate(trees_translated.trees.trees):
+        # Branch lengths are re-formatted, thus we compare parsed nodes:
+        assert list(iter_nodes(treeset.newick(i))) == list(iter_nodes(t.newick_string))
+        assert list(iter(treeset))[i].parents == treeset[i].parents
+
+    t = treeset.tree(0)
+    assert t.name == 'tree.0.1065.603220'
+    assert t.newick_tree.get_leaf_names()[0] == 'Chris'
+
+
+def test_TreeSet_beast(trees_beast):
+    treeset = trees_beast.trees.to_treeset()
+    assert treeset.rooted == [True]
+    assert len(treeset.taxa) == 38
+    assert treeset.taxa[treeset.leaves[4]] == 'T20'
+    assert treeset.lengths[4] == pytest.approx(1320.9341043566992)
+
+
+def test_TreeSet_roundtrip():
+    treeset = TreeSet(taxa=['A', 'B', 'C'])
+    treeset.add('tree x = [&R] ((A:1,B:2):0.5,(C,D)E);')
+    treeset.extend(['((D,C),B);'])
+    assert treeset.taxa == ['A', 'B', 'C', 'D']
+    assert treeset.newick(0) == '((A:1.0,B:2.0):0.5,(C,D));'
+    assert treeset.newick(1) == '((D,C),B);'
+    assert treeset.tree(1) == 'tree tree = ((D,C),B);'
+    assert treeset.tree(0).rooted
+
+
+def test_TreeSet_roundtrip_quoted():
+    treeset = TreeSet()
+    treeset.add("tree t = (('a b':1,B:2):3,'c''d':4);")
+    assert treeset.newick(0) == "(('a b':1.0,B:2.0):3.0,'c''d':4.0);"
+    assert treeset.tree(0).newick_tree.get_leaf_names() == ["'a b'", 'B', "'c''d'"]
+
+
+def test_SplitTable(trees):
+    splits = trees.trees.split_frequencies()
+    assert splits.ntrees == 3
+    assert splits.taxa_of(3) == splits.taxa[:2]
+    clade = sum(1 << splits.taxa.index(t) for t in ['Henry', 'Timothy'])
+    assert splits.frequency(clade) == 1
+    assert splits.lengths[clade] / 3 == pytest.approx(
+        (0.0183093750 + 1.3099271014 + 0.0982458790) / 3)
+    assert next(splits.iter_splits(threshold=0.9))[1] == 1
+    assert all(f > 0.5 for _, f in splits.iter_splits(threshold=0.5))
+    assert splits.consensus(name='x').name == 'x'
+
+
+@pytest.mark.parametrize(
+    'trees,kw,expected',
+    [
+        (['((A:1,B:3):1,C:2);', '((A:2,B:3):1,C:2);'], {}, '((A:1.5,B:3)1:1,C:2);'),
+        (['((A,B),(C,D));', '((A,C),(B,D));'], {}, '(A,B,C,D);'),
+        (['(((A,B),C),D);', '(((A,C),B),D);'], {}, '((A,B,C)1,D);'),
+        (['(((A,B),C),D);', '(((A,C),B),D);'], dict(threshold=0.4), '(((A,B)0.5,C)1,D);'),
+        (['(((A,B),C),D);', '(((A,C),B),D);', '((A,B),(C,D));'],
+         dict(greedy=True), '(((A,B)0.6667,C)0.6667,D);'),
+    ]
+)
+def test_consensus(trees, kw, expected):
+    treeset = TreeSet()
+    splits = SplitTable(treeset.taxa)
+    assert splits.frequency(1) == 0
+    for tree in trees:
+        splits.add(treeset.compact(tree))
+    assert splits.consensus(**kw).newick_string == expected
+
+
+def test_consensus_quoted_labels():
+    treeset = TreeSet()
+    splits = SplitTable(treeset.taxa)
+    for tree in ["(('Simon B.':1,B:1):1,C:1);", "(('Simon B.':1,C:1):1,B:1);"]:
+        splits.add(treeset.compact(tree))
+    consensus = splits.consensus(greedy=True)
+    assert consensus.newick_string == "(('Simon B.':1,B:1)0.5:1,C:1);"
+    assert consensus.newick_tree.get_leaf_names() == ["'Simon B.'", 'B', 'C']
+
+
+def test_SplitTable_update():
+    trees = ['((A,B),(C,D));', '((A,B),(C,E));', '((E,B),(C,A));']
+    splits = count_splits(trees[:1])[0]
+    splits.update(count_splits(trees[1:2])[0])
+    splits.update(count_splits(trees[1:], taxa=['E', 'D'])[0])
+    assert splits.taxa == ['A', 'B', 'C', 'D', 'E']
+    assert splits.ntrees == 4
+    assert splits.frequency(0b11) == 0.75
+    assert splits.frequency(0b10010) == 0.25
+    assert splits.frequency(0b10100) == 0.5
+
+
+def test_log_credibility():
+    trees = ['((A,B),(C,D));', '((A,B),(C,D));', '((A,C),(B,D));']
+    splits = count_splits(trees)[0]
+    assert score_trees(trees, splits) == [
+        pytest.approx(2 * math.log(2 / 3))] * 2 + [pytest.approx(2 * math.log(1 / 3))]
+    assert score_trees(['((A,D),(B,C));'], splits) == [float('-inf')]
+
+
+@pytest.mark.parametrize(
+    'newick,comments,expected',
+    [
+        ('((A,B),C);', {0: 'x=1', 1: 'y=2'}, '((A,B)[&y=2],C)[&x=1];'),
+        ('(A,(B,C)[&h=1]:1)1;', {2: 'x=1'}, '(A,(B,C)[&x=1,h=1]:1)1;'),
+        ("('(x'[(],(B,C)[&h=(]);", {2: 'x=1'}, "('(x'[(],(B,C)[&x=1,h=(]);"),
+    ]
+)
+def test_annotate_internal_nodes(newick, comments, expected):
+    assert annotate_internal_nodes(newick, comments) == expected
+
+
+@pytest.mark.parametrize(
+    'newick,keep,expected',
+    [
+        ('((A:1,B:2)x[&a=1]:3,(C:1,D:1):1);', {'A', 'C', 'D'}, '(A:4.0,(C:1,D:1):1);'),
+        ('((A:1,B:2):3,(C:1,D:1):1);', {'A', 'C'}, '(A:4.0,C:2.0);'),
+        ('((A:1,B:2):3,(C:1,D:1):1);', {'C': '1', 'D': '2'}, '(1:1,2:1);'),
+        ('((A:1,B:2)[&x]:[&y]3,C:1):0.5;', {'A', 'B'}, '(A:1,B:2)[&x];'),
+        ("(('A b'[&x]:[&r=1]1,B:2):3,C);", {'A b', 'C'}, "('A b'[&x]:[&r=1]4.0,C);"),
+        ('(((A,B)n,C):1,D)r;', {'A', 'C', 'D'}, '((A,C):1,D)r;'),
+        ('((A,B),C);', {'B'}, 'B;'),
+        ('((A,B),C);', {'Z'}, None),
+        ('A:1;', {'A'}, 'A:1;'),
+        (';', {'A'}, None),
+        ('((A,B):1,C)', {'A', 'C'}, '(A:1.0,C);'),
+    ]
+)
+def test_prune_newick(newick, keep, expected):
+    assert prune_newick(newick, keep) == expected
+
+
+def test_prune_trees():
+    trees = [
+        Tree('tree t1 = [&R] ((1:0.1,2:0.2):1,3);'),
+        Tree('tree t2 [&lnP=-1] = [&U] ((1,3),2);'),
+        Tree('tree t3 = 1;'),
+        Tree('tree t4 = (3,4);'),
+    ]
+    assert prune_trees(trees, {'1', '2'}) == [
+        'tree t1 = [&R] (1:0.1,2:0.2);', 'tree t2 [&lnP=-1] = [&U] (1,2);', 'tree t3 = 1;', None]
+    assert prune_trees(trees[:1], {'1', '2'})[0].rooted
+
+
+def test_prune_trees_beast(trees_beast):
+    assert all(t.rooted for t in trees_beast.trees)
+    taxa = list(trees_beast.trees.taxa)[:3]
+    trees_beast.trees.prune(taxa)
+    assert all(t.rooted for t in trees_beast.trees)
+
+
+@pytest.mark.parametrize(
+    'comment,expected',
+    [
+        ('rate=9.3E-5', {'rate': 9.3e-05}),
+        ('height_95%_HPD={1.2,3.4},rate=1', {'height_95%_HPD': (1.2, 3.4), 'rate': 1.0}),
+        ('prob(percent)="100",set={A,B}', {'prob(percent)': '100', 'set': ('A', 'B')}),
+        ('R', {}),
+    ]
+)
+def test_parse_annotations(comment, expected):
+    assert parse_annotations(comment) == expected
+
+
+def test_Annotations():
+    trees = [
+        'tree a [&lnP=-1.5] = [&R] ((A[&rate=0.5]:1,B:[&rate=1.5]1)[&h={1,2}],C[&rate=1]);',
+        'tree b = ((A:1,C:1[&rate=2,x="y"]):1[&rate=3],B:1[&rate=1]);',
+    ]
+    annotations = Annotations(parse_tree_annotations(trees))
+    assert len(annotations) == 2
+    assert math.isnan(annotations.trees['lnP'][1])
+    assert list(annotations.offsets) == [0, 5, 10]
+    assert annotations.node_values('x', 1) == [None, None, None, 'y', None]
+    assert annotations.nodes['h'][1] == (1.0, 2.0)
+    treeset = TreeSet(taxa=['A', 'B', 'C'])
+    treeset.extend(trees)
+    assert annotations.by_clade('rate', treeset) == {
+        1: [0.5], 2: [1.5, 1.0], 4: [1.0, 2.0], 5: [3.0]}
+
+
+@pytest.mark.parametrize(
+    'newick,expected',
+    [
+        ('((A:1,B:2):3,C:1):7;', (7.0, 5.0)),
+        ("(('a:b'[&x:1]:[&r=2]1,B:2):3,C:1", (7.0, 5.0)),
+        ('((A,B),C);', (0.0, 0.0)),
+        ('A:3;', (0.0, 0.0)),
+    ]
+)
+def test_length_and_height(newick, expected):
+    assert length_and_height(newick) == expected
+
+
+def test_SplitTable_length_summary():
+    splits = count_splits(['((A:1,B:1):1,C:1);', '((A:1,B:1):3,C:1);', '((A:1,C:1),B:1);'])[0]
+    assert splits.length_summary(3) == (2.0, 1.0)
+    assert all(math.isnan(v) for v in splits.length_summary(6))
@@ -1,18 +1,21 @@
+import io
 import re
 import pathlib
 
 import pytest
 
-from nexus.writer import NexusWriter
+from nexus.reader import NexusReader
+from nexus.handlers.tree import Tree
+from nexus.writer import NexusWriter, TreeWriter
 
 
-@pytest.fixture
-def writer():
+@pytest.fixture(params=['dict', 'array'])
+def writer(request):
     data = {
         'char1': {'French': 1, 'English': 2, 'Latin': 3},
         'char2': {'French': 4, 'English': 5, 'Latin': 6},
     }
-    res = NexusWriter()
+    res = NexusWriter(storage=request.param)
     for char in data:
         for taxon, value in data[char].items():
             res.add(taxon, char, value)
@@ -95,6 +98,42 @@ def test_remove_taxon(writer):
     assert 'French' not in n
 
 
+def test_remove_taxon_missing_values(writer):
+    writer.add('Greek', 'char1', 'x')
+    assert 'x' in writer.symbols
+    writer.remove_taxon('Greek')
+    assert 'Greek' not in writer.taxa and 'x' not in writer.symbols
+    assert writer.ntaxa == 3
+
+
+def test_remove_taxon_unknown(writer):
+    with pytest.raises(KeyError):
+        writer.remove_taxon('Greek')
+    assert writer.ntaxa == 3
+
+
+def test_remove_character_updates_inventory(writer):
+    writer.add('Greek', 'char3', 'x')
+    assert writer.ntaxa == 4 and writer.nchar == 3
+    writer.remove_character('char3')
+    assert writer.ntaxa == 3 and writer.nchar == 2
+    assert 'Greek' not in writer.taxa and 'x' not in writer.symbols
+
+
+def test_inventory(writer):
+    assert sorted(writer.symbols) == ['1', '2', '3', '4', '5', '6']
+    writer.add('French', 'char1', 7)
+    assert '1' not in writer.symbols and '17' in writer.symbols
+    writer.remove('French', 'char1')
+    assert '17' not in writer.symbols
+    writer.add('French', 'char1', '-')
+    assert '-' not in writer.symbols
+    assert writer.taxa == ['English', 'French', 'Latin']
+    writer.preserve_order = True
+    assert writer.taxa == ['French', 'English', 'Latin']
+    assert writer.make_nexus() == writer.make_nexus()
+
+
 def test_nexus_noninterleave(writer):
     """Test Nexus Generation - Non-Interleaved"""
     n = writer.make_nexus(interleave=False)
@@ -138,6 +177,17 @@ def test_nexus_preserve_order(writer):
     assert re.search(r"French\s+14\s*\n\s*English", n)
 
 
+@pytest.mark.parametrize('storage', ['dict', 'array'])
+def test_polymorphic_preserve_order(storage):
+    writer = NexusWriter(storage=storage)
+    writer.add('A', 'c1', '1')
+    writer.add('B', 'c1', '1')
+    writer.add('A', 'c1', '0')
+    assert writer.data['c1']['A'] == '10'
+    assert re.search(r"A\s+\(10\)\s*\n\s*B\s+1", writer.write(preserve_order=True))
+    assert writer.symbols == ['1', '10']
+
+
 def test_nexus_interleave(writer):
     """Test Nexus Generation - Interleaved"""
     n = writer.make_nexus(interleave=True)
@@ -216,6 +266,20 @@ def test_make_treeblock(writer):
     assert re.search(r'tree tree2 = \(\(French,English\),Latin\);', treeblock)
 
 
+def test_make_treeblock_translate(writer):
+    writer.trees.append('tree tree1 = (French:1,(English:2,Latin:3));')
+    writer.trees.append('tree tree2 = ((French,English),Latin);')
+    treeblock = writer.make_treeblock(translate=True)
+    assert '1 French,' in treeblock and '3 Latin\n' in treeblock
+    assert 'tree tree1 = (1:1,(2:2,3:3));' in treeblock
+    assert 'tree tree2 = ((1,2),3);' in treeblock
+
+    nex = NexusReader.from_string(writer.write(translate=True))
+    assert nex.trees.translators == {'1': 'French', '2': 'English', '3': 'Latin'}
+    nex.trees.detranslate()
+    assert nex.trees[1] == 'tree tree2 = ((French,English),Latin);'
+
+
 def test_write_with_trees(writer):
     writer.trees.append('tree tree1 = (French,(English,Latin));')
     writer.trees.append('tree tree2 = ((French,English),Latin);')
@@ -260,3 +324,72 @@ def test_nexus_comments(writer):
     assert re.search(r"\[comment\s*\]", n)
     assert re.search(r"\[label0\s*\]", n)
     assert re.search(r"\[label2\s*\]", n)
+
+
+def test_TreeWriter(tmp_path):
+    fname = tmp_path / 'test.trees'
+    with TreeWriter(fname, translate=['A', 'B', 'C'], buffer_size=2) as writer:
+        writer.add('tree one = (1,(2,3));')
+        writer.add('(1,(3,2));', rooted=True)
+        writer.add(Tree('tree x = ((1,2),3);').newick_tree)
+    assert writer.closed and writer.ntrees == 3
+    nex = NexusReader.from_file(fname)
+    assert nex.trees.ntrees == 3
+    assert nex.trees.translators == {'1': 'A', '2': 'B', '3': 'C'}
+    assert [t.name for t in nex.trees] == ['one', 'tree_2', 'tree_3']
+    assert nex.trees[1].rooted
+    nex.trees.detranslate()
+    assert nex.trees[0] == 'tree one = (A,(B,C));'
+
+
+def test_TreeWriter_closes_block_on_error(tmp_path):
+    fname = tmp_path / 'test.trees'
+    with pytest.raises(ValueError):
+        with TreeWriter(fname) as writer:
+            writer.add('tree one = (A,(B,C));')
+            raise ValueError()
+    assert fname.read_text(encoding='utf8').endswith('end;\n')
+    assert NexusReader.from_file(fname).trees.ntrees == 1
+
+
+def test_TreeWriter_append(tmp_path):
+    fname = tmp_path / 'test.trees'
+    with TreeWriter(fname) as writer:
+        writer.add('tree one = (A,(B,C));')
+    # Simulate a crash while writing a tree:
+    with fname.open('a', encoding='utf8') as fp:
+        fp.write('\ttree two = (A,(B')
+
+    with TreeWriter(fname, append=True) as writer:
+        assert writer.ntrees == 1
+        writer.add('(A,(C,B));')
+    nex = NexusReader.from_file(fname)
+    assert [t.name for t in nex.trees] == ['one', 'tree_2']
+    assert fname.read_text(encoding='utf8').count('end;') == 1
+
+
+def test_TreeWriter_append_translate(tmp_path):
+    fname = tmp_path / 'test.trees'
+    with TreeWriter(fname, translate=['A', 'B', 'C']) as writer:
+        writer.add('tree one = (1,(2,3));')
+    with pytest.raises(ValueError):
+        writer.add('tree two = (1,(2,3));')
+    with pytest.raises(ValueError):
+        TreeWriter(fname, translate=['A', 'C', 'B'], append=True)
+    assert fname.read_text(encoding='utf8').endswith('end;\n')
+
+    with TreeWriter(fname, translate={1: 'A', 2: 'B', 3: 'C'}, append=True) as writer:
+        writer.add('tree two = (1,(3,2));')
+    with TreeWriter(fname, append=True) as writer:
+        assert writer.translators == {'1': 'A', '2': 'B', '3': 'C'}
+        writer.add('tree three = (3,(1,2));')
+    nex = NexusReader.from_file(fname)
+    assert nex.trees.ntrees == 3 and len(nex.trees.translators) == 3
+
+
+def test_TreeWriter_file_object():
+    out = io.StringIO()
+    with TreeWriter(out, append=True) as writer:
+        writer.add('tree one = (A,(B,C));')
+    assert not out.closed
+    assert NexusReader.from_string(out.getvalue()).trees.ntrees == 1